@@ -5,3 +5,13 @@ class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.accounts'
     verbose_name = 'إدارة الحسابات'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        
+        from .models import Semester
+        from .permissions import connect_signals
+        connect_signals()
+        
+        post_save.connect(Semester.clear_current_cache, sender=Semester, dispatch_uid='semester_current_save')
+        post_delete.connect(Semester.clear_current_cache, sender=Semester, dispatch_uid='semester_current_delete')
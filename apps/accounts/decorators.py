@@ -29,7 +29,7 @@ def role_required(allowed_roles):
                 messages.error(request, 'يجب تسجيل الدخول أولاً')
                 return redirect('accounts:login')
             
-            user_role = request.user.role.code if request.user.role else None
+            user_role = request.user.role_code
             
             if user_role not in allowed_roles:
                 messages.error(request, 'ليس لديك صلاحية للوصول إلى هذه الصفحة')
@@ -124,7 +124,7 @@ def course_access_required(view_func):
             messages.error(request, 'المقرر غير موجود')
             return redirect('core:home')
         
-        user_role = request.user.role.code if request.user.role else None
+        user_role = request.user.role_code
         
         # الأدمن لديه وصول كامل
         if user_role == Role.ADMIN:
@@ -63,7 +63,7 @@ class RoleBasedRedirectMiddleware:
         if not user.is_authenticated:
             return reverse('accounts:login')
         
-        role_code = user.role.code if user.role else None
+        role_code = user.role_code
         
         if role_code == Role.ADMIN:
             return reverse('accounts:admin_dashboard')
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_alter_role_is_system'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='useractivity',
+            name='activity_time',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='وقت النشاط'),
+        ),
+    ]
@@ -225,6 +225,8 @@ class Semester(models.Model):
     جدول الفصول الدراسية (Semesters)
     يحتوي على is_current لدعم منطق الأرشفة الذكي
     """
+    CURRENT_CACHE_KEY = 'semester:current'
+    
     name = models.CharField(
         max_length=100,
         unique=True,
@@ -262,6 +264,37 @@ class Semester(models.Model):
         if self.is_current:
             Semester.objects.filter(is_current=True).exclude(pk=self.pk).update(is_current=False)
         super().save(*args, **kwargs)
+    
+    @classmethod
+    def get_current(cls):
+        """
+        الفصل الدراسي الحالي (مع Caching على مستوى العملية/الكاش المشترك)
+        
+        يُبطل عند حفظ أو حذف أي فصل (إشارات post_save/post_delete)، وينتهي
+        بعد SEMESTER_CACHE_TIMEOUT ثانية حتى تراه العمليات الأخرى إذا لم يكن
+        الكاش مشتركاً (REDIS_URL).
+        
+        Returns:
+            Semester أو None
+        """
+        from django.conf import settings
+        from django.core.cache import cache
+        
+        missing = object()
+        semester = cache.get(cls.CURRENT_CACHE_KEY, missing)
+        if semester is missing:
+            semester = cls.objects.filter(is_current=True).first()
+            cache.set(cls.CURRENT_CACHE_KEY, semester, getattr(settings, 'SEMESTER_CACHE_TIMEOUT', 300))
+        return semester
+    
+    @classmethod
+    def clear_current_cache(cls, **kwargs):
+        """إبطال كاش الفصل الحالي (الآن وبعد الـ commit)"""
+        from django.core.cache import cache
+        from django.db import transaction
+        
+        cache.delete(cls.CURRENT_CACHE_KEY)
+        transaction.on_commit(lambda: cache.delete(cls.CURRENT_CACHE_KEY))
 
 
 class UserManager(BaseUserManager):
@@ -395,17 +428,35 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return f"{self.full_name} ({self.academic_id})"
     
+    def _get_role_snapshot(self):
+        """
+        لقطة الدور المشتركة (الكود والاسم والصلاحيات) محفوظة على الكائن
+        لبقية الطلب، فلا يُحمّل صف الدور للتحقق من الأدوار.
+        """
+        cached = self.__dict__.get('_role_snapshot')
+        if cached is None or cached[0] != self.role_id:
+            from .permissions import get_role_snapshot
+            cached = (self.role_id, get_role_snapshot(self.role_id))
+            self.__dict__['_role_snapshot'] = cached
+        return cached[1]
+    
+    @property
+    def role_code(self):
+        """كود دور المستخدم أو None"""
+        snapshot = self._get_role_snapshot()
+        return snapshot.code if snapshot else None
+    
     def is_admin(self):
         """التحقق من أن المستخدم أدمن (للتوافق الخلفي)"""
-        return self.role and self.role.code == Role.ADMIN
+        return self.role_code == Role.ADMIN
     
     def is_instructor(self):
         """التحقق من أن المستخدم مدرس (للتوافق الخلفي)"""
-        return self.role and self.role.code == Role.INSTRUCTOR
+        return self.role_code == Role.INSTRUCTOR
     
     def is_student(self):
         """التحقق من أن المستخدم طالب (للتوافق الخلفي)"""
-        return self.role and self.role.code == Role.STUDENT
+        return self.role_code == Role.STUDENT
     
     def has_perm(self, perm_code):
         """
@@ -421,7 +472,7 @@ class User(AbstractBaseUser, PermissionsMixin):
         if self.is_superuser or self.is_admin():
             return True
         
-        if not self.role:
+        if not self.role_id:
             return False
         
         return perm_code in self.get_permissions()
@@ -434,23 +485,19 @@ class User(AbstractBaseUser, PermissionsMixin):
         """
         الحصول على جميع صلاحيات المستخدم (مع Caching)
         
+        اللقطة مشتركة على مستوى الدور ومحفوظة في الكاش برقم إصدار
+        (apps/accounts/permissions.py)، فلا يُنفذ أي استعلام في الطلب.
+        
         Returns:
-            set: مجموعة أكواد الصلاحيات
+            frozenset: مجموعة أكواد الصلاحيات
         """
         # تحقق من الكاش أولاً
         cache_attr = '_permissions_cache'
         if hasattr(self, cache_attr):
             return getattr(self, cache_attr)
         
-        if not self.role:
-            permissions = set()
-        else:
-            permissions = set(
-                RolePermission.objects.filter(
-                    role=self.role,
-                    permission__is_active=True
-                ).values_list('permission__code', flat=True)
-            )
+        snapshot = self._get_role_snapshot()
+        permissions = snapshot.permissions if snapshot else frozenset()
         
         # حفظ في الكاش
         setattr(self, cache_attr, permissions)
@@ -460,10 +507,12 @@ class User(AbstractBaseUser, PermissionsMixin):
         """مسح كاش الصلاحيات (يُستدعى عند تغيير الدور)"""
         if hasattr(self, '_permissions_cache'):
             delattr(self, '_permissions_cache')
+        self.__dict__.pop('_role_snapshot', None)
     
     def get_role_display(self):
         """الحصول على اسم الدور للعرض"""
-        return self.role.display_name if self.role else 'بدون دور'
+        snapshot = self._get_role_snapshot()
+        return snapshot.display_name if snapshot else 'بدون دور'
 
 
 class VerificationCode(models.Model):
@@ -589,8 +638,10 @@ class UserActivity(models.Model):
         null=True,
         verbose_name='معلومات المتصفح'
     )
+    # default بدلاً من auto_now_add حتى يحتفظ الحفظ المؤجل (bulk_create) بوقت النشاط الفعلي
     activity_time = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
+        editable=False,
         verbose_name='وقت النشاط'
     )
     
@@ -0,0 +1,153 @@
+"""
+لقطات صلاحيات الأدوار المشتركة بين الطلبات
+S-ACM - Smart Academic Content Management System
+
+صلاحيات الدور تُحسب مرة واحدة وتُحفظ في الكاش المشترك بمفتاح
+(الدور، رقم الإصدار). أي تعديل على الأدوار أو الصلاحيات أو ربطها يرفع
+رقم الإصدار، فتصبح اللقطات القديمة غير مستخدمة في جميع العمليات.
+
+اللقطة تحمل أيضاً كود الدور واسمه، فالتحقق من الدور (is_admin وغيرها)
+لا يحتاج تحميل صف الدور.
+
+كلفة الطلب: قراءة رقم الإصدار من الكاش فقط؛ اللقطة نفسها محفوظة أيضاً
+في ذاكرة العملية لنفس الإصدار، ولا يوجد أي استعلام SQL.
+
+الإبطال الفوري بين العمليات يتطلب كاشاً مشتركاً (REDIS_URL). بدونه لا ترى
+العمليات الأخرى رفع الإصدار، لذا تنتهي اللقطات (في الكاش وفي ذاكرة العملية)
+بعد PERMISSIONS_CACHE_TIMEOUT ثانية ويُعاد بناؤها.
+
+Example:
+    codes = get_role_permissions(user.role_id)
+    get_role_snapshot(user.role_id).code
+    bump_permissions_version()  # بعد تعديل صلاحيات دور بعمليات bulk
+"""
+
+import logging
+import threading
+import time
+from typing import FrozenSet, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger('security')
+
+VERSION_KEY = 'role_permissions:version'
+
+
+class RoleSnapshot(NamedTuple):
+    """بيانات الدور اللازمة في كل طلب."""
+    code: str
+    display_name: str
+    permissions: FrozenSet[str]
+
+
+# لقطات الإصدار الحالي في ذاكرة العملية:
+# {'version': ..., 'roles': {role_id: (RoleSnapshot, وقت الانتهاء)}}
+_local = {'version': None, 'roles': {}}
+_local_lock = threading.Lock()
+
+
+def permissions_version() -> int:
+    """رقم إصدار الصلاحيات الحالي (مشترك بين العمليات)."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # قيمة أولية من الوقت: إذا فُقد المفتاح من الكاش لا يعود الإصدار
+        # إلى رقم قديم ما زالت لقطته محفوظة
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_permissions_version() -> None:
+    """إبطال جميع لقطات الصلاحيات في كل العمليات."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        permissions_version()
+        cache.incr(VERSION_KEY)
+    with _local_lock:
+        _local['version'] = None
+        _local['roles'] = {}
+
+
+def invalidate_permissions() -> None:
+    """
+    رفع الإصدار الآن ومرة أخرى بعد الـ commit.
+
+    الرفع الثاني يُسقط لقطة قد تكون حُسبت من بيانات ما قبل الـ commit
+    أثناء المعاملة الجارية.
+    """
+    bump_permissions_version()
+    transaction.on_commit(bump_permissions_version)
+
+
+def _snapshot_key(role_id: int, version: int) -> str:
+    return f'role_permissions:{role_id}:v{version}'
+
+
+def get_role_snapshot(role_id: Optional[int]) -> Optional[RoleSnapshot]:
+    """
+    لقطة الدور (الكود، الاسم، الصلاحيات النشطة)، أو None إذا لم يوجد الدور.
+    """
+    if not role_id:
+        return None
+
+    version = permissions_version()
+    timeout = getattr(settings, 'PERMISSIONS_CACHE_TIMEOUT', 60)
+    roles = _local['roles'] if _local['version'] == version else None
+    if roles is not None and role_id in roles:
+        snapshot, expires = roles[role_id]
+        if time.monotonic() < expires:
+            return snapshot
+
+    key = _snapshot_key(role_id, version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        from .models import Role, RolePermission
+
+        role = Role.objects.filter(pk=role_id).values('code', 'display_name').first()
+        if role is None:
+            return None
+        # الصلاحيات مجموعة غير قابلة للتعديل لأنها مشتركة بين الطلبات
+        snapshot = RoleSnapshot(
+            code=role['code'],
+            display_name=role['display_name'],
+            permissions=frozenset(
+                RolePermission.objects.filter(
+                    role_id=role_id,
+                    permission__is_active=True
+                ).values_list('permission__code', flat=True)
+            )
+        )
+        cache.set(key, snapshot, timeout)
+        logger.debug(f"Built permission snapshot for role {role_id} (version {version})")
+
+    with _local_lock:
+        if _local['version'] != version:
+            _local['version'] = version
+            _local['roles'] = {}
+        _local['roles'][role_id] = (snapshot, time.monotonic() + timeout)
+    return snapshot
+
+
+def get_role_permissions(role_id: Optional[int]) -> FrozenSet[str]:
+    """أكواد الصلاحيات النشطة للدور."""
+    snapshot = get_role_snapshot(role_id)
+    return snapshot.permissions if snapshot else frozenset()
+
+
+def _on_change(sender, **kwargs) -> None:
+    invalidate_permissions()
+
+
+def connect_signals() -> None:
+    """إبطال اللقطات عند أي حفظ أو حذف للأدوار أو الصلاحيات (لوحة الإدارة، الأوامر)."""
+    from django.db.models.signals import post_delete, post_save
+
+    from .models import Permission, Role, RolePermission
+
+    for model in (Role, Permission, RolePermission):
+        post_save.connect(_on_change, sender=model, dispatch_uid=f'permissions_{model.__name__}_save')
+        post_delete.connect(_on_change, sender=model, dispatch_uid=f'permissions_{model.__name__}_delete')
@@ -15,7 +15,7 @@ from django.contrib import messages
 from django.views import View
 from django.views.generic import TemplateView, ListView, CreateView, UpdateView
 from django.urls import reverse_lazy
-from django.db import models
+from django.db import models, transaction
 import csv
 import io
 
@@ -47,7 +47,7 @@ class AdminDashboardView(LoginRequiredMixin, AdminRequiredMixin, TemplateView):
         context['total_students'] = User.objects.filter(role__code=Role.STUDENT).count()
         context['total_instructors'] = User.objects.filter(role__code=Role.INSTRUCTOR).count()
         context['total_majors'] = Major.objects.filter(is_active=True).count()
-        context['current_semester'] = Semester.objects.filter(is_current=True).first()
+        context['current_semester'] = Semester.get_current()
         context['recent_activities'] = UserActivity.objects.select_related('user').order_by('-activity_time')[:20]
         return context
 
@@ -584,19 +584,25 @@ class RolePermissionsView(LoginRequiredMixin, AdminRequiredMixin, View):
         role = get_object_or_404(Role, pk=pk)
         from ..models import Permission, RolePermission
         
+        from ..permissions import invalidate_permissions
+        
         # الحصول على الصلاحيات المحددة
         selected_perm_ids = request.POST.getlist('permissions')
         
-        # حذف جميع الصلاحيات الحالية
-        RolePermission.objects.filter(role=role).delete()
-        
-        # إضافة الصلاحيات الجديدة
-        new_permissions = []
-        for perm_id in selected_perm_ids:
-            new_permissions.append(RolePermission(role=role, permission_id=int(perm_id)))
-        
-        if new_permissions:
-            RolePermission.objects.bulk_create(new_permissions)
+        with transaction.atomic():
+            # حذف جميع الصلاحيات الحالية
+            RolePermission.objects.filter(role=role).delete()
+            
+            # إضافة الصلاحيات الجديدة
+            new_permissions = []
+            for perm_id in selected_perm_ids:
+                new_permissions.append(RolePermission(role=role, permission_id=int(perm_id)))
+            
+            if new_permissions:
+                RolePermission.objects.bulk_create(new_permissions)
+            
+            # bulk_create لا يرسل إشارات: إبطال لقطات الصلاحيات صراحةً
+            invalidate_permissions()
         
         # تسجيل العملية
         AuditLog.log(
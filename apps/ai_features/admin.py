@@ -5,7 +5,10 @@ S-ACM - Smart Academic Content Management System
 
 from django.contrib import admin
 # تصحيح الاستيراد: استخدام AIGeneratedQuestion بدلاً من AIQuestion
-from .models import AISummary, AIGeneratedQuestion, AIChat, AIUsageLog
+from .models import (
+    AISummary, AIGeneratedQuestion, AIChat, AIUsageLog, AIUsageLedger, ExtractedText, DocumentChunk,
+    AIJob
+)
 
 
 @admin.register(AISummary)
@@ -101,4 +104,49 @@ class AIUsageLogAdmin(admin.ModelAdmin):
             'fields': ('request_time',),
             'classes': ('collapse',)
         }),
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(AIUsageLedger)
+class AIUsageLedgerAdmin(admin.ModelAdmin):
+    list_display = [
+        'operation', 'user', 'course', 'model_name', 'prompt_tokens',
+        'completion_tokens', 'latency_ms', 'was_cached', 'created_at'
+    ]
+    list_filter = ['operation', 'was_cached', 'model_name', 'semester']
+    search_fields = ['user__academic_id', 'course__course_code']
+    date_hierarchy = 'created_at'
+    
+    # سجل إلحاقي: للقراءة فقط
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class DocumentChunkInline(admin.TabularInline):
+    model = DocumentChunk
+    extra = 0
+    fields = ['position', 'page_number', 'text']
+    readonly_fields = ['position', 'page_number', 'text']
+    can_delete = False
+
+
+@admin.register(ExtractedText)
+class ExtractedTextAdmin(admin.ModelAdmin):
+    list_display = ['content_hash', 'extractor_version', 'char_count', 'page_count', 'extraction_time', 'created_at']
+    list_filter = ['extractor_version', 'created_at']
+    search_fields = ['content_hash']
+    readonly_fields = ['content_hash', 'extractor_version', 'char_count', 'page_count', 'extraction_time', 'created_at']
+    date_hierarchy = 'created_at'
+    inlines = [DocumentChunkInline]
+
+
+@admin.register(AIJob)
+class AIJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'task', 'lane', 'status', 'user', 'attempts', 'worker', 'created_at', 'finished_at']
+    list_filter = ['status', 'lane', 'task']
+    search_fields = ['user__academic_id', 'worker']
+    readonly_fields = ['result', 'error', 'worker', 'started_at', 'finished_at', 'created_at']
+    date_hierarchy = 'created_at'
@@ -0,0 +1,194 @@
+"""
+واجهات النموذج (Model Backends)
+S-ACM - Smart Academic Content Management System
+
+يختار AI_BACKEND العميل الذي تستخدمه GeminiService:
+- gemini: عميل google-genai الحقيقي (الافتراضي)
+- fake: نموذج محلي حتمي لقياس الأداء والتطوير بدون مفتاح API
+- أو مسار كامل لدالة تُرجع عميلاً بنفس الواجهة (module.path.factory)
+
+واجهة العميل المطلوبة هي جزء google-genai الذي تستخدمه الخدمة:
+models.generate_content و models.generate_content_stream
+و aio.models.generate_content، والاستجابة تحمل text و usage_metadata.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import threading
+import time
+from types import SimpleNamespace
+from typing import Iterator
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+# ========== Fake Backend ==========
+
+class FakeModelError(Exception):
+    """خطأ مُحقن من النموذج المحلي (يُترجم كأخطاء الـ SDK)."""
+    pass
+
+
+class FakeGeminiBackend:
+    """
+    نموذج محلي حتمي يحاكي عميل google-genai.
+
+    الرد وحقن الأخطاء يعتمدان على بصمة الطلب ورقم المحاولة فقط،
+    فتتكرر النتائج نفسها بين التشغيلات مهما كان ترتيب الخيوط.
+
+    Args:
+        latency: زمن ثابت لكل استدعاء (ثوانٍ)
+        tokens_per_second: سرعة توليد التوكنات (0 = فوري)
+        error_rate: نسبة الاستدعاءات التي تفشل بخطأ عام
+        rate_limit_rate: نسبة الاستدعاءات التي تفشل بتجاوز الحد (429)
+    """
+
+    CHARS_PER_TOKEN = 4
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        tokens_per_second: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0
+    ):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.calls = 0
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self.models = SimpleNamespace(
+            generate_content=self._generate,
+            generate_content_stream=self._generate_stream
+        )
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self._agenerate))
+
+    @classmethod
+    def from_settings(cls) -> 'FakeGeminiBackend':
+        return cls(
+            latency=getattr(settings, 'AI_FAKE_LATENCY', 0.0),
+            tokens_per_second=getattr(settings, 'AI_FAKE_TOKENS_PER_SECOND', 0.0),
+            error_rate=getattr(settings, 'AI_FAKE_ERROR_RATE', 0.0),
+            rate_limit_rate=getattr(settings, 'AI_FAKE_RATE_LIMIT_RATE', 0.0),
+        )
+
+    # ---------- Behaviour ----------
+
+    def _plan(self, prompt: str, config):
+        """الرد ومدة التوليد والخطأ المُحقن (إن وجد) لهذا الاستدعاء."""
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        with self._lock:
+            self.calls += 1
+            attempt = self._attempts.get(digest, 0)
+            self._attempts[digest] = attempt + 1
+
+        roll = int(hashlib.sha256(f"{digest}:{attempt}".encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+        if roll < self.rate_limit_rate:
+            return None, self.latency, FakeModelError("429 RESOURCE_EXHAUSTED: rate limit (injected)")
+        if roll < self.rate_limit_rate + self.error_rate:
+            return None, self.latency, FakeModelError("500 INTERNAL: injected failure")
+
+        text = self._reply(prompt, digest)
+        max_tokens = getattr(config, 'max_output_tokens', None) or 1000
+        output_tokens = min(max_tokens, self._count_tokens(text))
+        duration = self.latency
+        if self.tokens_per_second:
+            duration += output_tokens / self.tokens_per_second
+        return text, duration, None
+
+    @staticmethod
+    def _reply(prompt: str, digest: str) -> str:
+        """رد ثابت لكل طلب، بصيغة JSON عند طلب الأسئلة."""
+        if 'JSON' in prompt:
+            return json.dumps([
+                {
+                    'type': 'mcq',
+                    'question': f'سؤال تجريبي {i + 1} ({digest[:6]})',
+                    'options': ['أ', 'ب', 'ج', 'د'],
+                    'answer': 'أ',
+                    'explanation': 'إجابة من النموذج المحلي',
+                }
+                for i in range(5)
+            ], ensure_ascii=False)
+        return f"رد تجريبي من النموذج المحلي ({digest[:12]}). " * 8
+
+    @classmethod
+    def _count_tokens(cls, text: str) -> int:
+        return max(1, math.ceil(len(text) / cls.CHARS_PER_TOKEN))
+
+    def _response(self, prompt: str, text: str):
+        prompt_tokens = self._count_tokens(prompt)
+        output_tokens = self._count_tokens(text)
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_tokens + output_tokens,
+            )
+        )
+
+    # ---------- Client Interface ----------
+
+    def _generate(self, model, contents, config=None):
+        text, duration, error = self._plan(contents, config)
+        time.sleep(duration)
+        if error is not None:
+            raise error
+        return self._response(contents, text)
+
+    def _generate_stream(self, model, contents, config=None) -> Iterator:
+        text, duration, error = self._plan(contents, config)
+        if error is not None:
+            time.sleep(duration)
+            raise error
+        words = text.split(' ')
+        for i, word in enumerate(words):
+            time.sleep(duration / len(words))
+            yield SimpleNamespace(text=word if i == 0 else f' {word}')
+
+    async def _agenerate(self, model, contents, config=None):
+        text, duration, error = self._plan(contents, config)
+        await asyncio.sleep(duration)
+        if error is not None:
+            raise error
+        return self._response(contents, text)
+
+
+# ========== Backend Selection ==========
+
+_fake_backend = None
+_fake_backend_lock = threading.Lock()
+
+
+def get_fake_backend() -> FakeGeminiBackend:
+    """النموذج المحلي المشترك على مستوى العملية."""
+    global _fake_backend
+    with _fake_backend_lock:
+        if _fake_backend is None:
+            _fake_backend = FakeGeminiBackend.from_settings()
+        return _fake_backend
+
+
+def get_backend_client(api_key: str):
+    """
+    عميل النموذج حسب AI_BACKEND.
+
+    Raises:
+        GeminiConfigurationError: إذا كان المفتاح مطلوباً وغير موجود
+    """
+    from apps.ai_features.services import GeminiConfigurationError, get_gemini_client
+
+    backend = getattr(settings, 'AI_BACKEND', 'gemini')
+    if backend == 'fake':
+        return get_fake_backend()
+    if backend != 'gemini':
+        return import_string(backend)()
+    if not api_key:
+        raise GeminiConfigurationError("GEMINI_API_KEY is not set in settings or environment variables.")
+    return get_gemini_client(api_key)
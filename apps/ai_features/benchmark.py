@@ -0,0 +1,277 @@
+"""
+قياس أداء مسار الذكاء الاصطناعي
+S-ACM - Smart Academic Content Management System
+
+يشغّل التلخيص وتوليد الأسئلة وسؤال المستند على مجموعة ملفات
+بتوازٍ محدد، ويقيس زمن الاستخراج وزمن النموذج ونسبة إصابة الذاكرة
+المؤقتة. يُستخدم عبر: python manage.py ai_benchmark
+"""
+
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List
+
+from .services import QuestionType, TextExtractorFactory
+
+
+OPERATIONS = ('summary', 'questions', 'ask')
+SAMPLE_QUESTIONS = (
+    'ما هي الفكرة الرئيسية؟',
+    'اذكر أهم المفاهيم الواردة في النص.',
+    'ما الفرق بين المكدس والطابور؟',
+)
+
+
+# ========== Sample Corpus ==========
+
+def build_pdf(pages: List[str]) -> bytes:
+    """ملف PDF بسيط بصفحة لكل نص (ASCII) بدون مكتبات خارجية."""
+    count = len(pages)
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        ('<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            ' '.join(f'{4 + 2 * i} 0 R' for i in range(count)), count)).encode(),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    for i, text in enumerate(pages):
+        escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        stream = f'BT /F1 12 Tf 72 720 Td ({escaped}) Tj ET'.encode('latin-1', 'replace')
+        objects.append((
+            '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>'
+        ).encode())
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def build_sample_corpus(directory: Path, files_per_type: int = 2, pages: int = 20) -> List[Path]:
+    """إنشاء ملفات PDF/DOCX/PPTX/TXT تجريبية في المجلد."""
+    from docx import Document
+    from docx.enum.text import WD_BREAK
+    from pptx import Presentation
+
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for n in range(files_per_type):
+        page_texts = [
+            f'Lecture {n + 1} page {p + 1}: stacks, queues and trees. ' * 6
+            for p in range(pages)
+        ]
+
+        pdf_path = directory / f'lecture_{n + 1}.pdf'
+        pdf_path.write_bytes(build_pdf(page_texts))
+
+        document = Document()
+        for text in page_texts:
+            document.add_paragraph(text)
+            document.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+        docx_path = directory / f'lecture_{n + 1}.docx'
+        document.save(docx_path)
+
+        presentation = Presentation()
+        for text in page_texts:
+            slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+            slide.shapes.title.text = text[:40]
+            slide.placeholders[1].text = text
+        pptx_path = directory / f'lecture_{n + 1}.pptx'
+        presentation.save(pptx_path)
+
+        txt_path = directory / f'lecture_{n + 1}.txt'
+        txt_path.write_text('\n'.join(page_texts), encoding='utf-8')
+
+        paths += [pdf_path, docx_path, pptx_path, txt_path]
+    return paths
+
+
+# ========== Instrumentation ==========
+
+class InstrumentedClient:
+    """
+    غلاف لعميل النموذج يقيس زمن كل استدعاء وعدده.
+
+    عدد الاستدعاءات في الخيط الحالي يحدد إن كانت العملية قد
+    خُدمت من الذاكرة المؤقتة (صفر استدعاءات).
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.calls = 0
+        self.errors = 0
+        self.model_seconds = 0.0
+        self.models = SimpleNamespace(
+            generate_content=self._timed(client.models.generate_content),
+            generate_content_stream=client.models.generate_content_stream,
+        )
+        self.aio = client.aio
+
+    def _timed(self, func):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            self._local.calls = getattr(self._local, 'calls', 0) + 1
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                raise
+            finally:
+                with self._lock:
+                    self.calls += 1
+                    self.model_seconds += time.perf_counter() - started
+        return wrapper
+
+    def thread_calls(self) -> int:
+        return getattr(self._local, 'calls', 0)
+
+
+# ========== Report ==========
+
+def percentile(values: List[float], pct: float) -> float:
+    """النسبة المئوية (nearest-rank)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+@dataclass
+class JobResult:
+    """نتيجة تنفيذ عملية واحدة على ملف واحد."""
+    operation: str
+    path: str
+    latency: float
+    extraction_time: float
+    model_time: float
+    cached: bool
+    error: str = ''
+
+
+@dataclass
+class BenchmarkReport:
+    """ملخص نتائج القياس."""
+    results: List[JobResult] = field(default_factory=list)
+    wall_time: float = 0.0
+    model_calls: int = 0
+    model_errors: int = 0
+    model_seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return len(self.results) / self.wall_time if self.wall_time else 0.0
+
+    @property
+    def cache_hit_rate(self) -> float:
+        done = [r for r in self.results if not r.error]
+        return sum(r.cached for r in done) / len(done) if done else 0.0
+
+    def by_operation(self) -> Dict[str, Dict[str, float]]:
+        """إحصائيات كل عملية."""
+        stats = {}
+        for operation in OPERATIONS:
+            rows = [r for r in self.results if r.operation == operation]
+            if not rows:
+                continue
+            latencies = [r.latency for r in rows]
+            stats[operation] = {
+                'count': len(rows),
+                'errors': sum(1 for r in rows if r.error),
+                'p50': percentile(latencies, 50),
+                'p95': percentile(latencies, 95),
+                'p99': percentile(latencies, 99),
+                'extraction_mean': sum(r.extraction_time for r in rows) / len(rows),
+                'model_mean': sum(r.model_time for r in rows) / len(rows),
+                'cache_hit_rate': sum(r.cached for r in rows) / len(rows),
+            }
+        return stats
+
+    def as_dict(self) -> Dict:
+        return {
+            'jobs': len(self.results),
+            'wall_time': self.wall_time,
+            'throughput': self.throughput,
+            'cache_hit_rate': self.cache_hit_rate,
+            'model_calls': self.model_calls,
+            'model_errors': self.model_errors,
+            'model_seconds': self.model_seconds,
+            'operations': self.by_operation(),
+        }
+
+
+# ========== Runner ==========
+
+def _run_job(service, client: InstrumentedClient, operation: str, path: Path, index: int) -> JobResult:
+    started = time.perf_counter()
+    calls_before = client.thread_calls()
+    extraction_time = model_time = 0.0
+    error = ''
+    try:
+        text = TextExtractorFactory.extract_text(path)
+        extraction_time = time.perf_counter() - started
+        model_started = time.perf_counter()
+        if operation == 'summary':
+            service.generate_summary(text)
+        elif operation == 'questions':
+            service.generate_questions(text, QuestionType.MIXED, 5)
+        else:
+            service.ask_document(text, SAMPLE_QUESTIONS[index % len(SAMPLE_QUESTIONS)])
+        model_time = time.perf_counter() - model_started
+    except Exception as e:
+        error = str(e)
+    return JobResult(
+        operation=operation,
+        path=str(path),
+        latency=time.perf_counter() - started,
+        extraction_time=extraction_time,
+        model_time=model_time,
+        cached=client.thread_calls() == calls_before,
+        error=error,
+    )
+
+
+def run_benchmark(
+    service,
+    client: InstrumentedClient,
+    paths: List[Path],
+    operations=OPERATIONS,
+    concurrency: int = 4,
+    rounds: int = 2
+) -> BenchmarkReport:
+    """
+    تشغيل كل عملية على كل ملف rounds مرة بتوازٍ concurrency.
+
+    الجولات بعد الأولى تقيس مسار الذاكرة المؤقتة.
+
+    Args:
+        service: GeminiService يستخدم client
+        client: العميل المُقاس (InstrumentedClient)
+    """
+    jobs = [(operation, path, i) for i, path in enumerate(paths) for operation in operations]
+    report = BenchmarkReport()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ai-bench') as pool:
+        # الجولات متتالية حتى تجد كل جولة نتائج سابقتها في الذاكرة المؤقتة
+        for _ in range(rounds):
+            report.results += pool.map(lambda job: _run_job(service, client, *job), jobs)
+    report.wall_time = time.perf_counter() - started
+    report.model_calls = client.calls
+    report.model_errors = client.errors
+    report.model_seconds = client.model_seconds
+    return report
@@ -0,0 +1,211 @@
+"""
+فهرسة النصوص المستخرجة
+S-ACM - Smart Academic Content Management System
+
+يقسم نص الملف إلى مقاطع متداخلة مع الحفاظ على رقم الصفحة،
+ويسترجع أكثرها صلة بالسؤال (BM25) بدلاً من إرسال المستند كاملاً.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass
+from typing import Dict, List
+
+from django.conf import settings
+
+
+# ========== Constants ==========
+
+DEFAULT_CHUNK_SIZE = 1500
+DEFAULT_CHUNK_OVERLAP = 200
+
+
+# ========== Data Classes ==========
+
+@dataclass
+class TextChunk:
+    """مقطع نصي مع موقعه في المستند."""
+    position: int
+    page_number: int
+    text: str
+
+
+# ========== Chunking ==========
+
+def _split_long_paragraph(paragraph: str, chunk_size: int) -> List[str]:
+    """تقسيم فقرة أطول من حجم المقطع عند حدود الكلمات."""
+    parts = []
+    while len(paragraph) > chunk_size:
+        cut = paragraph.rfind(' ', 0, chunk_size)
+        if cut <= 0:
+            cut = chunk_size
+        parts.append(paragraph[:cut].strip())
+        paragraph = paragraph[cut:].strip()
+    if paragraph:
+        parts.append(paragraph)
+    return parts
+
+
+def _overlap_tail(text: str, overlap: int) -> str:
+    """آخر جزء من المقطع (عند حد كلمة) ليُكرر في بداية المقطع التالي."""
+    if overlap <= 0 or len(text) <= overlap:
+        return ''
+    tail = text[-overlap:]
+    space = tail.find(' ')
+    return tail[space + 1:] if space != -1 else tail
+
+
+def split_into_chunks(
+    pages: List[str],
+    chunk_size: int = None,
+    overlap: int = None
+) -> List[TextChunk]:
+    """
+    تقسيم صفحات المستند إلى مقاطع متداخلة.
+
+    يُبنى المقطع من فقرات كاملة قدر الإمكان، ويُنسب إلى الصفحة
+    التي بدأ منها. الصفحات القصيرة تُدمج في مقطع واحد.
+
+    Args:
+        pages: نصوص الصفحات بالترتيب
+        chunk_size: الحد الأقصى لطول المقطع (بالأحرف)
+        overlap: عدد الأحرف المكررة بين المقاطع المتتالية
+
+    Returns:
+        List[TextChunk]: المقاطع مرتبة
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'AI_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    if overlap is None:
+        overlap = getattr(settings, 'AI_CHUNK_OVERLAP', DEFAULT_CHUNK_OVERLAP)
+    overlap = min(overlap, chunk_size // 2)
+
+    chunks: List[TextChunk] = []
+    buffer = ''
+    buffer_page = 1
+    has_new_text = False
+
+    for page_number, page in enumerate(pages, start=1):
+        for paragraph in page.split('\n'):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            for piece in _split_long_paragraph(paragraph, chunk_size - overlap - 1):
+                if has_new_text and len(buffer) + len(piece) + 1 > chunk_size:
+                    chunks.append(TextChunk(len(chunks), buffer_page, buffer))
+                    buffer = _overlap_tail(buffer, overlap)
+                    has_new_text = False
+                if not has_new_text:
+                    buffer_page = page_number
+                buffer = f"{buffer}\n{piece}" if buffer else piece
+                has_new_text = True
+
+    if has_new_text:
+        chunks.append(TextChunk(len(chunks), buffer_page, buffer))
+
+    return chunks
+
+
+# ========== Lexical Retrieval (BM25) ==========
+
+_ARABIC_DIACRITICS = re.compile(r'[\u0610-\u061A\u064B-\u065F\u0670\u0640]')
+_ARABIC_LETTER_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+})
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_ARABIC_PREFIXES = ('وال', 'بال', 'كال', 'فال', 'لل', 'ال')
+
+STOP_WORDS = frozenset({
+    'في', 'من', 'علي', 'الي', 'عن', 'مع', 'هذا', 'هذه', 'ذلك', 'تلك',
+    'التي', 'الذي', 'الذين', 'ما', 'ماذا', 'هل', 'كيف', 'لماذا', 'متي',
+    'اين', 'هو', 'هي', 'هم', 'ان', 'او', 'ثم', 'قد', 'لا', 'لم', 'لن',
+    'كان', 'كانت', 'بين', 'كل', 'بعض', 'عند', 'the', 'a', 'an', 'of',
+    'to', 'in', 'is', 'are', 'and', 'or', 'what', 'how', 'why', 'for',
+})
+
+
+def normalize_arabic(text: str) -> str:
+    """توحيد أشكال الحروف العربية وإزالة التشكيل والتطويل."""
+    return _ARABIC_DIACRITICS.sub('', text).translate(_ARABIC_LETTER_MAP).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """تقسيم النص إلى رموز مطبّعة مع حذف كلمات الربط وأداة التعريف."""
+    tokens = []
+    for token in _TOKEN_RE.findall(normalize_arabic(text)):
+        if token in STOP_WORDS:
+            continue
+        for prefix in _ARABIC_PREFIXES:
+            if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+                token = token[len(prefix):]
+                break
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """
+    فهرس BM25 محلي لمقاطع مستند واحد.
+    
+    لا يحتاج إلى خدمة خارجية: يُبنى من المقاطع المخزنة ويُحفظ في
+    الذاكرة المؤقتة، ثم يُرجع أكثر المقاطع صلة بالسؤال.
+    
+    Example:
+        index = BM25Index(chunks)
+        best = index.search("ما هي الخوارزمية؟", top_k=5)
+    """
+    
+    k1 = 1.5
+    b = 0.75
+    
+    def __init__(self, chunks: List[TextChunk]):
+        self.chunks = list(chunks)
+        self.term_freqs: List[Dict[str, int]] = []
+        self.lengths: List[int] = []
+        doc_freqs: Dict[str, int] = {}
+        
+        for chunk in self.chunks:
+            freqs: Dict[str, int] = {}
+            tokens = tokenize(chunk.text)
+            for token in tokens:
+                freqs[token] = freqs.get(token, 0) + 1
+            for token in freqs:
+                doc_freqs[token] = doc_freqs.get(token, 0) + 1
+            self.term_freqs.append(freqs)
+            self.lengths.append(len(tokens))
+        
+        count = len(self.chunks)
+        self.avg_length = (sum(self.lengths) / count) if count else 0
+        self.idf = {
+            token: math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for token, df in doc_freqs.items()
+        }
+    
+    def score(self, query_tokens: List[str], index: int) -> float:
+        """درجة BM25 لمقطع واحد."""
+        freqs = self.term_freqs[index]
+        norm = self.k1 * (1 - self.b + self.b * self.lengths[index] / (self.avg_length or 1))
+        total = 0.0
+        for token in query_tokens:
+            tf = freqs.get(token)
+            if tf:
+                total += self.idf[token] * tf * (self.k1 + 1) / (tf + norm)
+        return total
+    
+    def search(self, query: str, top_k: int = 5) -> List[TextChunk]:
+        """
+        أكثر المقاطع صلة بالسؤال، مرتبة حسب موقعها في المستند.
+        
+        إذا لم تطابق أي كلمة من السؤال يُرجع أول المقاطع.
+        """
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        scored = [
+            (self.score(query_tokens, i), i) for i in range(len(self.chunks))
+        ]
+        best = [i for score, i in sorted(scored, key=lambda s: (-s[0], s[1])) if score > 0][:top_k]
+        if not best:
+            best = list(range(min(top_k, len(self.chunks))))
+        return [self.chunks[i] for i in sorted(best)]
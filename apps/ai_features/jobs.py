@@ -0,0 +1,323 @@
+"""
+طابور مهام الذكاء الاصطناعي بأولويات
+S-ACM - Smart Academic Content Management System
+
+المهام تُحفظ في جدول AIJob وتُنفذ بواسطة عمال يسحبون منه:
+- مسارات أولوية: تفاعلي (طالب ينتظر النتيجة) ثم دفعات المدرسين ثم المهام الخلفية
+- حصة عادلة: داخل المسار يُقدَّم المستخدم صاحب أقل عدد من المهام الجارية
+- إعادة المحاولة مع تأخير متزايد، وإعادة المهام العالقة إلى الطابور
+- العامل يحدّث heartbeat_at للمهام الجارية؛ المهمة تُعتبر عالقة فقط إذا توقفت
+  نبضاتها، وكل تحديث نهائي مقيد بالعامل الحاجز حتى لا يكتب عامل فقد مهمته
+
+التشغيل (الإنتاج): عملية عامل مستقلة بجانب خادم الويب
+    python manage.py ai_worker --concurrency 4
+عمال داخل عملية الويب (AI_JOB_EMBEDDED_WORKERS > 0) للتطوير فقط؛ القيمة
+الافتراضية 0 حتى لا يبدأ كل عامل gunicorn خيوط سحب خاصة به.
+
+Example:
+    job = enqueue_job('questions', user=request.user, lane=AIJob.LANE_INTERACTIVE,
+                      file_id=file_obj.id, question_type='mcq', num_questions=5)
+"""
+
+import contextvars
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import AIJob
+
+logger = logging.getLogger('ai_features')
+
+RETRY_BASE_DELAY = 30  # ثوانٍ، تتضاعف مع كل محاولة
+
+_current_job: contextvars.ContextVar = contextvars.ContextVar('ai_current_job', default=None)
+
+
+def get_task_registry() -> Dict:
+    """المهام المسموح جدولتها (الاسم المحفوظ في AIJob.task ← دالة المهمة)."""
+    from .services import (
+        generate_question_bank_async, generate_questions_async, generate_summary_async,
+        index_file_async
+    )
+
+    return {
+        'summary': generate_summary_async,
+        'questions': generate_questions_async,
+        'index': index_file_async,
+        'question_bank': generate_question_bank_async,
+    }
+
+
+# ========== Enqueue ==========
+
+def enqueue_job(task: str, user=None, lane: int = AIJob.LANE_BATCH, **kwargs) -> Optional[AIJob]:
+    """
+    إضافة مهمة إلى الطابور.
+
+    عند تعطيل الطابور (AI_JOB_QUEUE=False) تُرسل المهمة مباشرة عبر delay
+    كما في السابق وتُرجع None.
+
+    Raises:
+        ValueError: إذا كانت المهمة غير معروفة
+    """
+    tasks = get_task_registry()
+    if task not in tasks:
+        raise ValueError(f"Unknown AI job task: {task}")
+
+    if not getattr(settings, 'AI_JOB_QUEUE', True):
+        tasks[task].delay(**kwargs)
+        return None
+
+    job = AIJob.objects.create(
+        task=task,
+        kwargs=kwargs,
+        lane=lane,
+        user=user if getattr(user, 'pk', None) else None,
+    )
+    transaction.on_commit(ensure_embedded_workers)
+    return job
+
+
+def queue_position(job: AIJob) -> int:
+    """عدد المهام التي ستُنفذ قبل هذه المهمة (تقريبي، لواجهة المستخدم)."""
+    if job.status != 'queued':
+        return 0
+    from django.db.models import Q
+
+    return AIJob.objects.filter(status='queued').filter(
+        Q(lane__lt=job.lane) | Q(lane=job.lane, created_at__lt=job.created_at)
+    ).count()
+
+
+def report_progress(done: int, total: int) -> bool:
+    """
+    تحديث تقدم المهمة الجارية (لا شيء خارج العامل، مثل الاستدعاء المباشر).
+
+    Returns:
+        bool: False إذا أُلغيت المهمة ويجب التوقف
+    """
+    current = _current_job.get()
+    if current is None:
+        return True
+    job_id, worker = current
+    return bool(
+        AIJob.objects.filter(pk=job_id, status='running', worker=worker)
+        .update(progress_done=done, progress_total=total, heartbeat_at=timezone.now())
+    )
+
+
+# ========== Execution ==========
+
+def _fail_attempt(job: AIJob, running, error: str, result: dict = None) -> None:
+    """إعادة جدولة المهمة بتأخير متزايد، أو إنهاؤها بعد آخر محاولة."""
+    if job.attempts < job.max_attempts:
+        delay = RETRY_BASE_DELAY * 2 ** (job.attempts - 1)
+        running.update(
+            status='queued', worker='', error=error,
+            run_after=timezone.now() + timedelta(seconds=delay)
+        )
+    else:
+        running.update(status='failed', error=error, result=result, finished_at=timezone.now())
+
+
+def run_job(job: AIJob) -> None:
+    """
+    تنفيذ مهمة محجوزة وحفظ نتيجتها.
+
+    نتيجة {'success': False} خطأ نهائي (ملف غير موجود، تجاوز الميزانية...)؛
+    الاستثناء أو النتيجة مع 'retry': True يُعاد جدولتهما حتى max_attempts.
+    """
+    task = get_task_registry().get(job.task)
+    # مقيد بالعامل: إذا أُعيدت المهمة إلى الطابور وحجزها عامل آخر لا تُكتب النتيجة
+    running = AIJob.objects.filter(pk=job.pk, status='running', worker=job.worker)
+    if task is None:
+        running.update(status='failed', error=f"Unknown task: {job.task}", finished_at=timezone.now())
+        return
+
+    token = _current_job.set((job.pk, job.worker))
+    try:
+        result = task(**job.kwargs)
+    except Exception as e:
+        logger.exception(f"AI job {job.pk} ({job.task}) failed: {e}")
+        _fail_attempt(job, running, str(e))
+        return
+    finally:
+        _current_job.reset(token)
+
+    result = result if isinstance(result, dict) else {'success': True, 'value': result}
+    if result.get('retry'):
+        # خطأ مؤقت أعادته المهمة بدلاً من رفعه (مثل تعطل النموذج)
+        logger.warning(f"AI job {job.pk} ({job.task}) failed: {result.get('error')}")
+        _fail_attempt(job, running, result.get('error', '') or '', result)
+        return
+    # التحديث مشروط بالحالة حتى لا تُلغى نتيجة الإلغاء أثناء التنفيذ
+    running.update(
+        status='done' if result.get('success', True) else 'failed',
+        result=result,
+        error=result.get('error', '') or '',
+        finished_at=timezone.now()
+    )
+
+
+class AIJobWorker:
+    """
+    عامل يسحب المهام من الطابور وينفذ حتى concurrency مهمة في الوقت نفسه.
+
+    Args:
+        concurrency: عدد الخيوط المنفذة
+        lanes: المسارات التي يخدمها العامل (None = الكل)
+        poll_interval: فترة الانتظار عندما يكون الطابور فارغاً (ثوانٍ)
+    """
+
+    def __init__(self, concurrency: int = 2, lanes=None, poll_interval: float = 1.0, name: str = ''):
+        self.concurrency = max(1, concurrency)
+        self.lanes = lanes
+        self.poll_interval = poll_interval
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.stale_timeout = getattr(settings, 'AI_JOB_STALE_TIMEOUT', 900)
+        self.heartbeat_interval = max(1, self.stale_timeout // 3)
+        self._stop = threading.Event()
+        self._threads = []
+        self._heartbeat_thread = None
+        self._heartbeat_wake = threading.Event()
+        self._active = set()
+        self._active_lock = threading.Lock()
+        self._last_stale_check = 0.0
+        self._stale_lock = threading.Lock()
+
+    def run_next(self, worker_id: str) -> bool:
+        """حجز مهمة واحدة وتنفيذها. False إذا كان الطابور فارغاً."""
+        self._requeue_stale()
+        job = AIJob.claim(worker_id, lanes=self.lanes)
+        if job is None:
+            return False
+        started = time.perf_counter()
+        with self._active_lock:
+            self._active.add(worker_id)
+        try:
+            run_job(job)
+        finally:
+            with self._active_lock:
+                self._active.discard(worker_id)
+        logger.info(f"AI job {job.pk} ({job.task}) finished in {time.perf_counter() - started:.2f}s")
+        return True
+
+    def _requeue_stale(self) -> None:
+        with self._stale_lock:
+            if time.monotonic() - self._last_stale_check < 60:
+                return
+            self._last_stale_check = time.monotonic()
+        count = AIJob.requeue_stale(self.stale_timeout)
+        if count:
+            logger.warning(f"Requeued {count} stale AI jobs")
+
+    def heartbeat(self) -> int:
+        """تحديث heartbeat_at لمهام هذا العامل الجارية."""
+        with self._active_lock:
+            active = list(self._active)
+        if not active:
+            return 0
+        return AIJob.objects.filter(status='running', worker__in=active).update(
+            heartbeat_at=timezone.now()
+        )
+
+    def _heartbeat_loop(self) -> None:
+        try:
+            while self.is_running():
+                try:
+                    self.heartbeat()
+                except Exception as e:
+                    logger.exception(f"AI worker {self.name} heartbeat error: {e}")
+                finally:
+                    connections.close_all()
+                self._heartbeat_wake.wait(self.heartbeat_interval)
+        finally:
+            connections.close_all()
+
+    def _loop(self, index: int, drain: bool) -> None:
+        worker_id = f"{self.name}/{index}"
+        try:
+            while not self._stop.is_set():
+                try:
+                    ran = self.run_next(worker_id)
+                except Exception as e:
+                    logger.exception(f"AI worker {worker_id} error: {e}")
+                    ran = False
+                finally:
+                    connections.close_all()
+                if not ran:
+                    if drain:
+                        return
+                    self._stop.wait(self.poll_interval)
+        finally:
+            connections.close_all()
+
+    def start(self, drain: bool = False) -> None:
+        """تشغيل الخيوط في الخلفية."""
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(
+                target=self._loop, args=(i, drain), name=f'ai-job-{i}', daemon=True
+            )
+            for i in range(self.concurrency)
+        ]
+        for thread in self._threads:
+            thread.start()
+        self._heartbeat_wake.clear()
+        self._heartbeat_thread = threading.Thread(
+            target=self._heartbeat_loop, name='ai-job-heartbeat', daemon=True
+        )
+        self._heartbeat_thread.start()
+
+    def is_running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        for thread in self._threads:
+            thread.join(timeout)
+        if not self.is_running():
+            self._heartbeat_wake.set()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """إيقاف العامل بعد انتهاء المهام الجارية."""
+        self._stop.set()
+        self.join(timeout)
+
+    def drain(self) -> None:
+        """تنفيذ جميع المهام الجاهزة ثم التوقف."""
+        self.start(drain=True)
+        self.join()
+
+
+# ========== Embedded Workers ==========
+
+_embedded_worker: Optional[AIJobWorker] = None
+_embedded_lock = threading.Lock()
+
+
+def ensure_embedded_workers() -> None:
+    """
+    تشغيل عمال داخل عملية الويب عند أول مهمة (AI_JOB_EMBEDDED_WORKERS > 0).
+
+    مناسب للتطوير وللخوادم الصغيرة؛ في الإنتاج يُضبط على 0 ويُشغّل ai_worker.
+    """
+    global _embedded_worker
+    workers = getattr(settings, 'AI_JOB_EMBEDDED_WORKERS', 0)
+    if workers <= 0:
+        return
+    with _embedded_lock:
+        if _embedded_worker is None:
+            _embedded_worker = AIJobWorker(
+                concurrency=workers,
+                poll_interval=getattr(settings, 'AI_JOB_POLL_INTERVAL', 1.0),
+                name=f"embedded:{os.getpid()}"
+            )
+            _embedded_worker.start()
@@ -0,0 +1,111 @@
+"""
+Management Command لقياس أداء مسار الذكاء الاصطناعي
+S-ACM - Smart Academic Content Management System
+
+أمثلة:
+    python manage.py ai_benchmark --backend fake --latency 0.8 --concurrency 8
+    python manage.py ai_benchmark --corpus /path/to/lectures --operations summary,ask
+"""
+
+import json
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ai_features.backends import FakeGeminiBackend, get_backend_client
+from apps.ai_features.benchmark import (
+    OPERATIONS, InstrumentedClient, build_sample_corpus, run_benchmark
+)
+from apps.ai_features.services import GEMINI_API_KEY, GeminiService, TextExtractorFactory
+
+
+class Command(BaseCommand):
+    help = 'قياس زمن وإنتاجية التلخيص وتوليد الأسئلة وسؤال المستند'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', help='مجلد ملفات PDF/DOCX/PPTX (افتراضياً: ملفات تجريبية)')
+        parser.add_argument('--operations', default=','.join(OPERATIONS),
+                            help='العمليات مفصولة بفواصل: summary,questions,ask')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--rounds', type=int, default=2,
+                            help='عدد الجولات (الجولات التالية تقيس الذاكرة المؤقتة)')
+        parser.add_argument('--backend', choices=['fake', 'settings'], default='fake',
+                            help='fake: النموذج المحلي، settings: حسب AI_BACKEND')
+        parser.add_argument('--latency', type=float, default=settings.AI_FAKE_LATENCY)
+        parser.add_argument('--tokens-per-second', type=float, default=settings.AI_FAKE_TOKENS_PER_SECOND)
+        parser.add_argument('--error-rate', type=float, default=settings.AI_FAKE_ERROR_RATE)
+        parser.add_argument('--rate-limit-rate', type=float, default=settings.AI_FAKE_RATE_LIMIT_RATE)
+        parser.add_argument('--keep-cache', action='store_true', help='عدم مسح الذاكرة المؤقتة قبل القياس')
+        parser.add_argument('--json', action='store_true', help='طباعة التقرير بصيغة JSON')
+
+    def handle(self, *args, **options):
+        operations = [op.strip() for op in options['operations'].split(',') if op.strip()]
+        unknown = set(operations) - set(OPERATIONS)
+        if unknown:
+            raise CommandError(f"عمليات غير معروفة: {', '.join(sorted(unknown))}")
+
+        if options['backend'] == 'fake':
+            backend = FakeGeminiBackend(
+                latency=options['latency'],
+                tokens_per_second=options['tokens_per_second'],
+                error_rate=options['error_rate'],
+                rate_limit_rate=options['rate_limit_rate'],
+            )
+        else:
+            backend = get_backend_client(GEMINI_API_KEY)
+        client = InstrumentedClient(backend)
+        service = GeminiService(client=client)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            if options['corpus']:
+                paths = sorted(
+                    p for p in Path(options['corpus']).iterdir()
+                    if p.is_file() and TextExtractorFactory.get_extractor(p) is not None
+                )
+                if not paths:
+                    raise CommandError('لا توجد ملفات مدعومة في المجلد.')
+            else:
+                paths = build_sample_corpus(Path(tmp))
+
+            if not options['keep_cache']:
+                cache.clear()
+
+            self.stdout.write(
+                f'تشغيل {len(operations)} عملية على {len(paths)} ملف '
+                f'× {options["rounds"]} جولة بتوازٍ {options["concurrency"]}...'
+            )
+            report = run_benchmark(
+                service, client, paths, operations,
+                concurrency=options['concurrency'], rounds=options['rounds']
+            )
+
+        if options['json']:
+            self.stdout.write(json.dumps(report.as_dict(), indent=2))
+            return
+        self.print_report(report)
+
+    def print_report(self, report):
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'operation':<10} {'n':>5} {'err':>4} {'p50':>8} {'p95':>8} {'p99':>8} "
+            f"{'extract':>8} {'model':>8} {'cached':>7}"
+        )
+        for operation, row in report.by_operation().items():
+            self.stdout.write(
+                f"{operation:<10} {row['count']:>5} {row['errors']:>4} "
+                f"{row['p50']:>7.3f}s {row['p95']:>7.3f}s {row['p99']:>7.3f}s "
+                f"{row['extraction_mean']:>7.3f}s {row['model_mean']:>7.3f}s "
+                f"{row['cache_hit_rate']:>6.0%}"
+            )
+        self.stdout.write('')
+        self.stdout.write(f'الزمن الكلي: {report.wall_time:.2f}s')
+        self.stdout.write(f'الإنتاجية: {report.throughput:.2f} عملية/ثانية')
+        self.stdout.write(f'نسبة إصابة الذاكرة المؤقتة: {report.cache_hit_rate:.0%}')
+        self.stdout.write(
+            f'استدعاءات النموذج: {report.model_calls} '
+            f'(أخطاء: {report.model_errors}، زمن: {report.model_seconds:.2f}s)'
+        )
+        self.stdout.write(self.style.SUCCESS('✓ اكتمل القياس'))
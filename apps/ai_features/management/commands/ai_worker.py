@@ -0,0 +1,64 @@
+"""
+Management Command لتشغيل عامل طابور مهام الذكاء الاصطناعي
+S-ACM - Smart Academic Content Management System
+
+أمثلة:
+    python manage.py ai_worker --concurrency 4
+    python manage.py ai_worker --lanes interactive --concurrency 2
+    python manage.py ai_worker --once
+"""
+
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ai_features.jobs import AIJobWorker
+from apps.ai_features.models import AIJob
+
+
+LANES = {
+    'interactive': AIJob.LANE_INTERACTIVE,
+    'batch': AIJob.LANE_BATCH,
+    'backfill': AIJob.LANE_BACKFILL,
+}
+
+
+class Command(BaseCommand):
+    help = 'تشغيل عامل ينفذ مهام الذكاء الاصطناعي من الطابور حسب الأولوية'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='عدد المهام المنفذة في الوقت نفسه')
+        parser.add_argument('--lanes', help='المسارات مفصولة بفواصل: interactive,batch,backfill (افتراضياً: الكل)')
+        parser.add_argument('--poll', type=float, default=settings.AI_JOB_POLL_INTERVAL,
+                            help='فترة الانتظار عندما يكون الطابور فارغاً (ثوانٍ)')
+        parser.add_argument('--once', action='store_true', help='تنفيذ المهام الجاهزة ثم الخروج')
+
+    def handle(self, *args, **options):
+        lanes = None
+        if options['lanes']:
+            names = [name.strip() for name in options['lanes'].split(',') if name.strip()]
+            unknown = set(names) - set(LANES)
+            if unknown:
+                raise CommandError(f"مسارات غير معروفة: {', '.join(sorted(unknown))}")
+            lanes = [LANES[name] for name in names]
+
+        worker = AIJobWorker(
+            concurrency=options['concurrency'], lanes=lanes, poll_interval=options['poll']
+        )
+
+        if options['once']:
+            worker.drain()
+            self.stdout.write(self.style.SUCCESS('✓ تم تنفيذ المهام الجاهزة'))
+            return
+
+        self.stdout.write(f'العامل {worker.name} يعمل بتوازٍ {worker.concurrency}... (Ctrl+C للإيقاف)')
+        signal.signal(signal.SIGTERM, lambda *_: worker.stop(timeout=0))
+        worker.start()
+        try:
+            while worker.is_running():
+                worker.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write('إيقاف العامل بعد انتهاء المهام الجارية...')
+            worker.stop()
+        self.stdout.write(self.style.SUCCESS('✓ توقف العامل'))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.10 on 2026-10-17 11:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_features', '0002_alter_aisummary_file_alter_aisummary_model_used_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractedText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(help_text='SHA-256 لمحتوى الملف المصدر', max_length=64, verbose_name='بصمة المحتوى')),
+                ('extractor_version', models.PositiveIntegerField(verbose_name='إصدار المستخرج')),
+                ('text', models.TextField(blank=True, verbose_name='النص المستخرج')),
+                ('char_count', models.PositiveIntegerField(default=0, verbose_name='عدد الأحرف')),
+                ('extraction_time', models.FloatField(default=0, verbose_name='وقت الاستخراج (ثانية)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الاستخراج')),
+            ],
+            options={
+                'verbose_name': 'نص مستخرج',
+                'verbose_name_plural': 'النصوص المستخرجة',
+                'db_table': 'ai_extracted_texts',
+                'ordering': ['-created_at'],
+                'unique_together': {('content_hash', 'extractor_version')},
+            },
+        ),
+    ]
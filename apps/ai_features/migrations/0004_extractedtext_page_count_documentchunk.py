@@ -0,0 +1,36 @@
+# Generated by Django 5.2.10 on 2026-10-17 11:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_features', '0003_extractedtext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractedtext',
+            name='page_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='عدد الصفحات'),
+        ),
+        migrations.CreateModel(
+            name='DocumentChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(verbose_name='الترتيب')),
+                ('page_number', models.PositiveIntegerField(default=1, verbose_name='رقم الصفحة')),
+                ('text', models.TextField(verbose_name='نص المقطع')),
+                ('extracted_text', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='ai_features.extractedtext', verbose_name='النص المستخرج')),
+            ],
+            options={
+                'verbose_name': 'مقطع نصي',
+                'verbose_name_plural': 'المقاطع النصية',
+                'db_table': 'ai_document_chunks',
+                'ordering': ['extracted_text', 'position'],
+                'unique_together': {('extracted_text', 'position')},
+            },
+        ),
+    ]
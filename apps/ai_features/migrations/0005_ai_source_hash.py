@@ -0,0 +1,23 @@
+# Generated by Django 5.2.10 on 2026-10-17 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_features', '0004_extractedtext_page_count_documentchunk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aigeneratedquestion',
+            name='source_hash',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='بصمة الملف المصدر'),
+        ),
+        migrations.AddField(
+            model_name='aisummary',
+            name='source_hash',
+            field=models.CharField(blank=True, help_text='بصمة محتوى الملف وقت التوليد (لمعرفة صلاحية الملخص)', max_length=64, null=True, verbose_name='بصمة الملف المصدر'),
+        ),
+    ]
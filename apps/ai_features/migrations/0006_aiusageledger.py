@@ -0,0 +1,40 @@
+# Generated by Django 5.2.10 on 2026-10-17 11:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_alter_role_is_system'),
+        ('ai_features', '0005_ai_source_hash'),
+        ('courses', '0002_lecturefile_content_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIUsageLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operation', models.CharField(max_length=20, verbose_name='العملية')),
+                ('model_name', models.CharField(blank=True, max_length=50, verbose_name='الموديل')),
+                ('prompt_tokens', models.PositiveIntegerField(default=0, verbose_name='توكنات الطلب')),
+                ('completion_tokens', models.PositiveIntegerField(default=0, verbose_name='توكنات الإجابة')),
+                ('latency_ms', models.PositiveIntegerField(default=0, verbose_name='زمن النموذج (ms)')),
+                ('was_cached', models.BooleanField(default=False, verbose_name='من الذاكرة المؤقتة')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='التاريخ')),
+                ('course', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ai_usage_ledger', to='courses.course', verbose_name='المقرر')),
+                ('semester', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ai_usage_ledger', to='accounts.semester', verbose_name='الفصل الدراسي')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ai_usage_ledger', to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'سجل استهلاك التوكنات',
+                'verbose_name_plural': 'سجلات استهلاك التوكنات',
+                'db_table': 'ai_usage_ledger',
+                'indexes': [models.Index(fields=['user', 'created_at'], name='ai_usage_le_user_id_fcc4c4_idx'), models.Index(fields=['course', 'created_at'], name='ai_usage_le_course__9e2d70_idx'), models.Index(fields=['semester', 'created_at'], name='ai_usage_le_semeste_46f9c3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.10 on 2026-10-17 11:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_features', '0006_aiusageledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=50, verbose_name='المهمة')),
+                ('kwargs', models.JSONField(default=dict, verbose_name='المعاملات')),
+                ('lane', models.PositiveSmallIntegerField(choices=[(0, 'تفاعلي'), (10, 'دفعة مدرس'), (20, 'خلفية')], default=10, verbose_name='المسار')),
+                ('status', models.CharField(choices=[('queued', 'في الانتظار'), ('running', 'قيد التنفيذ'), ('done', 'مكتمل'), ('failed', 'فشل'), ('cancelled', 'ملغي')], default='queued', max_length=10, verbose_name='الحالة')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='النتيجة')),
+                ('error', models.TextField(blank=True, verbose_name='الخطأ')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='المحاولات')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3, verbose_name='الحد الأقصى للمحاولات')),
+                ('worker', models.CharField(blank=True, max_length=100, verbose_name='العامل')),
+                ('run_after', models.DateTimeField(blank=True, null=True, verbose_name='التنفيذ بعد')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='بدء التنفيذ')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='انتهاء التنفيذ')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ai_jobs', to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'مهمة ذكاء اصطناعي',
+                'verbose_name_plural': 'مهام الذكاء الاصطناعي',
+                'db_table': 'ai_jobs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'lane', 'created_at'], name='ai_jobs_status_865df5_idx'), models.Index(fields=['user', 'status'], name='ai_jobs_user_id_2c73f3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.10 on 2026-10-17 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_features', '0007_aijob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aijob',
+            name='progress_done',
+            field=models.PositiveIntegerField(default=0, verbose_name='الخطوات المنجزة'),
+        ),
+        migrations.AddField(
+            model_name='aijob',
+            name='progress_total',
+            field=models.PositiveIntegerField(default=0, verbose_name='إجمالي الخطوات'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_features', '0008_aijob_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aijob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='آخر نبضة'),
+        ),
+    ]
@@ -58,6 +58,13 @@ class AISummary(models.Model):
         verbose_name='مخزن مؤقتاً',
         help_text='يمكن إعادة استخدامه للمستخدمين الآخرين'
     )
+    source_hash = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        verbose_name='بصمة الملف المصدر',
+        help_text='بصمة محتوى الملف وقت التوليد (لمعرفة صلاحية الملخص)'
+    )
     
     class Meta:
         db_table = 'ai_summaries'
@@ -73,14 +80,16 @@ class AISummary(models.Model):
         return f"Summary for {self.file.title}"
     
     @classmethod
-    def get_cached_summary(cls, file):
+    def get_cached_summary(cls, file, content_hash=None):
         """
         الحصول على ملخص مخزن مؤقتاً للملف
+        
+        عند تمرير content_hash يُرجع الملخص فقط إذا وُلّد من نفس نسخة الملف.
         """
-        return cls.objects.filter(
-            file=file,
-            is_cached=True
-        ).first()
+        queryset = cls.objects.filter(file=file, is_cached=True)
+        if content_hash is not None:
+            queryset = queryset.filter(source_hash=content_hash)
+        return queryset.first()
 
 
 class AIGeneratedQuestion(models.Model):
@@ -150,6 +159,13 @@ class AIGeneratedQuestion(models.Model):
         verbose_name='مخزن مؤقتاً'
     )
     
+    source_hash = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        verbose_name='بصمة الملف المصدر'
+    )
+    
     class Meta:
         db_table = 'ai_generated_questions'
         verbose_name = 'سؤال AI'
@@ -164,17 +180,18 @@ class AIGeneratedQuestion(models.Model):
         return self.question_text[:50]
     
     @classmethod
-    def get_cached_questions(cls, file, question_type='mixed'):
+    def get_cached_questions(cls, file, question_type='mixed', content_hash=None):
         """
         الحصول على أسئلة مخزنة مؤقتاً للملف
+        
+        عند تمرير content_hash تُرجع فقط الأسئلة المولدة من نفس نسخة الملف.
         """
-        if question_type == 'mixed':
-            return cls.objects.filter(file=file, is_cached=True)
-        return cls.objects.filter(
-            file=file,
-            question_type=question_type,
-            is_cached=True
-        )
+        queryset = cls.objects.filter(file=file, is_cached=True)
+        if question_type != 'mixed':
+            queryset = queryset.filter(question_type=question_type)
+        if content_hash is not None:
+            queryset = queryset.filter(source_hash=content_hash)
+        return queryset
 
 
 class AIChat(models.Model):
@@ -296,33 +313,21 @@ class AIUsageLog(models.Model):
     @classmethod
     def check_rate_limit(cls, user):
         """
-        التحقق من حد الاستخدام للمستخدم
-        يسمح بـ 10 طلبات في الساعة
-        """
-        one_hour_ago = timezone.now() - timedelta(hours=1)
-        recent_requests = cls.objects.filter(
-            user=user,
-            request_time__gte=one_hour_ago,
-            was_cached=False  # لا نحسب الطلبات من الذاكرة المؤقتة
-        ).count()
+        التحقق من حد الاستخدام للمستخدم (بدون تسجيل طلب)
         
-        limit = getattr(settings, 'AI_RATE_LIMIT_PER_HOUR', 10)
-        return recent_requests < limit
+        الحد يُحسب من عداد الكاش المشترك وليس من هذا الجدول،
+        فالسجل هنا للتدقيق والإحصائيات فقط.
+        """
+        from apps.core.ratelimit import ai_rate_limiter
+        return ai_rate_limiter().peek(user.pk).allowed
     
     @classmethod
     def get_remaining_requests(cls, user):
         """
         الحصول على عدد الطلبات المتبقية للمستخدم
         """
-        one_hour_ago = timezone.now() - timedelta(hours=1)
-        recent_requests = cls.objects.filter(
-            user=user,
-            request_time__gte=one_hour_ago,
-            was_cached=False
-        ).count()
-        
-        limit = getattr(settings, 'AI_RATE_LIMIT_PER_HOUR', 10)
-        return max(0, limit - recent_requests)
+        from apps.core.ratelimit import ai_rate_limiter
+        return ai_rate_limiter().peek(user.pk).remaining
     
     @classmethod
     def log_request(cls, user, request_type, file=None, tokens_used=0, 
@@ -338,4 +343,356 @@ class AIUsageLog(models.Model):
             was_cached=was_cached,
             success=success,
             error_message=error_message
-        )
\ No newline at end of file
+        )
+
+class AIUsageLedger(models.Model):
+    """
+    سجل إلحاقي لاستهلاك التوكنات (سطر لكل استدعاء للنموذج)
+    
+    الأعداد من usage_metadata في استجابة النموذج، ومنه تُحسب
+    ميزانيات المستخدم والمقرر والفصل الدراسي.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='ai_usage_ledger',
+        verbose_name='المستخدم'
+    )
+    course = models.ForeignKey(
+        'courses.Course',
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='ai_usage_ledger',
+        verbose_name='المقرر'
+    )
+    semester = models.ForeignKey(
+        'accounts.Semester',
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='ai_usage_ledger',
+        verbose_name='الفصل الدراسي'
+    )
+    operation = models.CharField(
+        max_length=20,
+        verbose_name='العملية'
+    )
+    model_name = models.CharField(
+        max_length=50,
+        blank=True,
+        verbose_name='الموديل'
+    )
+    prompt_tokens = models.PositiveIntegerField(
+        default=0,
+        verbose_name='توكنات الطلب'
+    )
+    completion_tokens = models.PositiveIntegerField(
+        default=0,
+        verbose_name='توكنات الإجابة'
+    )
+    latency_ms = models.PositiveIntegerField(
+        default=0,
+        verbose_name='زمن النموذج (ms)'
+    )
+    was_cached = models.BooleanField(
+        default=False,
+        verbose_name='من الذاكرة المؤقتة'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='التاريخ'
+    )
+    
+    class Meta:
+        db_table = 'ai_usage_ledger'
+        verbose_name = 'سجل استهلاك التوكنات'
+        verbose_name_plural = 'سجلات استهلاك التوكنات'
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['course', 'created_at']),
+            models.Index(fields=['semester', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.operation} - {self.prompt_tokens + self.completion_tokens} tokens"
+    
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+
+class ExtractedText(models.Model):
+    """
+    جدول النصوص المستخرجة من الملفات (Content-Addressed)
+    
+    يُستخرج نص كل إصدار من الملف مرة واحدة فقط ويُخزن بمفتاح
+    (بصمة المحتوى، إصدار المستخرج)، فلا تعيد طلبات الذكاء الاصطناعي
+    تحليل ملفات PDF/DOCX/PPTX في كل مرة.
+    """
+    content_hash = models.CharField(
+        max_length=64,
+        verbose_name='بصمة المحتوى',
+        help_text='SHA-256 لمحتوى الملف المصدر'
+    )
+    extractor_version = models.PositiveIntegerField(
+        verbose_name='إصدار المستخرج'
+    )
+    text = models.TextField(
+        blank=True,
+        verbose_name='النص المستخرج'
+    )
+    char_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='عدد الأحرف'
+    )
+    page_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='عدد الصفحات'
+    )
+    extraction_time = models.FloatField(
+        default=0,
+        verbose_name='وقت الاستخراج (ثانية)'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='تاريخ الاستخراج'
+    )
+    
+    class Meta:
+        db_table = 'ai_extracted_texts'
+        verbose_name = 'نص مستخرج'
+        verbose_name_plural = 'النصوص المستخرجة'
+        unique_together = ('content_hash', 'extractor_version')
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.content_hash[:12]} (v{self.extractor_version})"
+    
+    @classmethod
+    def get_for_hash(cls, content_hash, extractor_version):
+        """
+        الحصول على النص المخزن لبصمة وإصدار معينين
+        """
+        return cls.objects.filter(
+            content_hash=content_hash,
+            extractor_version=extractor_version
+        ).first()
+
+
+class DocumentChunk(models.Model):
+    """
+    جدول مقاطع النص المفهرسة
+    
+    يُقسم النص المستخرج إلى مقاطع متداخلة مرة واحدة عند الفهرسة،
+    لتستخدمها ميزات الاسترجاع بدلاً من إرسال الملف كاملاً.
+    """
+    extracted_text = models.ForeignKey(
+        ExtractedText,
+        on_delete=models.CASCADE,
+        related_name='chunks',
+        verbose_name='النص المستخرج'
+    )
+    position = models.PositiveIntegerField(
+        verbose_name='الترتيب'
+    )
+    page_number = models.PositiveIntegerField(
+        default=1,
+        verbose_name='رقم الصفحة'
+    )
+    text = models.TextField(
+        verbose_name='نص المقطع'
+    )
+    
+    class Meta:
+        db_table = 'ai_document_chunks'
+        verbose_name = 'مقطع نصي'
+        verbose_name_plural = 'المقاطع النصية'
+        unique_together = ('extracted_text', 'position')
+        ordering = ['extracted_text', 'position']
+    
+    def __str__(self):
+        return f"{self.extracted_text} #{self.position} (ص{self.page_number})"
+
+
+class AIJob(models.Model):
+    """
+    جدول مهام الذكاء الاصطناعي (طابور بأولويات)
+    
+    المسارات: تفاعلي ثم دفعات المدرسين ثم المهام الخلفية. داخل المسار
+    يُختار مستخدم لديه أقل عدد من المهام الجارية، حتى لا يحجز مستخدم
+    واحد جميع العمال بطلب دفعة كبيرة.
+    """
+    LANE_INTERACTIVE = 0
+    LANE_BATCH = 10
+    LANE_BACKFILL = 20
+    LANE_CHOICES = [
+        (LANE_INTERACTIVE, 'تفاعلي'),
+        (LANE_BATCH, 'دفعة مدرس'),
+        (LANE_BACKFILL, 'خلفية'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('queued', 'في الانتظار'),
+        ('running', 'قيد التنفيذ'),
+        ('done', 'مكتمل'),
+        ('failed', 'فشل'),
+        ('cancelled', 'ملغي'),
+    ]
+    
+    task = models.CharField(
+        max_length=50,
+        verbose_name='المهمة'
+    )
+    kwargs = models.JSONField(
+        default=dict,
+        verbose_name='المعاملات'
+    )
+    lane = models.PositiveSmallIntegerField(
+        choices=LANE_CHOICES,
+        default=LANE_BATCH,
+        verbose_name='المسار'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='ai_jobs',
+        verbose_name='المستخدم'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='queued',
+        verbose_name='الحالة'
+    )
+    result = models.JSONField(
+        null=True,
+        blank=True,
+        verbose_name='النتيجة'
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='الخطأ'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='المحاولات'
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        default=3,
+        verbose_name='الحد الأقصى للمحاولات'
+    )
+    progress_done = models.PositiveIntegerField(
+        default=0,
+        verbose_name='الخطوات المنجزة'
+    )
+    progress_total = models.PositiveIntegerField(
+        default=0,
+        verbose_name='إجمالي الخطوات'
+    )
+    worker = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='العامل'
+    )
+    run_after = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='التنفيذ بعد'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='تاريخ الإنشاء'
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='بدء التنفيذ'
+    )
+    heartbeat_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='آخر نبضة'
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='انتهاء التنفيذ'
+    )
+    
+    class Meta:
+        db_table = 'ai_jobs'
+        verbose_name = 'مهمة ذكاء اصطناعي'
+        verbose_name_plural = 'مهام الذكاء الاصطناعي'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'lane', 'created_at']),
+            models.Index(fields=['user', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.get_status_display()})"
+    
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed', 'cancelled')
+    
+    @property
+    def progress_percent(self):
+        if not self.progress_total:
+            return 0
+        return round(100 * self.progress_done / self.progress_total)
+    
+    @classmethod
+    def claim(cls, worker: str, lanes=None):
+        """
+        حجز المهمة التالية للعامل (أو None إذا كان الطابور فارغاً).
+        
+        أعلى مسار فيه مهام أولاً، ثم المستخدم صاحب أقل عدد من المهام
+        الجارية، ثم الأقدم. التحديث المشروط بالحالة يضمن ألا يحجز
+        عاملان المهمة نفسها.
+        """
+        from django.db.models import Count, Q
+        
+        now = timezone.now()
+        queued = cls.objects.filter(status='queued').filter(
+            Q(run_after__isnull=True) | Q(run_after__lte=now)
+        )
+        if lanes is not None:
+            queued = queued.filter(lane__in=lanes)
+        
+        for _ in range(5):
+            top = queued.order_by('lane', 'created_at').values_list('lane', flat=True).first()
+            if top is None:
+                return None
+            candidates = list(queued.filter(lane=top).order_by('created_at')[:50])
+            running = dict(
+                cls.objects.filter(status='running')
+                .values_list('user')
+                .annotate(count=Count('id'))
+            )
+            job = min(candidates, key=lambda j: (running.get(j.user_id, 0), j.created_at))
+            claimed = cls.objects.filter(pk=job.pk, status='queued').update(
+                status='running', worker=worker, started_at=now, heartbeat_at=now,
+                attempts=models.F('attempts') + 1
+            )
+            if claimed:
+                job.refresh_from_db()
+                return job
+        return None
+    
+    @classmethod
+    def requeue_stale(cls, timeout_seconds: int) -> int:
+        """
+        إعادة المهام العالقة (عامل توقف أثناء التنفيذ) إلى الطابور.
+        
+        العامل يحدّث heartbeat_at طوال التنفيذ، فالمهمة الطويلة لا تُعتبر
+        عالقة ما دام عاملها حياً.
+        """
+        from django.db.models import Q
+        
+        cutoff = timezone.now() - timedelta(seconds=timeout_seconds)
+        return cls.objects.filter(status='running').filter(
+            Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+        ).update(status='queued', worker='')
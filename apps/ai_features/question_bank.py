@@ -0,0 +1,225 @@
+"""
+بنك أسئلة المقرر
+S-ACM - Smart Academic Content Management System
+
+يولد أسئلة لجميع الملفات الظاهرة في المقرر في مهمة واحدة:
+- النص من المخزن (ExtractedTextStore)، والأسئلة المحفوظة الصالحة تُعاد كما هي
+- استدعاءات النموذج بتوازٍ محدود (AI_QUESTION_BANK_WORKERS)
+- الأسئلة شبه المتطابقة بين الملفات تظهر في البنك مرة واحدة
+- الأسئلة الجديدة تُحفظ بعملية bulk_create واحدة
+
+Example:
+    bank = build_question_bank(course, 'mcq', 10, user=instructor, progress=report_progress)
+    bank.question_ids
+"""
+
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from .indexing import tokenize
+
+logger = logging.getLogger('ai_features')
+
+DUPLICATE_THRESHOLD = 0.8
+
+
+# ========== Deduplication ==========
+
+class QuestionDeduplicator:
+    """
+    كشف الأسئلة شبه المتطابقة بتشابه Jaccard لرموز السؤال المطبّعة.
+
+    التطبيع (حذف التشكيل وأداة التعريف وكلمات الربط) يجعل
+    "ما هو المكدس؟" و"ما المكدس" سؤالاً واحداً.
+    """
+
+    def __init__(self, threshold: float = DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._exact = set()
+        self._seen: List[frozenset] = []
+
+    def is_duplicate(self, text: str) -> bool:
+        """True إذا كان السؤال مكرراً، وإلا يُضاف إلى الأسئلة المعروفة."""
+        tokens = frozenset(tokenize(text)) or frozenset([text.strip()])
+        if tokens in self._exact:
+            return True
+        for seen in self._seen:
+            # التشابه لا يتجاوز نسبة الحجمين: تخطي المقارنة المستحيلة
+            if min(len(seen), len(tokens)) < self.threshold * max(len(seen), len(tokens)):
+                continue
+            if len(seen & tokens) / len(seen | tokens) >= self.threshold:
+                return True
+        self._exact.add(tokens)
+        self._seen.append(tokens)
+        return False
+
+
+# ========== Builder ==========
+
+@dataclass
+class QuestionBankResult:
+    """نتيجة توليد بنك الأسئلة."""
+    files: int = 0
+    generated: int = 0
+    reused: int = 0
+    duplicates: int = 0
+    failed: List[str] = field(default_factory=list)
+    question_ids: List[int] = field(default_factory=list)
+    error: str = ''
+    cancelled: bool = False
+
+    def as_dict(self) -> Dict:
+        data = asdict(self)
+        data['count'] = len(self.question_ids)
+        return data
+
+
+def _generate(service, file_obj, text: str, question_type: str, num_questions: int, refresh: bool):
+    """توليد أسئلة ملف واحد في خيط التنفيذ (بدون قاعدة البيانات)."""
+    from .usage import collect_usage
+
+    with collect_usage() as meter:
+        response = service.generate_questions_for_file(
+            file_obj, question_type, num_questions, refresh=refresh, text=text
+        )
+    return response, meter
+
+
+def build_question_bank(
+    course,
+    question_type: str = 'mixed',
+    num_questions: int = 5,
+    refresh: bool = False,
+    user=None,
+    service=None,
+    progress: Optional[Callable[[int, int], bool]] = None
+) -> QuestionBankResult:
+    """
+    توليد بنك أسئلة لجميع ملفات المقرر الظاهرة.
+
+    قاعدة البيانات تُستخدم من الخيط الحالي فقط؛ الخيوط تنفذ استدعاءات
+    النموذج على نص مستخرج مسبقاً. الميزانية تُفحص قبل إرسال كل ملف.
+
+    Args:
+        num_questions: عدد الأسئلة لكل ملف
+        user: المستخدم الذي يُحسب عليه الاستهلاك
+        progress: دالة (المنجز، الإجمالي) تُستدعى بعد كل ملف؛ إرجاع False يوقف التوليد
+
+    Returns:
+        QuestionBankResult: question_ids هي أسئلة البنك بعد حذف المكرر
+    """
+    from .models import AIGeneratedQuestion
+    from .services import (
+        AIArtifactStore, AIResponse, ExtractedTextStore, GeminiService, TextExtractorFactory
+    )
+    from .usage import account_usage, check_budget
+
+    files = [
+        file_obj
+        for file_obj in course.files.filter(is_deleted=False, is_visible=True).order_by('upload_date', 'id')
+        if file_obj.local_file and TextExtractorFactory.get_extractor(Path(file_obj.local_file.name))
+    ]
+    result = QuestionBankResult(files=len(files))
+    stored: Dict[int, list] = {}
+    pending = []
+    for file_obj in files:
+        questions = None if refresh else AIArtifactStore.stored_questions(file_obj, question_type, num_questions)
+        if questions is not None:
+            stored[file_obj.pk] = questions
+            result.reused += 1
+        else:
+            pending.append(file_obj)
+
+    done = result.reused
+    report = progress or (lambda done, total: True)
+    report(done, len(files))
+
+    generated: Dict[int, list] = {}
+    service = service or GeminiService()
+    workers = max(1, min(getattr(settings, 'AI_QUESTION_BANK_WORKERS', 4), len(pending)))
+    queue = iter(pending)
+    running = {}
+
+    def submit_next(executor) -> None:
+        for file_obj in queue:
+            error = check_budget(user, file_obj)
+            if error:
+                result.error = error
+                return
+            text = ExtractedTextStore.get_text(file_obj)
+            if not text:
+                result.failed.append(file_obj.title)
+                continue
+            # البصمة تُحسب هنا حتى لا يحتاجها الخيط من قاعدة البيانات
+            file_obj.get_content_hash()
+            future = executor.submit(
+                _generate, service, file_obj, text, question_type, num_questions, refresh
+            )
+            running[future] = file_obj
+            return
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ai-qbank') as executor:
+        for _ in range(workers):
+            submit_next(executor)
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                file_obj = running.pop(future)
+                try:
+                    response, meter = future.result()
+                    account_usage(user, file_obj, 'questions', meter)
+                except Exception as e:
+                    response = AIResponse(success=False, error=str(e))
+                if response.success:
+                    generated[file_obj.pk] = response.data
+                    result.generated += 1
+                else:
+                    logger.warning(f"Question bank: file {file_obj.pk} failed: {response.error}")
+                    result.failed.append(file_obj.title)
+                done += 1
+                if not report(done, len(files)):
+                    result.cancelled = True
+                if not result.cancelled and not result.error:
+                    submit_next(executor)
+
+    # البنك بترتيب الملفات: أول ظهور للسؤال يبقى والمكرر يُحذف من البنك فقط
+    dedupe = QuestionDeduplicator()
+    bank = []
+    new_questions = []
+    for file_obj in files:
+        if file_obj.pk in stored:
+            questions = stored[file_obj.pk]
+        elif file_obj.pk in generated:
+            questions = AIArtifactStore.build_questions(
+                file_obj, generated[file_obj.pk], user=user, content_hash=file_obj.content_hash
+            )
+            new_questions += questions
+        else:
+            continue
+        for question in questions:
+            if dedupe.is_duplicate(question.question_text):
+                result.duplicates += 1
+            else:
+                bank.append(question)
+
+    with transaction.atomic():
+        if refresh and generated:
+            # الأسئلة القديمة تبقى للأرشيف لكنها لا تُعاد بعد الآن
+            old = AIGeneratedQuestion.objects.filter(file_id__in=list(generated), is_cached=True)
+            if question_type != 'mixed':
+                old = old.filter(question_type=question_type)
+            old.update(is_cached=False)
+        AIGeneratedQuestion.objects.bulk_create(new_questions)
+
+    result.question_ids = [question.pk for question in bank]
+    logger.info(
+        f"Question bank for course {course.pk}: {len(files)} files, {result.generated} generated, "
+        f"{result.reused} reused, {result.duplicates} duplicates dropped"
+    )
+    return result
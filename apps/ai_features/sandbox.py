@@ -0,0 +1,196 @@
+"""
+عزل استخراج النص في عمليات فرعية
+S-ACM - Smart Academic Content Management System
+
+ملف PDF تالف أو ضخم قد يستهلك المعالج أو الذاكرة لعامل الويب بالكامل.
+لذا يُنفذ الاستخراج في مجمع عمليات فرعية محدود، ولكل مهمة:
+- مهلة زمنية (AI_SANDBOX_TIMEOUT)
+- سقف لذاكرة العملية RSS (AI_SANDBOX_MAX_RSS_MB)
+- حد لعدد الصفحات (AI_SANDBOX_MAX_PAGES)
+وتُستبدل العملية بعد AI_SANDBOX_MAX_JOBS مهمة أو عند تجاوز أي حد.
+
+تُستورد هذه الوحدة في العمليات الفرعية (spawn)، لذا تؤجل استيراد Django.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger('ai_features')
+
+POLL_INTERVAL = 0.05
+
+
+def _worker_main(conn) -> None:
+    """حلقة العملية الفرعية: استقبال مسار، إرسال الصفحات أو رسالة الخطأ."""
+    # لا عمليات متداخلة داخل العزل: الحدود تُراقب على هذه العملية فقط
+    os.environ['AI_EXTRACT_PROCESSES'] = '0'
+    from apps.ai_features.services import TextExtractorFactory, TextExtractionError
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        path, max_chars, max_pages = job
+        try:
+            pages = TextExtractorFactory.extract_pages(Path(path), max_chars, max_pages)
+            conn.send(('ok', pages))
+        except TextExtractionError as e:
+            conn.send(('error', str(e)))
+        except Exception as e:
+            conn.send(('error', f"Extraction failed: {e}"))
+
+
+class _SandboxWorker:
+    """عملية فرعية واحدة مع قناة الاتصال بها."""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn,), name='extract-sandbox', daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+
+    def rss_bytes(self) -> Optional[int]:
+        """الذاكرة المقيمة للعملية من /proc (None إن لم تتوفر)."""
+        try:
+            with open(f"/proc/{self.process.pid}/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class ExtractionSandbox:
+    """
+    مجمع عمليات محدود لاستخراج النص.
+
+    Example:
+        pages = get_extraction_sandbox().extract_pages(path, max_chars=100000)
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        timeout: float = 60,
+        max_rss_mb: int = 1024,
+        max_pages: int = 1000,
+        max_jobs: int = 50
+    ):
+        self.timeout = timeout
+        self.max_rss = max_rss_mb * 1024 * 1024 if max_rss_mb else None
+        self.max_pages = max_pages or None
+        self.max_jobs = max_jobs
+        self._context = multiprocessing.get_context('spawn')
+        self._slots = threading.BoundedSemaphore(workers)
+        self._idle: List[_SandboxWorker] = []
+        self._lock = threading.Lock()
+
+    def extract_pages(self, file_path: Path, max_chars: Optional[int] = None) -> List[str]:
+        """
+        استخراج صفحات الملف داخل عملية فرعية.
+
+        Raises:
+            TextExtractionError: عند فشل الاستخراج أو تجاوز أحد الحدود
+        """
+        from apps.ai_features.services import TextExtractionError
+
+        with self._slots:
+            worker = self._acquire()
+            try:
+                status, payload = self._run(worker, (str(file_path), max_chars, self.max_pages))
+            except BaseException:
+                worker.kill()
+                raise
+            self._release(worker)
+
+        if status == 'error':
+            raise TextExtractionError(payload)
+        return payload
+
+    def _acquire(self) -> _SandboxWorker:
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                worker.conn.close()
+        return _SandboxWorker(self._context)
+
+    def _release(self, worker: _SandboxWorker) -> None:
+        worker.jobs += 1
+        if worker.jobs >= self.max_jobs:
+            # تدوير العملية يحد من تراكم الذاكرة المجزأة
+            worker.stop()
+            return
+        with self._lock:
+            self._idle.append(worker)
+
+    def _run(self, worker: _SandboxWorker, job):
+        from apps.ai_features.services import TextExtractionError
+
+        path = job[0]
+        worker.conn.send(job)
+        deadline = time.monotonic() + self.timeout
+        while not worker.conn.poll(POLL_INTERVAL):
+            if not worker.process.is_alive():
+                raise TextExtractionError(f"Extraction worker died while reading {path}")
+            if time.monotonic() > deadline:
+                logger.warning(f"Extraction of {path} exceeded {self.timeout}s, killing worker")
+                raise TextExtractionError(f"Extraction timed out after {self.timeout}s")
+            rss = worker.rss_bytes() if self.max_rss else None
+            if rss is not None and rss > self.max_rss:
+                logger.warning(f"Extraction of {path} exceeded memory limit ({rss} bytes), killing worker")
+                raise TextExtractionError("Extraction exceeded memory limit")
+        return worker.conn.recv()
+
+    def shutdown(self) -> None:
+        """إيقاف جميع العمليات الخاملة."""
+        with self._lock:
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            worker.stop()
+
+
+_sandbox: Optional[ExtractionSandbox] = None
+_sandbox_lock = threading.Lock()
+
+
+def get_extraction_sandbox() -> ExtractionSandbox:
+    """مجمع العزل المشترك على مستوى العملية (من إعدادات AI_SANDBOX_*)."""
+    global _sandbox
+    from django.conf import settings
+
+    with _sandbox_lock:
+        if _sandbox is None:
+            _sandbox = ExtractionSandbox(
+                workers=getattr(settings, 'AI_SANDBOX_WORKERS', 2),
+                timeout=getattr(settings, 'AI_SANDBOX_TIMEOUT', 60),
+                max_rss_mb=getattr(settings, 'AI_SANDBOX_MAX_RSS_MB', 1024),
+                max_pages=getattr(settings, 'AI_SANDBOX_MAX_PAGES', 1000),
+                max_jobs=getattr(settings, 'AI_SANDBOX_MAX_JOBS', 50),
+            )
+        return _sandbox
@@ -14,16 +14,22 @@ S-ACM - Smart Academic Content Management System
 
 from __future__ import annotations
 
+import asyncio
+import contextvars
 import json
 import hashlib
+import inspect
 import logging
 import os
+import threading
+import time
 from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
 from dataclasses import dataclass, field
 from enum import Enum
 from functools import wraps
 from pathlib import Path
-from typing import Optional, List, Dict, Any, Callable, TypeVar, Generic
+from typing import Optional, List, Dict, Any, Callable, Iterator, TypeVar, Generic
 
 from django.conf import settings
 from django.core.cache import cache
@@ -38,6 +44,13 @@ GEMINI_MODEL = "gemini-2.0-flash"
 MAX_INPUT_LENGTH = 30000
 CACHE_TIMEOUT = 3600  # 1 hour
 MAX_RETRIES = 3
+# ارفع هذا الرقم عند تغيير منطق الاستخراج لإبطال النصوص المخزنة
+EXTRACTOR_VERSION = 3
+# إصدارات قوالب الطلبات: رفع الرقم يُبطل النتائج المخزنة لذلك القالب
+PROMPT_VERSIONS = {
+    'generate_summary': 1,
+    'generate_questions': 1,
+}
 
 
 # ========== Custom Exceptions ==========
@@ -123,11 +136,143 @@ class AIResponse:
     cached: bool = False
 
 
+class FallbackSummary(str):
+    """تلخيص بديل عند فشل النموذج (لا يُخزن في الكاش ولا يُحفظ)."""
+    is_fallback = True
+
+
+class FallbackQuestions(list):
+    """أسئلة بديلة عند فشل النموذج (لا تُخزن في الكاش ولا تُحفظ)."""
+    is_fallback = True
+
+
+def is_fallback(result) -> bool:
+    """هل النتيجة بديلة عن خطأ مؤقت في النموذج؟"""
+    return getattr(result, 'is_fallback', False)
+
+
+FALLBACK_ERROR = 'خدمة الذكاء الاصطناعي غير متاحة حالياً. يرجى المحاولة لاحقاً.'
+
+
 # ========== Decorators ==========
 
 T = TypeVar('T')
 
 
+class _InFlightCall:
+    """استدعاء جارٍ تنتظره الطلبات المكررة داخل العملية."""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    دمج الطلبات المتطابقة المتزامنة (Single-Flight).
+    
+    أول طلب لمفتاح معين ينفذ الدالة ويخزن النتيجة في الكاش، وبقية
+    الطلبات تنتظر نتيجته بدلاً من إرسال استدعاءات مكررة للنموذج:
+    - داخل العملية عبر threading.Event
+    - بين العمليات عبر قفل في الكاش (cache.add) ثم انتظار النتيجة
+    
+    Example:
+        result = single_flight.do(cache_key, lambda: expensive(), timeout=3600)
+    """
+    
+    poll_interval = 0.25
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _InFlightCall] = {}
+        self._stats = {'executed': 0, 'coalesced': 0}
+    
+    def do(self, key: str, func: Callable[[], T], timeout: int = CACHE_TIMEOUT) -> T:
+        """
+        تنفيذ func مرة واحدة لكل مفتاح بين الطلبات المتزامنة.
+        
+        Args:
+            key: مفتاح الكاش للنتيجة
+            func: الدالة المنفذة عند عدم وجود نتيجة
+            timeout: مدة تخزين النتيجة
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _InFlightCall()
+        
+        if not leader:
+            if not call.event.wait(getattr(settings, 'AI_SINGLE_FLIGHT_TIMEOUT', 120)):
+                # الطلب القائد عالق في استدعاء النموذج: ننفذ بأنفسنا كما بين العمليات
+                logger.warning(f"Single-flight wait timed out for {key}")
+                result = cache.get(key)
+                return result if result is not None else func()
+            self._record_coalesced(key)
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = self._do_shared(key, func, timeout)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+    
+    def _do_shared(self, key: str, func: Callable[[], T], timeout: int) -> T:
+        """التنفيذ بقفل في الكاش لدمج الطلبات بين العمليات."""
+        lock_key = f"{key}:lock"
+        lock_timeout = getattr(settings, 'AI_SINGLE_FLIGHT_TIMEOUT', 120)
+        deadline = time.monotonic() + lock_timeout
+        
+        while True:
+            if cache.add(lock_key, 1, lock_timeout):
+                try:
+                    # ربما أنهى طلب آخر التنفيذ قبل حصولنا على القفل
+                    result = cache.get(key)
+                    if result is not None:
+                        self._record_coalesced(key)
+                        return result
+                    result = func()
+                    if result is not None and not is_fallback(result):
+                        cache.set(key, result, timeout)
+                    with self._lock:
+                        self._stats['executed'] += 1
+                    return result
+                finally:
+                    cache.delete(lock_key)
+            
+            time.sleep(self.poll_interval)
+            result = cache.get(key)
+            if result is not None:
+                self._record_coalesced(key)
+                return result
+            if time.monotonic() > deadline:
+                # صاحب القفل لم ينته في الوقت المتوقع: ننفذ بأنفسنا
+                logger.warning(f"Single-flight wait timed out for {key}")
+                return func()
+    
+    def _record_coalesced(self, key: str) -> None:
+        with self._lock:
+            self._stats['coalesced'] += 1
+        logger.debug(f"Coalesced duplicate AI call for {key}")
+    
+    @property
+    def stats(self) -> Dict[str, int]:
+        """عدد الاستدعاءات المنفذة والمدموجة في هذه العملية."""
+        with self._lock:
+            return dict(self._stats)
+
+
+single_flight = SingleFlight()
+
+
 def cache_result(timeout: int = CACHE_TIMEOUT):
     """
     Decorator لتخزين نتائج AI في الكاش.
@@ -152,23 +297,34 @@ def cache_result(timeout: int = CACHE_TIMEOUT):
                 logger.debug(f"Cache hit for {func.__name__}")
                 return cached_result
             
-            # تنفيذ الدالة
-            result = func(self, text, *args, **kwargs)
-            
-            # تخزين في الكاش
-            if result is not None:
-                cache.set(cache_key, result, timeout)
-                logger.debug(f"Cached result for {func.__name__}")
-            
-            return result
+            # تنفيذ الدالة مرة واحدة للطلبات المتطابقة المتزامنة وتخزين النتيجة
+            return single_flight.do(
+                cache_key,
+                lambda: func(self, text, *args, **kwargs),
+                timeout
+            )
         return wrapper
     return decorator
 
 
 def _generate_cache_key(func_name: str, text: str, args: tuple, kwargs: dict) -> str:
-    """توليد مفتاح الكاش."""
-    content = f"{func_name}:{text}:{str(args)}:{str(sorted(kwargs.items()))}"
-    return f"ai:{hashlib.md5(content.encode()).hexdigest()}"
+    """توليد مفتاح الكاش (للنصوص التي لا ترتبط بملف)."""
+    digest = hashlib.md5(text.encode()).hexdigest()
+    params = hashlib.md5(f"{args}:{sorted(kwargs.items())}".encode()).hexdigest()[:12]
+    version = PROMPT_VERSIONS.get(func_name, 1)
+    return f"ai:{func_name}:p{version}:{digest}:{params}"
+
+
+def _file_cache_key(func_name: str, content_hash: str, **params) -> str:
+    """
+    مفتاح الكاش لنتيجة مرتبطة بملف.
+    
+    يعتمد على بصمة الملف وإصدار المستخرج وإصدار القالب والمعاملات،
+    فلا يحتاج إلى استخراج النص أو تجزئته عند الإصابة.
+    """
+    params_part = ','.join(f"{key}={value}" for key, value in sorted(params.items()))
+    version = PROMPT_VERSIONS.get(func_name, 1)
+    return f"ai:{func_name}:p{version}:e{EXTRACTOR_VERSION}:{content_hash}:{params_part}"
 
 
 def retry_on_error(max_retries: int = MAX_RETRIES, delay_base: float = 1.0):
@@ -180,9 +336,23 @@ def retry_on_error(max_retries: int = MAX_RETRIES, delay_base: float = 1.0):
         delay_base: أساس التأخير (exponential backoff)
     """
     def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs) -> T:
+                for attempt in range(max_retries):
+                    try:
+                        return await func(*args, **kwargs)
+                    except GeminiAPIError as e:
+                        if attempt == max_retries - 1:
+                            raise
+                        delay = delay_base * (2 ** attempt)
+                        logger.warning(f"API error, retrying in {delay}s: {e}")
+                        await asyncio.sleep(delay)
+                raise GeminiAPIError("Max retries exceeded")
+            return async_wrapper
+        
         @wraps(func)
         def wrapper(*args, **kwargs) -> T:
-            import time
             last_exception = None
             
             for attempt in range(max_retries):
@@ -212,59 +382,176 @@ def retry_on_error(max_retries: int = MAX_RETRIES, delay_base: float = 1.0):
 
 # ========== Text Extractors ==========
 
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+
+def _get_extract_pool(workers: int):
+    """
+    مجمع عمليات مشترك لاستخراج صفحات ملفات PDF الكبيرة بالتوازي.
+    
+    يستخدم spawn حتى لا ترث العمليات الفرعية خيوط خادم الويب وأقفاله.
+    """
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            _extract_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _extract_pool
+
+
+def limit_pages(
+    pages: Iterator[str],
+    max_chars: Optional[int] = None,
+    max_pages: Optional[int] = None
+) -> Iterator[str]:
+    """
+    تمرير الصفحات حتى بلوغ ميزانية الأحرف أو عدد الصفحات ثم التوقف.
+    
+    تُقص آخر صفحة عند حد الأحرف، ويُغلق مولّد الصفحات فلا تُستخرج
+    الصفحات المتبقية.
+    """
+    if not max_chars and not max_pages:
+        yield from pages
+        return
+    
+    remaining = max_chars or float('inf')
+    try:
+        for number, page in enumerate(pages, start=1):
+            if len(page) >= remaining:
+                yield page[:remaining]
+                logger.info(f"Extraction stopped at {max_chars} characters")
+                return
+            remaining -= len(page) + 1  # فاصل السطر بين الصفحات
+            yield page
+            if max_pages and number >= max_pages:
+                logger.info(f"Extraction stopped at {max_pages} pages")
+                return
+    finally:
+        close = getattr(pages, 'close', None)
+        if close is not None:
+            close()
+
+
 class TextExtractor(ABC):
     """Abstract base class for text extractors."""
     
     @abstractmethod
-    def extract(self, file_path: Path) -> str:
-        """استخراج النص من الملف."""
+    def iter_pages(self, file_path: Path) -> Iterator[str]:
+        """
+        استخراج النص صفحة بصفحة (أو شريحة بشريحة) عند الطلب.
+        
+        الصيغ التي لا تعرف مفهوم الصفحة تُرجع صفحة واحدة.
+        """
         pass
     
     @abstractmethod
     def supports(self, file_path: Path) -> bool:
         """التحقق من دعم نوع الملف."""
         pass
+    
+    def extract(self, file_path: Path, max_chars: Optional[int] = None) -> str:
+        """استخراج النص كاملاً (أو حتى max_chars حرفاً)."""
+        pages = limit_pages(self.iter_pages(file_path), max_chars)
+        return "\n".join(page for page in pages if page)
+    
+    def extract_pages(self, file_path: Path) -> List[str]:
+        """استخراج النص مقسماً إلى صفحات."""
+        return list(self.iter_pages(file_path))
 
 
 class PDFExtractor(TextExtractor):
-    """مستخرج النص من ملفات PDF."""
+    """
+    مستخرج النص من ملفات PDF.
+    
+    الملفات التي تبلغ AI_PDF_PARALLEL_MIN_PAGES صفحة تُقسم إلى نطاقات
+    تُستخرج في عمليات منفصلة (AI_EXTRACT_PROCESSES) وتُعاد بالترتيب.
+    """
     
     def supports(self, file_path: Path) -> bool:
         return file_path.suffix.lower() == '.pdf'
     
-    def extract(self, file_path: Path) -> str:
+    def iter_pages(self, file_path: Path) -> Iterator[str]:
         try:
             import pdfplumber
         except ImportError:
             raise TextExtractionError("pdfplumber not installed. Run: pip install pdfplumber")
         
         try:
-            text_parts = []
             with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_parts.append(page_text)
-            return "\n".join(text_parts)
+                page_count = len(pdf.pages)
+                parallel = self._use_parallel(page_count)
+                if not parallel:
+                    for page in pdf.pages:
+                        yield page.extract_text() or ""
+                        # تحرير كائنات الصفحة بعد استخراجها
+                        page.close()
+            if parallel:
+                yield from self._iter_pages_parallel(file_path, page_count)
+        except TextExtractionError:
+            raise
         except Exception as e:
             raise TextExtractionError(f"Failed to extract text from PDF: {e}")
+    
+    @staticmethod
+    def _use_parallel(page_count: int) -> bool:
+        workers = getattr(settings, 'AI_EXTRACT_PROCESSES', 0)
+        return workers > 1 and page_count >= getattr(settings, 'AI_PDF_PARALLEL_MIN_PAGES', 50)
+    
+    def _iter_pages_parallel(self, file_path: Path, page_count: int) -> Iterator[str]:
+        """استخراج نطاقات الصفحات بالتوازي مع الحفاظ على ترتيبها."""
+        from apps.ai_features.workers import extract_pdf_range
+        
+        workers = settings.AI_EXTRACT_PROCESSES
+        pool = _get_extract_pool(workers)
+        # نطاقات أصغر من page_count / workers حتى تصل الصفحات الأولى مبكراً
+        step = max(1, -(-page_count // (workers * 4)))
+        futures = [
+            pool.submit(extract_pdf_range, str(file_path), start, start + step)
+            for start in range(0, page_count, step)
+        ]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            # عند التوقف المبكر لا داعي لاستخراج النطاقات المتبقية
+            for future in futures:
+                future.cancel()
 
 
 class DocxExtractor(TextExtractor):
-    """مستخرج النص من ملفات Word."""
+    """
+    مستخرج النص من ملفات Word.
+    
+    لا يحفظ DOCX أرقام الصفحات، لذا تُقسم الصفحات عند فواصل الصفحات الصريحة.
+    """
     
     def supports(self, file_path: Path) -> bool:
         return file_path.suffix.lower() in ['.docx', '.doc']
     
-    def extract(self, file_path: Path) -> str:
+    def iter_pages(self, file_path: Path) -> Iterator[str]:
         try:
             from docx import Document
+            from docx.oxml.ns import qn
         except ImportError:
             raise TextExtractionError("python-docx not installed. Run: pip install python-docx")
         
         try:
             doc = Document(file_path)
-            return "\n".join(para.text for para in doc.paragraphs if para.text)
+            lines = []
+            for para in doc.paragraphs:
+                # الفاصل نفسه يظهر في para.text كسطر فارغ
+                text = para.text.strip()
+                if text:
+                    lines.append(text)
+                if any(br.get(qn('w:type')) == 'page' for br in para._p.iter(qn('w:br'))):
+                    yield "\n".join(lines)
+                    lines = []
+            yield "\n".join(lines)
         except Exception as e:
             raise TextExtractionError(f"Failed to extract text from DOCX: {e}")
 
@@ -275,7 +562,7 @@ class PptxExtractor(TextExtractor):
     def supports(self, file_path: Path) -> bool:
         return file_path.suffix.lower() == '.pptx'
     
-    def extract(self, file_path: Path) -> str:
+    def iter_pages(self, file_path: Path) -> Iterator[str]:
         try:
             from pptx import Presentation
         except ImportError:
@@ -283,12 +570,11 @@ class PptxExtractor(TextExtractor):
         
         try:
             prs = Presentation(file_path)
-            text_parts = []
             for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text") and shape.text:
-                        text_parts.append(shape.text)
-            return "\n".join(text_parts)
+                yield "\n".join(
+                    shape.text for shape in slide.shapes
+                    if hasattr(shape, "text") and shape.text
+                )
         except Exception as e:
             raise TextExtractionError(f"Failed to extract text from PPTX: {e}")
 
@@ -301,16 +587,17 @@ class PlainTextExtractor(TextExtractor):
     def supports(self, file_path: Path) -> bool:
         return file_path.suffix.lower() in self.SUPPORTED_EXTENSIONS
     
-    def extract(self, file_path: Path) -> str:
+    def iter_pages(self, file_path: Path) -> Iterator[str]:
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
+                text = f.read()
         except UnicodeDecodeError:
             # محاولة مع encoding مختلف
             with open(file_path, 'r', encoding='cp1256') as f:
-                return f.read()
+                text = f.read()
         except Exception as e:
             raise TextExtractionError(f"Failed to read text file: {e}")
+        yield text
 
 
 class TextExtractorFactory:
@@ -332,12 +619,226 @@ class TextExtractorFactory:
         return None
     
     @classmethod
-    def extract_text(cls, file_path: Path) -> str:
-        """استخراج النص من الملف."""
+    def _require_extractor(cls, file_path: Path) -> TextExtractor:
         extractor = cls.get_extractor(file_path)
         if extractor is None:
             raise TextExtractionError(f"Unsupported file type: {file_path.suffix}")
-        return extractor.extract(file_path)
+        return extractor
+    
+    @classmethod
+    def extract_text(cls, file_path: Path, max_chars: Optional[int] = None) -> str:
+        """استخراج النص من الملف (مع التوقف عند max_chars إن حُدد)."""
+        return cls._require_extractor(file_path).extract(file_path, max_chars)
+    
+    @classmethod
+    def iter_pages(
+        cls,
+        file_path: Path,
+        max_chars: Optional[int] = None,
+        max_pages: Optional[int] = None
+    ) -> Iterator[str]:
+        """صفحات الملف تدريجياً حتى بلوغ max_chars حرفاً أو max_pages صفحة."""
+        return limit_pages(cls._require_extractor(file_path).iter_pages(file_path), max_chars, max_pages)
+    
+    @classmethod
+    def extract_pages(
+        cls,
+        file_path: Path,
+        max_chars: Optional[int] = None,
+        max_pages: Optional[int] = None
+    ) -> List[str]:
+        """استخراج النص من الملف مقسماً إلى صفحات."""
+        return list(cls.iter_pages(file_path, max_chars, max_pages))
+
+
+# ========== Extracted Text Store ==========
+
+class ExtractedTextStore:
+    """
+    مخزن النصوص المستخرجة (Content-Addressed).
+    
+    يُفهرس النص ببصمة محتوى الملف وإصدار المستخرج، فيُستخرج نص كل
+    إصدار من الملف ويُقسم إلى مقاطع مرة واحدة فقط. استبدال local_file
+    يغير البصمة فيُستخرج النص الجديد تلقائياً في أول طلب.
+    
+    Example:
+        text = ExtractedTextStore.get_text(file_obj)
+    """
+    
+    @classmethod
+    def get_record(cls, file_obj):
+        """
+        الحصول على سجل النص المستخرج (مع مقاطعه) أو إنشاؤه.
+        
+        Args:
+            file_obj: كائن الملف (LectureFile)
+            
+        Returns:
+            ExtractedText: السجل أو None عند الفشل
+        """
+        from django.db import transaction
+        from apps.ai_features.models import ExtractedText, DocumentChunk
+        from apps.ai_features.indexing import split_into_chunks
+        
+        if not file_obj.local_file:
+            logger.warning(f"File {file_obj.id} has no local file")
+            return None
+        
+        content_hash = file_obj.get_content_hash()
+        if content_hash is None:
+            logger.error(f"Could not read content of file {file_obj.id}")
+            return None
+        
+        stored = ExtractedText.get_for_hash(content_hash, EXTRACTOR_VERSION)
+        if stored is not None:
+            logger.debug(f"Extracted text hit for file {file_obj.id}")
+            return stored
+        
+        file_path = Path(file_obj.local_file.path)
+        started = time.monotonic()
+        try:
+            pages = cls._extract_pages(file_path)
+        except TextExtractionError as e:
+            logger.error(f"Text extraction failed for file {file_obj.id}: {e}")
+            return None
+        text = "\n".join(page for page in pages if page)
+        chunks = split_into_chunks(pages)
+        elapsed = time.monotonic() - started
+        
+        # get_or_create لتحمل الاستخراج المتزامن لنفس الملف
+        with transaction.atomic():
+            record, created = ExtractedText.objects.get_or_create(
+                content_hash=content_hash,
+                extractor_version=EXTRACTOR_VERSION,
+                defaults={
+                    'text': text,
+                    'char_count': len(text),
+                    'page_count': len(pages),
+                    'extraction_time': elapsed,
+                }
+            )
+            if created:
+                DocumentChunk.objects.bulk_create([
+                    DocumentChunk(
+                        extracted_text=record,
+                        position=chunk.position,
+                        page_number=chunk.page_number,
+                        text=chunk.text,
+                    )
+                    for chunk in chunks
+                ])
+        
+        logger.info(
+            f"Extracted {len(text)} characters ({len(chunks)} chunks) "
+            f"from {file_path.name} in {elapsed:.2f}s"
+        )
+        return record
+    
+    @staticmethod
+    def _extract_pages(file_path: Path) -> List[str]:
+        """الاستخراج داخل عملية معزولة (AI_EXTRACT_SANDBOX) أو في العملية الحالية."""
+        max_chars = getattr(settings, 'AI_MAX_EXTRACT_CHARS', None)
+        if getattr(settings, 'AI_EXTRACT_SANDBOX', False):
+            from apps.ai_features.sandbox import get_extraction_sandbox
+            return get_extraction_sandbox().extract_pages(file_path, max_chars=max_chars)
+        return TextExtractorFactory.extract_pages(
+            file_path, max_chars, getattr(settings, 'AI_SANDBOX_MAX_PAGES', None)
+        )
+    
+    @classmethod
+    def get_text(cls, file_obj) -> Optional[str]:
+        """
+        الحصول على نص الملف من المخزن أو استخراجه وتخزينه.
+        
+        Args:
+            file_obj: كائن الملف (LectureFile)
+            
+        Returns:
+            str: النص المستخرج أو None عند الفشل
+        """
+        record = cls.get_record(file_obj)
+        return record.text if record is not None else None
+    
+    @classmethod
+    def get_index(cls, record):
+        """
+        فهرس BM25 لمقاطع السجل (يُبنى مرة ويُحفظ في الذاكرة المؤقتة).
+        
+        السجل مفهرس بالمحتوى فلا يتغير، لذا يكفي معرّفه مفتاحاً.
+        """
+        from apps.ai_features.indexing import BM25Index, TextChunk
+        
+        cache_key = f"ai_bm25_{record.pk}"
+        index = cache.get(cache_key)
+        if index is None:
+            index = BM25Index([
+                TextChunk(chunk.position, chunk.page_number, chunk.text)
+                for chunk in record.chunks.all()
+            ])
+            cache.set(cache_key, index, CACHE_TIMEOUT)
+        return index
+
+
+# ========== Client Pool ==========
+
+_client_lock = threading.Lock()
+_clients: Dict[str, Any] = {}
+_call_semaphore: Optional[threading.BoundedSemaphore] = None
+
+
+def get_gemini_client(api_key: str):
+    """
+    عميل Gemini مشترك على مستوى العملية لكل مفتاح API.
+    
+    إنشاء genai.Client مكلف (إعداد HTTP وTLS)، لذا يُنشأ مرة واحدة
+    ويُعاد استخدام اتصالاته بين الطلبات.
+    """
+    client = _clients.get(api_key)
+    if client is not None:
+        return client
+    
+    with _client_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            from google import genai
+            client = genai.Client(api_key=api_key)
+            _clients[api_key] = client
+            logger.info("Gemini client created")
+        return client
+
+
+def _max_concurrent_calls() -> int:
+    return getattr(settings, 'AI_MAX_CONCURRENT_CALLS', 8)
+
+
+def _get_call_semaphore() -> threading.BoundedSemaphore:
+    """حد الاستدعاءات المتزامنة للنموذج على مستوى العملية (الخيوط وحلقات الأحداث)."""
+    global _call_semaphore
+    if _call_semaphore is None:
+        with _client_lock:
+            if _call_semaphore is None:
+                _call_semaphore = threading.BoundedSemaphore(_max_concurrent_calls())
+    return _call_semaphore
+
+
+@asynccontextmanager
+async def _async_call_slot():
+    """
+    حجز مكان من سيمافور العملية نفسه دون حجز الخيط.
+    
+    المحاولة غير حاجبة مع انتظار متزايد بين المحاولات، فيعمل الحد عبر كل
+    حلقات الأحداث (async_to_sync ينشئ حلقة جديدة) ولا يتسرب المكان عند
+    إلغاء المهمة أثناء الانتظار.
+    """
+    semaphore = _get_call_semaphore()
+    delay = 0.005
+    while not semaphore.acquire(blocking=False):
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.1)
+    try:
+        yield
+    finally:
+        semaphore.release()
 
 
 # ========== Gemini Service ==========
@@ -364,36 +865,36 @@ class GeminiService:
         # توليد أسئلة
         questions = service.generate_questions("نص...", QuestionType.MCQ, 5)
         
-        # سؤال المستند
-        answer = service.ask_document("نص...", "ما هي الفكرة الرئيسية؟")
+        # سؤال المستند (من أكثر المقاطع صلة بالسؤال)
+        answer = service.ask_file(file_obj, "ما هي الفكرة الرئيسية؟")
     """
     
-    def __init__(self, api_key: str = None, model: str = GEMINI_MODEL):
+    def __init__(self, api_key: str = None, model: str = GEMINI_MODEL, client=None):
         """
         تهيئة الخدمة.
         
         Args:
             api_key: مفتاح API لـ Google Gemini
             model: اسم الموديل المستخدم
+            client: عميل جاهز (للاختبارات)، وإلا يُستخدم عميل AI_BACKEND المشترك
         """
         # Security: Use passed key or fallback to settings/env
         self._api_key = api_key or GEMINI_API_KEY
         self._model_name = model
-        self._client = None
+        self._client = client
         
-        self._initialize_client()
+        if self._client is None:
+            self._initialize_client()
     
     def _initialize_client(self) -> None:
-        """تهيئة عميل Gemini."""
-        if not self._api_key:
-            raise GeminiConfigurationError("GEMINI_API_KEY is not set in settings or environment variables.")
-
+        """تهيئة عميل النموذج (المشترك على مستوى العملية) حسب AI_BACKEND."""
+        from apps.ai_features.backends import get_backend_client
+        
         try:
-            from google import genai
-            
-            self._client = genai.Client(api_key=self._api_key)
-            logger.info(f"Gemini client initialized with model: {self._model_name}")
+            self._client = get_backend_client(self._api_key)
             
+        except GeminiConfigurationError:
+            raise
         except ImportError:
             raise GeminiConfigurationError(
                 "google-genai not installed. Run: pip install google-genai"
@@ -433,39 +934,120 @@ class GeminiService:
             raise GeminiConfigurationError("Gemini client not initialized")
         
         try:
-            from google import genai
-            from google.genai import types
-            
-            response = self._client.models.generate_content(
-                model=self._model_name,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    max_output_tokens=max_tokens,
-                    temperature=0.3,
+            with _get_call_semaphore():
+                started = time.monotonic()
+                response = self._client.models.generate_content(
+                    model=self._model_name,
+                    contents=prompt,
+                    config=self._build_config(max_tokens)
                 )
-            )
-            
-            # استخراج النص من الاستجابة
-            if response.text:
-                return response.text.strip()
-            else:
-                raise GeminiAPIError("Empty response from Gemini")
-                
         except Exception as e:
-            error_str = str(e).lower()
-            
-            if "rate" in error_str or "quota" in error_str:
-                raise GeminiRateLimitError(f"Rate limit exceeded: {e}")
-            elif "invalid" in error_str and "key" in error_str:
-                raise GeminiConfigurationError(f"Invalid API key: {e}")
-            else:
-                raise GeminiAPIError(f"Gemini API error: {e}")
+            raise self._translate_error(e)
+        
+        self._record_usage(response, time.monotonic() - started)
+        return self._response_text(response)
+    
+    @retry_on_error(max_retries=MAX_RETRIES)
+    async def agenerate_content(self, prompt: str, max_tokens: int = 1000) -> str:
+        """
+        النسخة غير المتزامنة من _generate_content للعروض غير المتزامنة.
+        
+        لا تحجز خيطاً أثناء انتظار النموذج، وتشارك المسار المتزامن حد
+        الاستدعاءات الجارية (AI_MAX_CONCURRENT_CALLS).
+        """
+        if not self.is_available:
+            raise GeminiConfigurationError("Gemini client not initialized")
+        
+        try:
+            async with _async_call_slot():
+                started = time.monotonic()
+                response = await self._client.aio.models.generate_content(
+                    model=self._model_name,
+                    contents=prompt,
+                    config=self._build_config(max_tokens)
+                )
+        except Exception as e:
+            raise self._translate_error(e)
+        
+        self._record_usage(response, time.monotonic() - started)
+        return self._response_text(response)
+    
+    def stream_content(self, prompt: str, max_tokens: int = 1000) -> Iterator[str]:
+        """
+        توليد محتوى كدفعات نصية متتالية فور وصولها من Gemini.
+        
+        يُستخدم للبث إلى المتصفح (SSE) لتقليل زمن ظهور أول كلمة.
+        
+        Yields:
+            str: الجزء التالي من النص
+        """
+        if not self.is_available:
+            raise GeminiConfigurationError("Gemini client not initialized")
+        
+        with _get_call_semaphore():
+            started = time.monotonic()
+            # عدادات التوكنات تصل مع آخر دفعة
+            last_chunk = None
+            try:
+                for chunk in self._client.models.generate_content_stream(
+                    model=self._model_name,
+                    contents=prompt,
+                    config=self._build_config(max_tokens)
+                ):
+                    last_chunk = chunk
+                    if chunk.text:
+                        yield chunk.text
+            except GeneratorExit:
+                raise
+            except Exception as e:
+                raise self._translate_error(e)
+            finally:
+                if last_chunk is not None:
+                    self._record_usage(last_chunk, time.monotonic() - started)
+    
+    @staticmethod
+    def _build_config(max_tokens: int):
+        """إعدادات التوليد المشتركة."""
+        from google.genai import types
+        
+        return types.GenerateContentConfig(
+            max_output_tokens=max_tokens,
+            temperature=0.3,
+        )
+    
+    def _record_usage(self, response, latency: float) -> None:
+        """تسجيل عدادات التوكنات الفعلية للاستدعاء في عداد العملية الحالية."""
+        from apps.ai_features.usage import record_model_call
+        
+        record_model_call(self._model_name, getattr(response, 'usage_metadata', None), latency)
+    
+    @staticmethod
+    def _response_text(response) -> str:
+        """استخراج النص من الاستجابة."""
+        if response.text:
+            return response.text.strip()
+        raise GeminiAPIError("Empty response from Gemini")
+    
+    @staticmethod
+    def _translate_error(error: Exception) -> GeminiError:
+        """تحويل أخطاء الـ SDK إلى أخطاء الخدمة."""
+        if isinstance(error, GeminiError):
+            return error
+        
+        error_str = str(error).lower()
+        
+        if "rate" in error_str or "quota" in error_str:
+            return GeminiRateLimitError(f"Rate limit exceeded: {error}")
+        elif "invalid" in error_str and "key" in error_str:
+            return GeminiConfigurationError(f"Invalid API key: {error}")
+        else:
+            return GeminiAPIError(f"Gemini API error: {error}")
     
     # ========== Public Methods ==========
     
     def extract_text_from_file(self, file_obj) -> Optional[str]:
         """
-        استخراج النص من ملف.
+        استخراج النص من ملف (عبر مخزن النصوص المستخرجة).
         
         Args:
             file_obj: كائن الملف (LectureFile)
@@ -473,18 +1055,51 @@ class GeminiService:
         Returns:
             str: النص المستخرج أو None
         """
-        if not file_obj.local_file:
-            logger.warning(f"File {file_obj.id} has no local file")
-            return None
+        return ExtractedTextStore.get_text(file_obj)
+    
+    def _cached_file_call(
+        self,
+        func_name: str,
+        file_obj,
+        compute: Callable[[str], T],
+        refresh: bool = False,
+        text: Optional[str] = None,
+        **params
+    ) -> AIResponse:
+        """
+        تنفيذ عملية على نص ملف مع التخزين المؤقت ودمج الطلبات المتطابقة.
         
-        try:
-            file_path = Path(file_obj.local_file.path)
-            text = TextExtractorFactory.extract_text(file_path)
-            logger.info(f"Extracted {len(text)} characters from {file_path.name}")
-            return text
-        except TextExtractionError as e:
-            logger.error(f"Text extraction failed for file {file_obj.id}: {e}")
-            return None
+        Args:
+            func_name: اسم العملية (مفتاح في PROMPT_VERSIONS)
+            file_obj: كائن الملف (LectureFile)
+            compute: دالة تستقبل النص وتُرجع النتيجة
+            refresh: تجاهل النتيجة المخزنة وإعادة التوليد
+            text: نص الملف إذا كان مستخرجاً مسبقاً (بدون الرجوع لقاعدة البيانات)
+            **params: معاملات تدخل في مفتاح الكاش
+        """
+        content_hash = file_obj.get_content_hash() if file_obj.local_file else None
+        if content_hash is None:
+            return AIResponse(success=False, error='لا يمكن استخراج النص من الملف')
+        
+        cache_key = _file_cache_key(func_name, content_hash, **params)
+        if refresh:
+            cache.delete(cache_key)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logger.debug(f"Cache hit for {func_name} on file {file_obj.id}")
+            return AIResponse(success=True, data=cached, cached=True)
+        
+        def run():
+            source = text if text is not None else ExtractedTextStore.get_text(file_obj)
+            return compute(source) if source else None
+        
+        result = single_flight.do(cache_key, run, CACHE_TIMEOUT)
+        if result is None:
+            return AIResponse(success=False, error='لا يمكن استخراج النص من الملف')
+        if is_fallback(result):
+            # خطأ مؤقت: لا يُحفظ كنتيجة للملف
+            return AIResponse(success=False, data=result, error=FALLBACK_ERROR)
+        return AIResponse(success=True, data=result)
     
     @cache_result(timeout=CACHE_TIMEOUT)
     def generate_summary(self, text: str, max_length: int = 500) -> str:
@@ -498,12 +1113,58 @@ class GeminiService:
         Returns:
             str: التلخيص
             
+        النصوص الطويلة تُلخص هرمياً (انظر AI_SUMMARY_MODE) بدلاً من قصها.
+            
         Example:
             summary = service.generate_summary("نص طويل جداً...")
         """
+        return self._summarize_text(text, max_length)
+    
+    def summarize_file(self, file_obj, max_length: int = 500, refresh: bool = False) -> AIResponse:
+        """
+        تلخيص ملف مع التخزين المؤقت ببصمة الملف.
+        
+        عند الإصابة لا يُستخرج النص إطلاقاً.
+        
+        Returns:
+            AIResponse: data هو التلخيص، cached يشير إلى الإصابة
+        """
+        return self._cached_file_call(
+            'generate_summary', file_obj,
+            lambda text: self._summarize_text(text, max_length),
+            refresh=refresh,
+            max_length=max_length
+        )
+    
+    def _summarize_text(self, text: str, max_length: int) -> str:
+        """تلخيص النص بدون تخزين مؤقت."""
+        if self._use_map_reduce(text):
+            return self._map_reduce_summary(text, max_length)
+        
         text = self._truncate_text(text)
         
-        prompt = f"""أنت مساعد أكاديمي متخصص في تلخيص المحتوى التعليمي باللغة العربية.
+        try:
+            return self._generate_content(self._summary_prompt(text, max_length), max_tokens=max_length * 2)
+        except GeminiError as e:
+            logger.error(f"Summary generation failed: {e}")
+            return self._fallback_summary(text, max_length)
+    
+    def stream_summary(self, text: str, max_length: int = 500) -> Iterator[str]:
+        """
+        تلخيص النص كدفعات نصية متتالية (للبث إلى المتصفح).
+        
+        في الوضع الهرمي تُنفذ مرحلة map أولاً ثم تُبث مرحلة الدمج فقط.
+        """
+        if self._use_map_reduce(text):
+            prompt = self._map_reduce_prompt(text, max_length)
+        else:
+            prompt = self._summary_prompt(self._truncate_text(text), max_length)
+        return self.stream_content(prompt, max_tokens=max_length * 2)
+    
+    @staticmethod
+    def _summary_prompt(text: str, max_length: int) -> str:
+        """قالب التلخيص في خطوة واحدة."""
+        return f"""أنت مساعد أكاديمي متخصص في تلخيص المحتوى التعليمي باللغة العربية.
 
 قم بتلخيص النص التالي بشكل مختصر ومفيد. ركز على:
 - النقاط الرئيسية والمفاهيم الأساسية
@@ -513,13 +1174,111 @@ class GeminiService:
 النص:
 {text}
 
+التلخيص (بحد أقصى {max_length} كلمة):"""
+    
+    def _use_map_reduce(self, text: str) -> bool:
+        """
+        تحديد وضع التلخيص حسب AI_SUMMARY_MODE.
+        
+        auto: التلخيص الهرمي للنصوص الأطول من MAX_INPUT_LENGTH فقط،
+        map_reduce: دائماً، truncate: السلوك القديم (قص النص).
+        """
+        mode = getattr(settings, 'AI_SUMMARY_MODE', 'auto')
+        if mode == 'map_reduce':
+            return True
+        if mode == 'truncate':
+            return False
+        return len(text) > MAX_INPUT_LENGTH
+    
+    def _map_reduce_summary(self, text: str, max_length: int) -> str:
+        """
+        تلخيص هرمي: تلخيص المقاطع بالتوازي ثم دمج الملخصات.
+        
+        ملخص كل مقطع يُخزن في الكاش على حدة، فإعادة المحاولة بعد فشل
+        جزئي لا تعيد إلا المقاطع الفاشلة. عند فشل أي مقطع يُرفع الخطأ
+        بدلاً من إرجاع ملخص ناقص.
+        """
+        prompt = self._map_reduce_prompt(text, max_length)
+        return self._generate_content(prompt, max_tokens=max_length * 2)
+    
+    def _map_reduce_prompt(self, text: str, max_length: int) -> str:
+        """تنفيذ مرحلة map وإرجاع قالب مرحلة الدمج (reduce)."""
+        from concurrent.futures import ThreadPoolExecutor
+        from apps.ai_features.indexing import split_into_chunks
+        
+        chunk_size = getattr(settings, 'AI_SUMMARY_CHUNK_SIZE', 12000)
+        part_length = max(100, max_length // 2)
+        parts = [chunk.text for chunk in split_into_chunks([text], chunk_size=chunk_size, overlap=0)]
+        
+        summaries: Dict[int, str] = {}
+        pending = []
+        for i, part in enumerate(parts):
+            cached = cache.get(self._partial_summary_key(part, part_length))
+            if cached is not None:
+                summaries[i] = cached
+            else:
+                pending.append(i)
+        
+        if pending:
+            workers = min(getattr(settings, 'AI_SUMMARY_WORKERS', 4), len(pending))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ai-summary') as executor:
+                # نسخة من السياق لكل جزء حتى تُحسب توكنات مرحلة map للعملية نفسها
+                futures = {
+                    i: executor.submit(
+                        contextvars.copy_context().run,
+                        single_flight.do,
+                        self._partial_summary_key(parts[i], part_length),
+                        lambda part=parts[i]: self._summarize_part(part, part_length),
+                        CACHE_TIMEOUT
+                    )
+                    for i in pending
+                }
+            errors = []
+            for i, future in futures.items():
+                try:
+                    summaries[i] = future.result()
+                except GeminiError as e:
+                    errors.append(e)
+            if errors:
+                logger.error(f"Map-reduce summary: {len(errors)}/{len(parts)} parts failed")
+                raise errors[0]
+        
+        logger.info(
+            f"Map-reduce summary: {len(parts)} parts, {len(parts) - len(pending)} from cache"
+        )
+        combined = "\n\n".join(summaries[i] for i in range(len(parts)))
+        if len(combined) > MAX_INPUT_LENGTH:
+            # الملخصات نفسها طويلة: مستوى إضافي من الدمج
+            return self._map_reduce_prompt(combined, max_length)
+        
+        return f"""أنت مساعد أكاديمي متخصص في تلخيص المحتوى التعليمي باللغة العربية.
+
+فيما يلي ملخصات لأجزاء متتالية من مستند واحد. ادمجها في تلخيص واحد متماسك يغطي
+المستند كاملاً، مع التركيز على النقاط الرئيسية والمفاهيم الأساسية ودون تكرار.
+
+ملخصات الأجزاء:
+{combined}
+
+التلخيص (بحد أقصى {max_length} كلمة):"""
+    
+    def _summarize_part(self, text: str, max_length: int) -> str:
+        """تلخيص جزء واحد من مستند طويل (مرحلة map)."""
+        prompt = f"""أنت مساعد أكاديمي متخصص في تلخيص المحتوى التعليمي باللغة العربية.
+
+النص التالي جزء من مستند أطول. لخصه مع الحفاظ على المفاهيم والتعريفات المهمة.
+
+النص:
+{text}
+
 التلخيص (بحد أقصى {max_length} كلمة):"""
 
-        try:
-            return self._generate_content(prompt, max_tokens=max_length * 2)
-        except GeminiError as e:
-            logger.error(f"Summary generation failed: {e}")
-            return self._fallback_summary(text, max_length)
+        return self._generate_content(prompt, max_tokens=max_length * 2)
+    
+    @staticmethod
+    def _partial_summary_key(text: str, max_length: int) -> str:
+        """مفتاح الكاش لملخص جزء."""
+        digest = hashlib.md5(text.encode()).hexdigest()
+        return f"ai:summary_part:{digest}:{max_length}"
     
     def _fallback_summary(self, text: str, max_length: int) -> str:
         """تلخيص بسيط في حالة فشل الـ AI."""
@@ -531,7 +1290,7 @@ class GeminiService:
                 summary += sentence + ". "
             elif len(summary) > 100:
                 break
-        return summary.strip() or text[:max_length] + "..."
+        return FallbackSummary(summary.strip() or text[:max_length] + "...")
     
     @cache_result(timeout=CACHE_TIMEOUT)
     def generate_questions(
@@ -558,6 +1317,44 @@ class GeminiService:
                 5
             )
         """
+        return self._questions_from_text(text, question_type, num_questions)
+    
+    def generate_questions_for_file(
+        self,
+        file_obj,
+        question_type: QuestionType = QuestionType.MIXED,
+        num_questions: int = 5,
+        refresh: bool = False,
+        text: Optional[str] = None
+    ) -> AIResponse:
+        """
+        توليد أسئلة من ملف مع التخزين المؤقت ببصمة الملف.
+        
+        Args:
+            text: نص الملف إذا كان مستخرجاً مسبقاً (لاستخدامه من خيوط أخرى)
+        
+        Returns:
+            AIResponse: data هو قائمة الأسئلة، cached يشير إلى الإصابة
+        """
+        if not isinstance(question_type, QuestionType):
+            question_type = QuestionType(question_type) if question_type in [e.value for e in QuestionType] else QuestionType.MIXED
+        
+        return self._cached_file_call(
+            'generate_questions', file_obj,
+            lambda text: self._questions_from_text(text, question_type, num_questions),
+            refresh=refresh,
+            text=text,
+            question_type=question_type.value,
+            num_questions=num_questions
+        )
+    
+    def _questions_from_text(
+        self,
+        text: str,
+        question_type: QuestionType,
+        num_questions: int
+    ) -> List[Dict[str, Any]]:
+        """توليد الأسئلة بدون تخزين مؤقت."""
         text = self._truncate_text(text, 10000)
         
         type_instruction = {
@@ -626,12 +1423,12 @@ class GeminiService:
     
     def _fallback_questions(self, num_questions: int) -> List[Dict[str, Any]]:
         """أسئلة افتراضية في حالة الفشل."""
-        return [{
+        return FallbackQuestions([{
             'type': 'short_answer',
             'question': 'ما هي الفكرة الرئيسية في هذا النص؟',
             'answer': 'راجع النص للإجابة',
             'explanation': 'هذا سؤال تلقائي بسبب عدم توفر خدمة AI'
-        }]
+        }])
     
     def ask_document(self, text: str, question: str) -> str:
         """
@@ -650,9 +1447,87 @@ class GeminiService:
                 "ما هي الفكرة الرئيسية؟"
             )
         """
-        text = self._truncate_text(text)
+        return self._answer_from_context(self._truncate_text(text), question)
+    
+    def ask_file(self, file_obj, question: str, top_k: int = None) -> Optional[str]:
+        """
+        الإجابة على سؤال من أكثر مقاطع الملف صلة به.
+        
+        بدلاً من إرسال أول 30 ألف حرف، تُسترجع أفضل المقاطع (BM25)
+        من كامل المستند فيصغر الطلب ويشمل الصفحات المتأخرة.
+        
+        Args:
+            file_obj: كائن الملف (LectureFile)
+            question: السؤال
+            top_k: عدد المقاطع المرسلة
+            
+        Returns:
+            str: الإجابة أو None إذا تعذر استخراج النص
+        """
+        context = self._retrieve_context(file_obj, question, top_k)
+        if context is None:
+            return None
+        return self._answer_from_context(context, question)
+    
+    def stream_answer(self, file_obj, question: str, top_k: int = None) -> Optional[Iterator[str]]:
+        """
+        مثل ask_file لكن تُرجع الإجابة كدفعات نصية متتالية.
         
-        prompt = f"""أنت مساعد أكاديمي يجيب على الأسئلة بناءً على محتوى المستندات المقدمة.
+        Returns:
+            Iterator[str]: أجزاء الإجابة أو None إذا تعذر استخراج النص
+        """
+        context = self._retrieve_context(file_obj, question, top_k)
+        if context is None:
+            return None
+        return self.stream_content(self._answer_prompt(context, question), max_tokens=500)
+    
+    def _retrieve_context(self, file_obj, question: str, top_k: int = None) -> Optional[str]:
+        """بناء سياق السؤال من أفضل مقاطع الملف."""
+        record = ExtractedTextStore.get_record(file_obj)
+        if record is None or not record.text.strip():
+            return None
+        
+        if top_k is None:
+            top_k = getattr(settings, 'AI_RETRIEVAL_TOP_K', 5)
+        chunks = ExtractedTextStore.get_index(record).search(question, top_k=top_k)
+        context = "\n\n".join(
+            f"[صفحة {chunk.page_number}]\n{chunk.text}" for chunk in chunks
+        )
+        logger.debug(
+            f"Retrieved {len(chunks)} chunks ({len(context)} chars) for file {file_obj.id}"
+        )
+        return context
+    
+    async def aask_file(self, file_obj, question: str, top_k: int = None) -> Optional[str]:
+        """
+        النسخة غير المتزامنة من ask_file.
+        
+        الاسترجاع من قاعدة البيانات يتم في خيط، واستدعاء النموذج غير متزامن.
+        """
+        from asgiref.sync import sync_to_async
+        
+        context = await sync_to_async(self._retrieve_context)(file_obj, question, top_k)
+        if context is None:
+            return None
+        
+        try:
+            return await self.agenerate_content(self._answer_prompt(context, question), max_tokens=500)
+        except GeminiError as e:
+            logger.error(f"Document Q&A failed: {e}")
+            return "عذراً، حدث خطأ أثناء معالجة سؤالك. يرجى المحاولة مرة أخرى."
+    
+    def _answer_from_context(self, text: str, question: str) -> str:
+        """توليد الإجابة من سياق جاهز."""
+        try:
+            return self._generate_content(self._answer_prompt(text, question), max_tokens=500)
+        except GeminiError as e:
+            logger.error(f"Document Q&A failed: {e}")
+            return "عذراً، حدث خطأ أثناء معالجة سؤالك. يرجى المحاولة مرة أخرى."
+    
+    @staticmethod
+    def _answer_prompt(text: str, question: str) -> str:
+        """قالب سؤال المستند."""
+        return f"""أنت مساعد أكاديمي يجيب على الأسئلة بناءً على محتوى المستندات المقدمة.
 
 قواعد الإجابة:
 1. أجب بناءً على المحتوى المقدم فقط
@@ -666,12 +1541,6 @@ class GeminiService:
 السؤال: {question}
 
 الإجابة:"""
-
-        try:
-            return self._generate_content(prompt, max_tokens=500)
-        except GeminiError as e:
-            logger.error(f"Document Q&A failed: {e}")
-            return "عذراً، حدث خطأ أثناء معالجة سؤالك. يرجى المحاولة مرة أخرى."
     
     def test_connection(self) -> AIResponse:
         """
@@ -692,6 +1561,157 @@ class GeminiService:
             return AIResponse(success=False, error=str(e))
 
 
+# ========== Stored Artifacts (Read-Through) ==========
+
+class AIArtifactStore:
+    """
+    قراءة الملخصات والأسئلة المحفوظة قبل استدعاء النموذج.
+    
+    يُعاد الملخص أو الأسئلة المحفوظة ما دامت مولدة من نفس نسخة الملف
+    (source_hash)، ولا يُستدعى النموذج إلا عند غيابها أو عند طلب
+    التحديث صراحة (refresh).
+    
+    Example:
+        response = AIArtifactStore.get_summary(file_obj, user=request.user)
+        if response.success:
+            summary = response.data  # AISummary
+    """
+    
+    @classmethod
+    def stored_summary(cls, file_obj):
+        """الملخص المحفوظ إذا كان مولداً من النسخة الحالية للملف، وإلا None."""
+        from apps.ai_features.models import AISummary
+        
+        content_hash = file_obj.get_content_hash() if file_obj.local_file else None
+        return AISummary.get_cached_summary(file_obj, content_hash)
+    
+    @classmethod
+    def stored_questions(cls, file_obj, question_type: str = 'mixed', num_questions: int = 5):
+        """الأسئلة المحفوظة الصالحة إذا كان عددها كافياً، وإلا None."""
+        from apps.ai_features.models import AIGeneratedQuestion
+        
+        content_hash = file_obj.get_content_hash() if file_obj.local_file else None
+        questions = list(
+            AIGeneratedQuestion.get_cached_questions(file_obj, question_type, content_hash)
+            .order_by('id')[:num_questions]
+        )
+        return questions if len(questions) >= num_questions else None
+    
+    @classmethod
+    def get_summary(cls, file_obj, user=None, refresh: bool = False, service: GeminiService = None) -> AIResponse:
+        """
+        الملخص المحفوظ للملف أو توليده وحفظه.
+        
+        Returns:
+            AIResponse: data هو كائن AISummary
+        """
+        if not refresh:
+            stored = cls.stored_summary(file_obj)
+            if stored is not None:
+                return AIResponse(success=True, data=stored, cached=True)
+        
+        service = service or GeminiService()
+        started = time.monotonic()
+        response = service.summarize_file(file_obj, refresh=refresh)
+        if not response.success:
+            return response
+        
+        summary = cls.save_summary(
+            file_obj, response.data, user=user,
+            model_used=service._model_name,
+            generation_time=time.monotonic() - started
+        )
+        return AIResponse(success=True, data=summary, cached=response.cached)
+    
+    @classmethod
+    def save_summary(cls, file_obj, summary_text: str, user=None, model_used: str = GEMINI_MODEL,
+                     generation_time: float = 0):
+        """حفظ ملخص مولد لنسخة الملف الحالية (يستبدل الملخص السابق)."""
+        from apps.ai_features.models import AISummary
+        
+        content_hash = file_obj.get_content_hash() if file_obj.local_file else None
+        summary, created = AISummary.objects.update_or_create(
+            file=file_obj,
+            defaults={
+                'user': user,
+                'summary_text': summary_text,
+                'word_count': len(summary_text.split()),
+                'language': 'ar',
+                'model_used': model_used,
+                'generation_time': generation_time,
+                'source_hash': content_hash,
+                'is_cached': True,
+            }
+        )
+        return summary
+    
+    @classmethod
+    def get_questions(
+        cls,
+        file_obj,
+        question_type: str = 'mixed',
+        num_questions: int = 5,
+        user=None,
+        refresh: bool = False,
+        service: GeminiService = None
+    ) -> AIResponse:
+        """
+        الأسئلة المحفوظة للملف أو توليدها وحفظها.
+        
+        Returns:
+            AIResponse: data هو قائمة كائنات AIGeneratedQuestion
+        """
+        from django.db import transaction
+        from apps.ai_features.models import AIGeneratedQuestion
+        
+        if isinstance(question_type, QuestionType):
+            question_type = question_type.value
+        
+        if not refresh:
+            questions = cls.stored_questions(file_obj, question_type, num_questions)
+            if questions is not None:
+                return AIResponse(success=True, data=questions, cached=True)
+        
+        content_hash = file_obj.get_content_hash() if file_obj.local_file else None
+        
+        service = service or GeminiService()
+        response = service.generate_questions_for_file(
+            file_obj, question_type, num_questions, refresh=refresh
+        )
+        if not response.success:
+            return response
+        
+        with transaction.atomic():
+            if refresh:
+                # الأسئلة القديمة تبقى للأرشيف لكنها لا تُعاد بعد الآن
+                AIGeneratedQuestion.get_cached_questions(file_obj, question_type).update(is_cached=False)
+            questions = AIGeneratedQuestion.objects.bulk_create(
+                cls.build_questions(file_obj, response.data, user=user, content_hash=content_hash)
+            )
+        return AIResponse(success=True, data=questions, cached=response.cached)
+    
+    @staticmethod
+    def build_questions(file_obj, data: List[Dict[str, Any]], user=None, content_hash: str = None) -> list:
+        """كائنات AIGeneratedQuestion (غير محفوظة) من رد النموذج، للحفظ بـ bulk_create."""
+        from apps.ai_features.models import AIGeneratedQuestion
+        
+        return [
+            AIGeneratedQuestion(
+                file=file_obj,
+                user=user,
+                question_text=q.get('question', 'سؤال بدون نص'),
+                question_type=q.get('type', 'short_answer'),
+                options=q.get('options'),
+                correct_answer=q.get('answer', ''),
+                explanation=q.get('explanation', ''),
+                difficulty_level='medium',
+                source_hash=content_hash,
+                is_cached=True,
+            )
+            for q in data
+        ]
+
+
 # ========== Celery Tasks (Optional) ==========
 
 try:
@@ -699,46 +1719,119 @@ try:
     CELERY_AVAILABLE = True
 except ImportError:
     CELERY_AVAILABLE = False
+    
+    from concurrent.futures import ThreadPoolExecutor
+    
+    _local_executor = None
+    _local_executor_lock = threading.Lock()
+    
+    def _get_local_executor() -> ThreadPoolExecutor:
+        """مجمع خيوط مشترك لتشغيل المهام في الخلفية بدون Celery."""
+        global _local_executor
+        with _local_executor_lock:
+            if _local_executor is None:
+                _local_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'AI_LOCAL_WORKERS', 2),
+                    thread_name_prefix='ai-worker'
+                )
+            return _local_executor
+    
+    class LocalTask:
+        """
+        بديل بسيط لمهام Celery.
+        
+        يحافظ على واجهة delay/apply_async وينفذ المهمة في مجمع خيوط
+        داخل نفس العملية، مع إغلاق اتصالات قاعدة البيانات بعد كل مهمة.
+        """
+        
+        def __init__(self, func, bind: bool = False):
+            self.func = func
+            self.bind = bind
+            self.name = func.__name__
+            wraps(func)(self)
+        
+        def __call__(self, *args, **kwargs):
+            if self.bind:
+                return self.func(self, *args, **kwargs)
+            return self.func(*args, **kwargs)
+        
+        def _run(self, args, kwargs):
+            from django.db import connections
+            try:
+                return self(*args, **kwargs)
+            except Exception as e:
+                logger.exception(f"Background task {self.name} failed: {e}")
+                raise
+            finally:
+                connections.close_all()
+        
+        def apply_async(self, args=None, kwargs=None, **options):
+            return _get_local_executor().submit(self._run, tuple(args or ()), dict(kwargs or {}))
+        
+        def delay(self, *args, **kwargs):
+            return self.apply_async(args, kwargs)
+        
+        def retry(self, exc=None, **options):
+            # لا يوجد وسيط لإعادة الجدولة: نُعيد الخطأ الأصلي
+            return exc
+    
     def shared_task(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return LocalTask(args[0])
         def decorator(func):
-            return func
+            return LocalTask(func, bind=kwargs.get('bind', False))
         return decorator
 
 
+def _task_user(user_id: Optional[int]):
+    """المستخدم صاحب الطلب في مهمة خلفية (None إذا لم يُحدد أو حُذف)."""
+    if not user_id:
+        return None
+    from django.contrib.auth import get_user_model
+    return get_user_model().objects.filter(pk=user_id).first()
+
+
 @shared_task(bind=True, max_retries=3, default_retry_delay=60)
-def generate_summary_async(self, file_id: int) -> Dict[str, Any]:
+def generate_summary_async(
+    self,
+    file_id: int,
+    refresh: bool = False,
+    user_id: int = None
+) -> Dict[str, Any]:
     """
     مهمة Celery لتوليد التلخيص بشكل غير متزامن.
     
     Args:
         file_id: معرف الملف
+        refresh: إعادة التوليد حتى لو وُجد ملخص صالح
+        user_id: المستخدم الذي يُحسب عليه الاستهلاك (افتراضياً: رافع الملف)
         
     Returns:
         Dict: نتيجة التلخيص
     """
     from apps.courses.models import LectureFile
-    from apps.ai_features.models import AISummary
+    from apps.ai_features.usage import check_budget, usage_meter
     
     try:
         file_obj = LectureFile.objects.get(pk=file_id)
-        service = GeminiService()
+        requester = _task_user(user_id)
+        user = requester or file_obj.uploader
         
-        text = service.extract_text_from_file(file_obj)
-        if not text:
-            return {'success': False, 'error': 'لا يمكن استخراج النص من الملف'}
+        if refresh or AIArtifactStore.stored_summary(file_obj) is None:
+            error = check_budget(user, file_obj)
+            if error:
+                return {'success': False, 'error': error}
         
-        summary = service.generate_summary(text)
-        
-        # استخدام AISummary (OneToOneField) مع update_or_create
-        ai_summary, created = AISummary.objects.update_or_create(
-            file=file_obj,
-            defaults={'summary_text': summary, 'is_cached': True}
-        )
+        with usage_meter(user, file_obj, 'summary'):
+            response = AIArtifactStore.get_summary(file_obj, user=requester, refresh=refresh)
+        if not response.success:
+            return {'success': False, 'error': response.error, 'retry': is_fallback(response.data)}
         
         return {
             'success': True,
-            'summary_id': ai_summary.id,
-            'summary': summary
+            'summary_id': response.data.id,
+            'summary': response.data.summary_text,
+            'was_cached': response.cached
         }
         
     except LectureFile.DoesNotExist:
@@ -747,7 +1840,8 @@ def generate_summary_async(self, file_id: int) -> Dict[str, Any]:
         logger.error(f"Async summary generation failed: {e}")
         if CELERY_AVAILABLE:
             raise self.retry(exc=e)
-        return {'success': False, 'error': str(e)}
+        # retry: طابور AIJob يعيد المحاولة بتأخير متزايد
+        return {'success': False, 'error': str(e), 'retry': True}
 
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=60)
@@ -755,7 +1849,9 @@ def generate_questions_async(
     self, 
     file_id: int, 
     question_type: str = 'mixed',
-    num_questions: int = 5
+    num_questions: int = 5,
+    refresh: bool = False,
+    user_id: int = None
 ) -> Dict[str, Any]:
     """
     مهمة Celery لتوليد الأسئلة بشكل غير متزامن.
@@ -764,41 +1860,38 @@ def generate_questions_async(
         file_id: معرف الملف
         question_type: نوع الأسئلة
         num_questions: عدد الأسئلة
+        refresh: إعادة التوليد حتى لو وُجدت أسئلة صالحة
+        user_id: المستخدم الذي يُحسب عليه الاستهلاك (افتراضياً: رافع الملف)
         
     Returns:
         Dict: نتيجة توليد الأسئلة
     """
     from apps.courses.models import LectureFile
-    from apps.ai_features.models import AIGeneratedQuestion
+    from apps.ai_features.usage import check_budget, usage_meter
     
     try:
         file_obj = LectureFile.objects.get(pk=file_id)
-        service = GeminiService()
-        
-        text = service.extract_text_from_file(file_obj)
-        if not text:
-            return {'success': False, 'error': 'لا يمكن استخراج النص من الملف'}
+        requester = _task_user(user_id)
+        user = requester or file_obj.uploader
         
-        q_type = QuestionType(question_type) if question_type in [e.value for e in QuestionType] else QuestionType.MIXED
-        questions = service.generate_questions(text, q_type, num_questions)
+        if refresh or AIArtifactStore.stored_questions(file_obj, question_type, num_questions) is None:
+            error = check_budget(user, file_obj)
+            if error:
+                return {'success': False, 'error': error}
         
-        saved_ids = []
-        for q in questions:
-            # هنا يتم إنشاء AIGeneratedQuestion بدلاً من AIQuestion لتوافق مع Models
-            ai_question = AIGeneratedQuestion.objects.create(
-                file=file_obj,
-                question_type=q.get('type', 'short_answer'),
-                question_text=q.get('question', ''),
-                options=q.get('options'),
-                correct_answer=q.get('answer', ''),
-                explanation=q.get('explanation', '')
+        with usage_meter(user, file_obj, 'questions'):
+            response = AIArtifactStore.get_questions(
+                file_obj, question_type, num_questions, user=requester, refresh=refresh
             )
-            saved_ids.append(ai_question.id)
+        if not response.success:
+            return {'success': False, 'error': response.error, 'retry': is_fallback(response.data)}
         
+        saved_ids = [question.id for question in response.data]
         return {
             'success': True,
             'question_ids': saved_ids,
-            'count': len(saved_ids)
+            'count': len(saved_ids),
+            'was_cached': response.cached
         }
         
     except LectureFile.DoesNotExist:
@@ -807,4 +1900,190 @@ def generate_questions_async(
         logger.error(f"Async question generation failed: {e}")
         if CELERY_AVAILABLE:
             raise self.retry(exc=e)
-        return {'success': False, 'error': str(e)}
\ No newline at end of file
+        # retry: طابور AIJob يعيد المحاولة بتأخير متزايد
+        return {'success': False, 'error': str(e), 'retry': True}
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def generate_question_bank_async(
+    self,
+    course_id: int,
+    question_type: str = 'mixed',
+    num_questions: int = 5,
+    refresh: bool = False,
+    user_id: int = None
+) -> Dict[str, Any]:
+    """
+    مهمة توليد بنك أسئلة لجميع ملفات المقرر.
+    
+    التقدم يُحدَّث بعد كل ملف عند التنفيذ من طابور المهام (AIJob).
+    
+    Args:
+        course_id: معرف المقرر
+        question_type: نوع الأسئلة
+        num_questions: عدد الأسئلة لكل ملف
+        refresh: إعادة التوليد حتى لو وُجدت أسئلة صالحة
+        user_id: المستخدم الذي يُحسب عليه الاستهلاك
+        
+    Returns:
+        Dict: إحصائيات البنك ومعرفات أسئلته (question_ids)
+    """
+    from apps.courses.models import Course
+    from apps.ai_features.jobs import report_progress
+    from apps.ai_features.question_bank import build_question_bank
+    
+    try:
+        course = Course.objects.get(pk=course_id)
+        bank = build_question_bank(
+            course, question_type, num_questions, refresh=refresh,
+            user=_task_user(user_id), progress=report_progress
+        )
+        return {'success': bool(bank.question_ids) or not bank.error, **bank.as_dict()}
+        
+    except Course.DoesNotExist:
+        return {'success': False, 'error': 'المقرر غير موجود'}
+    except Exception as e:
+        logger.error(f"Question bank generation failed for course {course_id}: {e}")
+        if CELERY_AVAILABLE:
+            raise self.retry(exc=e)
+        # retry: طابور AIJob يعيد المحاولة بتأخير متزايد
+        return {'success': False, 'error': str(e), 'retry': True}
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def index_file_async(self, file_id: int) -> Dict[str, Any]:
+    """
+    مهمة استخراج نص الملف وتقسيمه إلى مقاطع في الخلفية.
+    
+    تُشغَّل بعد رفع الملف حتى تجد طلبات التلخيص والأسئلة النص جاهزاً.
+    
+    Args:
+        file_id: معرف الملف
+        
+    Returns:
+        Dict: نتيجة الفهرسة
+    """
+    from apps.courses.models import LectureFile
+    
+    try:
+        file_obj = LectureFile.objects.get(pk=file_id, is_deleted=False)
+        record = ExtractedTextStore.get_record(file_obj)
+        if record is None:
+            return {'success': False, 'error': 'لا يمكن استخراج النص من الملف'}
+        
+        return {
+            'success': True,
+            'extracted_text_id': record.id,
+            'chunks': record.chunks.count()
+        }
+        
+    except LectureFile.DoesNotExist:
+        return {'success': False, 'error': 'الملف غير موجود'}
+    except Exception as e:
+        logger.error(f"Async indexing failed for file {file_id}: {e}")
+        if CELERY_AVAILABLE:
+            raise self.retry(exc=e)
+        # retry: طابور AIJob يعيد المحاولة بتأخير متزايد
+        return {'success': False, 'error': str(e), 'retry': True}
+
+
+def schedule_file_indexing(file_obj) -> bool:
+    """
+    جدولة فهرسة الملف بعد تأكيد المعاملة الحالية.
+    
+    Args:
+        file_obj: كائن الملف (LectureFile)
+        
+    Returns:
+        bool: True إذا جُدولت الفهرسة
+    """
+    from django.db import transaction
+    
+    if not getattr(settings, 'AI_INDEX_ON_UPLOAD', True):
+        return False
+    if not file_obj.local_file:
+        return False
+    if TextExtractorFactory.get_extractor(Path(file_obj.local_file.name)) is None:
+        return False
+    
+    file_id = file_obj.id
+    
+    def dispatch():
+        try:
+            index_file_async.delay(file_id)
+        except Exception as e:
+            logger.error(f"Failed to schedule indexing for file {file_id}: {e}")
+    
+    transaction.on_commit(dispatch)
+    return True
+
+
+# ========== Usage Audit Trail ==========
+
+@shared_task
+def log_ai_usage_async(user_id: int, request_type: str, file_id: int = None,
+                       tokens_used: int = 0, was_cached: bool = False,
+                       success: bool = True, error_message: str = None) -> None:
+    """مهمة كتابة سجل استخدام AI في الخلفية."""
+    from .models import AIUsageLog
+    
+    AIUsageLog.objects.create(
+        user_id=user_id,
+        request_type=request_type,
+        file_id=file_id,
+        tokens_used=tokens_used,
+        was_cached=was_cached,
+        success=success,
+        error_message=error_message
+    )
+
+
+def record_usage(user, request_type: str, file=None, **fields) -> None:
+    """
+    تسجيل طلب AI في سجل التدقيق بدون إبطاء الطلب.
+    
+    حد الاستخدام يُفرض من الكاش (apps.core.ratelimit)، لذا يُكتب
+    AIUsageLog في الخلفية بعد تأكيد المعاملة الحالية.
+    
+    Args:
+        user: المستخدم
+        request_type: نوع الطلب (summary / questions / chat)
+        file: الملف (اختياري)
+        **fields: tokens_used, was_cached, success, error_message
+    """
+    from django.db import transaction
+    
+    user_id = user.pk
+    file_id = file.pk if file is not None else None
+    
+    def dispatch():
+        try:
+            log_ai_usage_async.delay(user_id, request_type, file_id, **fields)
+        except Exception as e:
+            logger.error(f"Failed to record AI usage for user {user_id}: {e}")
+    
+    transaction.on_commit(dispatch)
+
+
+@shared_task
+def write_usage_ledger_async(context: Dict[str, Any], rows: List[tuple]) -> None:
+    """
+    مهمة كتابة سطور سجل التوكنات في الخلفية.
+    
+    Args:
+        context: user_id و course_id و semester_id و operation
+        rows: (model_name, prompt_tokens, completion_tokens, latency_ms, was_cached)
+    """
+    from .models import AIUsageLedger
+    
+    AIUsageLedger.objects.bulk_create([
+        AIUsageLedger(
+            model_name=model_name,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency_ms=latency_ms,
+            was_cached=was_cached,
+            **context
+        )
+        for model_name, prompt_tokens, completion_tokens, latency_ms, was_cached in rows
+    ])
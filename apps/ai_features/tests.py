@@ -1,3 +1,879 @@
-from django.test import TestCase
+"""
+اختبارات تطبيق ai_features
+S-ACM - Smart Academic Content Management System
+"""
 
-# Create your tests here.
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.models import Level, Role, Semester, User
+from apps.courses.models import Course, LectureFile
+from .indexing import BM25Index, TextChunk, split_into_chunks, tokenize
+from .models import AIChat, AIGeneratedQuestion, AIJob, AISummary, AIUsageLedger, ExtractedText
+from .sandbox import ExtractionSandbox
+from .usage import usage_meter
+from .jobs import AIJobWorker, enqueue_job, run_job
+from .question_bank import QuestionDeduplicator, build_question_bank
+from . import services
+from .backends import FakeGeminiBackend
+from .benchmark import InstrumentedClient, build_pdf, build_sample_corpus, run_benchmark
+from .services import (
+    AIArtifactStore,
+    ExtractedTextStore, EXTRACTOR_VERSION, GeminiAPIError, GeminiService, PDFExtractor,
+    TextExtractionError, TextExtractorFactory,
+    index_file_async, schedule_file_indexing
+)
+
+
+class FakeGeminiClient:
+    """
+    عميل Gemini محلي للاختبارات (نفس شكل google-genai).
+
+    يسجل الطلبات وأقصى عدد من الاستدعاءات المتزامنة.
+    """
+
+    def __init__(self, reply='إجابة', delay=0):
+        self.reply = reply
+        self.delay = delay
+        self.prompts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self.models = SimpleNamespace(
+            generate_content=self._generate,
+            generate_content_stream=self._generate_stream
+        )
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self._agenerate))
+
+    def _enter(self, contents):
+        with self._lock:
+            self.prompts.append(contents)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _exit(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _generate(self, model, contents, config=None):
+        self._enter(contents)
+        try:
+            time.sleep(self.delay)
+            return SimpleNamespace(text=self.reply)
+        finally:
+            self._exit()
+
+    def _generate_stream(self, model, contents, config=None):
+        self._enter(contents)
+        try:
+            for word in self.reply.split(' '):
+                yield SimpleNamespace(text=word + ' ')
+        finally:
+            self._exit()
+
+    async def _agenerate(self, model, contents, config=None):
+        self._enter(contents)
+        try:
+            await asyncio.sleep(self.delay)
+            return SimpleNamespace(text=self.reply)
+        finally:
+            self._exit()
+
+
+class AIFeaturesTestMixin:
+    """بيانات مشتركة لاختبارات الذكاء الاصطناعي (ملفات في مجلد مؤقت)"""
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.media_override = override_settings(MEDIA_ROOT=self.media_root, AI_EXTRACT_SANDBOX=False)
+        self.media_override.enable()
+
+        level = Level.objects.create(level_name='المستوى الأول', level_number=1)
+        semester = Semester.objects.create(
+            name='الفصل الأول', academic_year='2025/2026', semester_number=1,
+            start_date=date(2025, 9, 1), end_date=date(2026, 1, 15), is_current=True
+        )
+        self.course = Course.objects.create(
+            course_name='مقدمة في البرمجة', course_code='CS101',
+            level=level, semester=semester
+        )
+
+    def tearDown(self):
+        self.media_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def make_file(self, content, name='lecture.txt'):
+        file_obj = LectureFile(course=self.course, title='محاضرة')
+        file_obj.local_file.save(name, ContentFile(content.encode('utf-8')), save=False)
+        file_obj.save()
+        return LectureFile.objects.get(pk=file_obj.pk)
+
+
+class ExtractedTextStoreTest(AIFeaturesTestMixin, TestCase):
+    """اختبارات مخزن النصوص المستخرجة"""
+
+    def test_text_is_extracted_once_per_file_version(self):
+        """النص يُستخرج مرة واحدة ثم يُقرأ من المخزن"""
+        file_obj = self.make_file('الخوارزميات والبرمجة')
+
+        with patch.object(TextExtractorFactory, 'extract_pages', wraps=TextExtractorFactory.extract_pages) as spy:
+            first = ExtractedTextStore.get_text(file_obj)
+            second = ExtractedTextStore.get_text(LectureFile.objects.get(pk=file_obj.pk))
+
+        self.assertEqual(first, 'الخوارزميات والبرمجة')
+        self.assertEqual(second, first)
+        self.assertEqual(spy.call_count, 1)
+        self.assertTrue(ExtractedText.objects.filter(
+            content_hash=file_obj.content_hash, extractor_version=EXTRACTOR_VERSION
+        ).exists())
+
+    def test_replacing_local_file_invalidates_hash(self):
+        """استبدال الملف يُبطل البصمة فيُستخرج النص الجديد"""
+        file_obj = self.make_file('النسخة الأولى')
+        ExtractedTextStore.get_text(file_obj)
+        old_hash = file_obj.content_hash
+
+        file_obj.local_file.save('lecture_v2.txt', ContentFile('النسخة الثانية'.encode('utf-8')), save=False)
+        file_obj.save()
+        self.assertIsNone(file_obj.content_hash)
+
+        self.assertEqual(ExtractedTextStore.get_text(file_obj), 'النسخة الثانية')
+        self.assertNotEqual(file_obj.content_hash, old_hash)
+
+
+class TextExtractorTest(AIFeaturesTestMixin, TestCase):
+    """اختبارات الاستخراج التدريجي للصفحات"""
+
+    def write(self, name, data):
+        path = Path(self.media_root) / name
+        path.write_bytes(data)
+        return path
+
+    def test_budget_stops_reading_remaining_pages(self):
+        """بلوغ ميزانية الأحرف يوقف الاستخراج دون قراءة بقية الصفحات"""
+        path = self.write('book.pdf', build_pdf([f'page {i}' for i in range(10)]))
+        read = []
+        original = PDFExtractor.iter_pages
+
+        def spy(extractor, file_path):
+            for page in original(extractor, file_path):
+                read.append(page)
+                yield page
+
+        with patch.object(PDFExtractor, 'iter_pages', spy):
+            text = TextExtractorFactory.extract_text(path, max_chars=15)
+
+        self.assertEqual(text, 'page 0\npage 1\np')
+        self.assertEqual(len(read), 3)
+
+    @override_settings(AI_EXTRACT_PROCESSES=2, AI_PDF_PARALLEL_MIN_PAGES=4)
+    def test_large_pdf_pages_are_extracted_in_parallel_in_order(self):
+        """ملفات PDF الكبيرة تُستخرج في عمليات منفصلة مع الحفاظ على الترتيب"""
+        pages = [f'page {i}' for i in range(9)]
+        path = self.write('big.pdf', build_pdf(pages))
+
+        self.addCleanup(self.shutdown_pool)
+
+        self.assertEqual(TextExtractorFactory.extract_pages(path), pages)
+        self.assertIsNotNone(services._extract_pool)
+
+    def shutdown_pool(self):
+        if services._extract_pool is not None:
+            services._extract_pool.shutdown()
+            services._extract_pool = None
+
+    def test_docx_is_split_at_page_breaks(self):
+        """فواصل الصفحات في Word تصبح صفحات منفصلة"""
+        from docx import Document
+        from docx.enum.text import WD_BREAK
+
+        document = Document()
+        document.add_paragraph('الفصل الأول')
+        document.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+        document.add_paragraph('الفصل الثاني')
+        path = Path(self.media_root) / 'notes.docx'
+        document.save(path)
+
+        self.assertEqual(TextExtractorFactory.extract_pages(path), ['الفصل الأول', 'الفصل الثاني'])
+
+
+class ExtractionSandboxTest(AIFeaturesTestMixin, TestCase):
+    """اختبارات عزل الاستخراج في عمليات فرعية"""
+
+    def setUp(self):
+        super().setUp()
+        self.sandbox = ExtractionSandbox(workers=1, timeout=2, max_jobs=2)
+        self.addCleanup(self.sandbox.shutdown)
+
+    def test_workers_are_reused_then_recycled(self):
+        """العملية تُعاد لعدد محدد من المهام ثم تُستبدل"""
+        path = Path(self.media_root) / 'notes.txt'
+        path.write_text('المكدس والطابور', encoding='utf-8')
+
+        pids = []
+        for _ in range(3):
+            self.assertEqual(self.sandbox.extract_pages(path), ['المكدس والطابور'])
+            pids.append(self.sandbox._idle[-1].process.pid if self.sandbox._idle else None)
+
+        self.assertIsNotNone(pids[0])
+        self.assertIsNone(pids[1])
+        self.assertNotEqual(pids[2], pids[0])
+
+    def test_stuck_extraction_is_killed_after_timeout(self):
+        """الملف الذي يعلق يُقطع بعد المهلة دون أن يعطل المجمع"""
+        stuck = Path(self.media_root) / 'stuck.txt'
+        os.mkfifo(stuck)  # القراءة منه تنتظر كاتباً لن يأتي
+        started = time.monotonic()
+
+        with self.assertRaises(TextExtractionError):
+            self.sandbox.extract_pages(stuck)
+
+        self.assertLess(time.monotonic() - started, 10)
+        path = Path(self.media_root) / 'notes.txt'
+        path.write_text('نص سليم', encoding='utf-8')
+        self.assertEqual(self.sandbox.extract_pages(path), ['نص سليم'])
+
+
+class IndexingTest(AIFeaturesTestMixin, TestCase):
+    """اختبارات تقسيم النص وفهرسة الملفات عند الرفع"""
+
+    def test_chunks_overlap_and_keep_page_numbers(self):
+        """المقاطع لا تتجاوز الحجم وتتداخل وتحتفظ برقم الصفحة"""
+        pages = [' '.join(f'كلمة{i}' for i in range(200)), '', 'الصفحة الثالثة']
+        chunks = split_into_chunks(pages, chunk_size=300, overlap=50)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(c.text) <= 300 for c in chunks))
+        self.assertEqual([c.position for c in chunks], list(range(len(chunks))))
+        self.assertEqual(chunks[0].page_number, 1)
+        self.assertIn('الصفحة الثالثة', chunks[-1].text)
+        first_word = chunks[1].text.split()[0]
+        self.assertIn(first_word, chunks[0].text.split())
+
+    def test_upload_schedules_indexing_after_commit(self):
+        """الفهرسة تُجدول بعد تأكيد المعاملة وتنشئ المقاطع"""
+        file_obj = self.make_file('فقرة أولى\nفقرة ثانية')
+
+        with patch.object(index_file_async, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertTrue(schedule_file_indexing(file_obj))
+                delay.assert_not_called()
+        delay.assert_called_once_with(file_obj.id)
+
+        result = index_file_async(file_obj.id)
+        self.assertTrue(result['success'])
+        record = ExtractedText.objects.get(pk=result['extracted_text_id'])
+        self.assertEqual(record.chunks.count(), result['chunks'])
+        self.assertEqual(record.text, 'فقرة أولى\nفقرة ثانية')
+
+    def test_unsupported_files_are_not_scheduled(self):
+        """الملفات غير المدعومة لا تُجدول للفهرسة"""
+        file_obj = self.make_file('data', name='archive.zip')
+        self.assertFalse(schedule_file_indexing(file_obj))
+
+
+class RetrievalTest(AIFeaturesTestMixin, TestCase):
+    """اختبارات الاسترجاع (BM25) لميزة اسأل المستند"""
+
+    def test_tokenize_normalizes_arabic(self):
+        """التطبيع يوحد الهمزات والتاء المربوطة ويحذف التشكيل وأداة التعريف"""
+        self.assertEqual(tokenize('الخوارزميَّة'), tokenize('خوارزميه'))
+        self.assertEqual(tokenize('إدارة'), tokenize('اداره'))
+        self.assertEqual(tokenize('ما هي في'), [])
+
+    def test_search_ranks_relevant_chunk_first(self):
+        """المقطع الذي يحتوي كلمات السؤال يُسترجع"""
+        index = BM25Index([
+            TextChunk(0, 1, 'مقدمة عامة عن المقرر'),
+            TextChunk(1, 2, 'قواعد البيانات والجداول'),
+            TextChunk(2, 9, 'خوارزمية الترتيب السريع تقسم المصفوفة'),
+        ])
+        result = index.search('كيف تعمل خوارزمية الترتيب السريع؟', top_k=1)
+        self.assertEqual([c.position for c in result], [2])
+
+    def test_ask_file_sends_only_relevant_chunks(self):
+        """الطلب يحتوي المقاطع ذات الصلة فقط ولو كانت في آخر المستند"""
+        filler = '\n'.join(f'فقرة تمهيدية رقم {i} عن موضوع عام' for i in range(300))
+        file_obj = self.make_file(filler + '\nالمكدس بنية بيانات تعمل بمبدأ آخر داخل أول خارج')
+
+        client = FakeGeminiClient()
+        answer = GeminiService(client=client).ask_file(file_obj, 'ما هو المكدس؟', top_k=2)
+
+        self.assertEqual(answer, 'إجابة')
+        prompt = client.prompts[0]
+        self.assertIn('آخر داخل أول خارج', prompt)
+        self.assertLess(len(prompt), len(filler) // 3)
+
+
+@override_settings(AI_SUMMARY_MODE='map_reduce', AI_SUMMARY_CHUNK_SIZE=200, AI_SUMMARY_WORKERS=2)
+class MapReduceSummaryTest(AIFeaturesTestMixin, TestCase):
+    """اختبارات التلخيص الهرمي للمستندات الطويلة"""
+
+    def setUp(self):
+        super().setUp()
+        self.service = GeminiService(client=FakeGeminiClient())
+        self.text = '\n'.join(f'القسم {i}: ' + 'شرح مفصل للمفهوم ' * 8 for i in range(6))
+
+    def test_every_part_is_summarized_then_reduced(self):
+        """كل أجزاء النص تصل إلى النموذج ثم تُدمج الملخصات"""
+        with patch.object(GeminiService, '_generate_content', return_value='ملخص جزئي') as generate:
+            summary = self.service.generate_summary(self.text)
+
+        prompts = [call[0][0] for call in generate.call_args_list]
+        self.assertEqual(summary, 'ملخص جزئي')
+        self.assertIn('ملخصات الأجزاء', prompts[-1])
+        for i in range(6):
+            self.assertTrue(any(f'القسم {i}:' in p for p in prompts[:-1]))
+
+    def test_retry_only_redoes_failed_parts(self):
+        """إعادة المحاولة بعد فشل جزئي لا تعيد إلا الأجزاء الفاشلة"""
+        calls = []
+
+        def flaky(prompt, max_tokens=1000):
+            calls.append(prompt)
+            if 'القسم 3:' in prompt and len([c for c in calls if 'القسم 3:' in c]) == 1:
+                raise GeminiAPIError('temporary failure')
+            return 'ملخص'
+
+        with patch.object(GeminiService, '_generate_content', side_effect=flaky):
+            with self.assertRaises(GeminiAPIError):
+                self.service.generate_summary(self.text)
+            first_round = len(calls)
+            self.service.generate_summary(self.text)
+
+        retried = calls[first_round:]
+        self.assertEqual(len(retried), 2)  # الجزء الفاشل + الدمج
+        self.assertIn('القسم 3:', retried[0])
+
+
+class GeminiClientTest(AIFeaturesTestMixin, TestCase):
+    """اختبارات العميل المشترك والمسار غير المتزامن"""
+
+    def test_client_is_shared_between_services(self):
+        """العميل يُنشأ مرة واحدة لكل مفتاح"""
+        with patch('google.genai.Client', side_effect=lambda api_key: FakeGeminiClient()) as factory:
+            with patch.dict(services._clients, clear=True):
+                first = GeminiService(api_key='shared-key')
+                second = GeminiService(api_key='shared-key')
+        self.assertIs(first._client, second._client)
+        self.assertEqual(factory.call_count, 1)
+
+    @override_settings(AI_MAX_CONCURRENT_CALLS=2)
+    def test_async_calls_are_capped_by_semaphore(self):
+        """الاستدعاءات غير المتزامنة لا تتجاوز الحد المسموح"""
+        client = FakeGeminiClient(reply='نتيجة', delay=0.02)
+        service = GeminiService(client=client)
+
+        async def run():
+            return await asyncio.gather(*[
+                service.agenerate_content(f'سؤال {i}') for i in range(6)
+            ])
+
+        with patch.object(services, '_call_semaphore', None):
+            results = asyncio.run(run())
+        self.assertEqual(results, ['نتيجة'] * 6)
+        self.assertEqual(client.max_in_flight, 2)
+
+    @override_settings(AI_MAX_CONCURRENT_CALLS=2)
+    def test_sync_and_async_calls_share_one_cap(self):
+        """الحد مشترك بين الخيوط وحلقات الأحداث المختلفة"""
+        client = FakeGeminiClient(reply='نتيجة', delay=0.05)
+        service = GeminiService(client=client)
+
+        async def run():
+            return await asyncio.gather(*[
+                service.agenerate_content(f'سؤال {i}') for i in range(3)
+            ])
+
+        with patch.object(services, '_call_semaphore', None):
+            threads = [
+                threading.Thread(target=service._generate_content, args=(f'متزامن {i}',))
+                for i in range(2)
+            ] + [threading.Thread(target=asyncio.run, args=(run(),)) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(client.prompts), 8)
+        self.assertEqual(client.max_in_flight, 2)
+
+
+class SingleFlightTest(AIFeaturesTestMixin, TestCase):
+    """اختبارات دمج الطلبات المتطابقة المتزامنة"""
+
+    def test_concurrent_identical_summaries_call_model_once(self):
+        """الطلبات المتزامنة لنفس النص تنتظر استدعاءً واحداً"""
+        client = FakeGeminiClient(reply='ملخص', delay=0.2)
+        service = GeminiService(client=client)
+        before = services.single_flight.stats
+        results = []
+
+        threads = [
+            threading.Thread(target=lambda: results.append(service.generate_summary('نص المحاضرة')))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        after = services.single_flight.stats
+        self.assertEqual(results, ['ملخص'] * 5)
+        self.assertEqual(len(client.prompts), 1)
+        self.assertEqual(after['coalesced'] - before['coalesced'], 4)
+
+    def test_waits_for_result_of_other_process(self):
+        """وجود قفل من عملية أخرى يجعل الطلب ينتظر نتيجتها"""
+        key = 'ai:test-single-flight'
+        cache.add(f'{key}:lock', 1, 30)
+        threading.Timer(0.1, lambda: cache.set(key, 'نتيجة العملية الأخرى')).start()
+
+        result = services.single_flight.do(key, lambda: self.fail('should not execute'))
+        self.assertEqual(result, 'نتيجة العملية الأخرى')
+
+    @override_settings(AI_SINGLE_FLIGHT_TIMEOUT=0.2)
+    def test_waiter_runs_call_when_leader_hangs(self):
+        """الانتظار داخل العملية محدود بنفس مهلة الانتظار بين العمليات"""
+        key = 'ai:test-single-flight-hung'
+        release = threading.Event()
+        leader = threading.Thread(target=lambda: services.single_flight.do(key, lambda: release.wait(5) and None))
+        leader.start()
+        time.sleep(0.05)
+        try:
+            self.assertEqual(services.single_flight.do(key, lambda: 'نتيجة'), 'نتيجة')
+        finally:
+            release.set()
+            leader.join()
+
+
+class FileCacheKeyTest(AIFeaturesTestMixin, TestCase):
+    """اختبارات مفاتيح الكاش المبنية على بصمة الملف"""
+
+    def test_cache_hit_skips_extraction(self):
+        """الإصابة في الكاش لا تستخرج النص"""
+        file_obj = self.make_file('محتوى المحاضرة')
+        service = GeminiService(client=FakeGeminiClient(reply='ملخص'))
+        first = service.summarize_file(file_obj)
+
+        with patch.object(ExtractedTextStore, 'get_text') as get_text:
+            second = service.summarize_file(LectureFile.objects.get(pk=file_obj.pk))
+
+        self.assertFalse(first.cached)
+        self.assertTrue(second.cached)
+        self.assertEqual(second.data, 'ملخص')
+        get_text.assert_not_called()
+
+    def test_prompt_version_bump_invalidates_results(self):
+        """رفع إصدار القالب يُبطل النتائج المخزنة"""
+        file_obj = self.make_file('محتوى المحاضرة')
+        client = FakeGeminiClient(reply='ملخص')
+        service = GeminiService(client=client)
+        service.summarize_file(file_obj)
+
+        with patch.dict(services.PROMPT_VERSIONS, {'generate_summary': 99}):
+            response = service.summarize_file(file_obj)
+
+        self.assertFalse(response.cached)
+        self.assertEqual(len(client.prompts), 2)
+
+
+class AIArtifactStoreTest(AIFeaturesTestMixin, TestCase):
+    """اختبارات قراءة الملخصات والأسئلة المحفوظة قبل استدعاء النموذج"""
+
+    def setUp(self):
+        super().setUp()
+        self.client_stub = FakeGeminiClient(reply='ملخص المحاضرة')
+        self.service = GeminiService(client=self.client_stub)
+        self.file_obj = self.make_file('محتوى المحاضرة')
+
+    def test_stored_summary_is_served_without_model_call(self):
+        """الملخص المحفوظ لنفس نسخة الملف يُعاد دون استدعاء النموذج"""
+        first = AIArtifactStore.get_summary(self.file_obj, service=self.service)
+        cache.clear()
+        second = AIArtifactStore.get_summary(self.file_obj, service=self.service)
+
+        self.assertFalse(first.cached)
+        self.assertTrue(second.cached)
+        self.assertEqual(second.data.pk, first.data.pk)
+        self.assertEqual(len(self.client_stub.prompts), 1)
+
+    def test_summary_is_regenerated_for_new_file_version_or_refresh(self):
+        """تغيير الملف أو طلب التحديث يعيد التوليد"""
+        AIArtifactStore.get_summary(self.file_obj, service=self.service)
+        AIArtifactStore.get_summary(self.file_obj, refresh=True, service=self.service)
+        self.assertEqual(len(self.client_stub.prompts), 2)
+
+        self.file_obj.local_file.save('v2.txt', ContentFile('محتوى جديد'.encode('utf-8')), save=False)
+        self.file_obj.save()
+        response = AIArtifactStore.get_summary(self.file_obj, service=self.service)
+
+        self.assertFalse(response.cached)
+        self.assertEqual(len(self.client_stub.prompts), 3)
+        self.assertEqual(AISummary.objects.filter(file=self.file_obj).count(), 1)
+
+    def test_stored_questions_are_reused(self):
+        """الأسئلة المحفوظة تُعاد بدلاً من إضافة أسئلة جديدة كل مرة"""
+        self.client_stub.reply = json.dumps([
+            {'type': 'short_answer', 'question': f'سؤال {i}', 'answer': 'إجابة'} for i in range(3)
+        ])
+        first = AIArtifactStore.get_questions(self.file_obj, 'mixed', 3, service=self.service)
+        second = AIArtifactStore.get_questions(self.file_obj, 'mixed', 3, service=self.service)
+
+        self.assertFalse(first.cached)
+        self.assertTrue(second.cached)
+        self.assertEqual(AIGeneratedQuestion.objects.filter(file=self.file_obj).count(), 3)
+        self.assertEqual(len(self.client_stub.prompts), 1)
+
+    def test_fallback_after_model_error_is_not_stored(self):
+        """خطأ مؤقت في النموذج لا يُحفظ كملخص أو أسئلة للملف"""
+        failing = GeminiService(client=FakeGeminiBackend(rate_limit_rate=1.0))
+        with patch.object(services.time, 'sleep'):
+            summary = AIArtifactStore.get_summary(self.file_obj, service=failing)
+            questions = AIArtifactStore.get_questions(self.file_obj, 'mixed', 3, service=failing)
+
+        self.assertFalse(summary.success)
+        self.assertFalse(questions.success)
+        self.assertFalse(AISummary.objects.filter(file=self.file_obj).exists())
+        self.assertFalse(AIGeneratedQuestion.objects.filter(file=self.file_obj).exists())
+
+        # بعد عودة الخدمة يُولّد الملخص الحقيقي دون refresh
+        response = AIArtifactStore.get_summary(self.file_obj, service=self.service)
+        self.assertTrue(response.success)
+        self.assertEqual(response.data.summary_text, 'ملخص المحاضرة')
+
+
+class FakeBackendBenchmarkTest(AIFeaturesTestMixin, TestCase):
+    """اختبارات النموذج المحلي وأداة القياس"""
+
+    def test_fake_backend_is_deterministic_and_injects_errors(self):
+        """الرد ثابت لكل طلب، والأخطاء المحقونة تُترجم كأخطاء الخدمة"""
+        service = GeminiService(client=FakeGeminiBackend())
+        self.assertEqual(service.ask_document('نص', 'سؤال'), service.ask_document('نص', 'سؤال'))
+
+        failing = GeminiService(client=FakeGeminiBackend(rate_limit_rate=1.0))
+        with patch.object(services.time, 'sleep'):
+            with self.assertRaises(GeminiAPIError):
+                failing._generate_content('نص')
+
+    @override_settings(AI_BACKEND='fake')
+    def test_benchmark_reports_latency_and_cache_hits(self):
+        """الجولة الثانية تُخدم من الذاكرة المؤقتة"""
+        self.assertIsInstance(GeminiService()._client, FakeGeminiBackend)
+
+        paths = build_sample_corpus(Path(self.media_root), files_per_type=1, pages=2)
+        client = InstrumentedClient(FakeGeminiBackend())
+        report = run_benchmark(
+            GeminiService(client=client), client, paths, ('summary', 'questions'), concurrency=4
+        )
+
+        stats = report.by_operation()
+        self.assertEqual(stats['summary']['count'], 2 * len(paths))
+        self.assertEqual(stats['questions']['errors'], 0)
+        self.assertGreaterEqual(report.cache_hit_rate, 0.5)
+        self.assertLessEqual(stats['summary']['p50'], stats['summary']['p99'])
+
+
+class TokenUsageTest(AIFeaturesTestMixin, TestCase):
+    """اختبارات محاسبة التوكنات والميزانيات"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            academic_id='20250002', password='pass', id_card_number='1000002',
+            full_name='مدرس تجريبي', account_status='active',
+            role=Role.objects.create(code=Role.INSTRUCTOR, display_name='مدرس')
+        )
+        self.file_obj = self.make_file('المكدس بنية بيانات خطية')
+        ledger_patch = patch.object(
+            services.write_usage_ledger_async, 'delay', side_effect=services.write_usage_ledger_async
+        )
+        ledger_patch.start()
+        self.addCleanup(ledger_patch.stop)
+
+    def test_ledger_records_model_token_counts(self):
+        """السجل يحفظ أعداد التوكنات من استجابة النموذج، والنتيجة المخزنة بلا توكنات"""
+        service = GeminiService(client=FakeGeminiBackend())
+        with self.captureOnCommitCallbacks(execute=True):
+            with usage_meter(self.user, self.file_obj, 'summary') as meter:
+                AIArtifactStore.get_summary(self.file_obj, user=self.user, service=service)
+            with usage_meter(self.user, self.file_obj, 'summary') as cached_meter:
+                AIArtifactStore.get_summary(self.file_obj, user=self.user, service=service)
+
+        entry, cached_entry = AIUsageLedger.objects.order_by('id')
+        self.assertGreater(meter.total_tokens, 0)
+        self.assertEqual(entry.total_tokens, meter.total_tokens)
+        self.assertEqual((entry.course_id, entry.semester_id), (self.course.pk, self.course.semester_id))
+        self.assertFalse(entry.was_cached)
+        self.assertTrue(cached_meter.cached)
+        self.assertTrue(cached_entry.was_cached)
+
+    @override_settings(AI_TOKEN_BUDGET_COURSE_DAILY=100)
+    def test_exhausted_course_budget_blocks_generation(self):
+        """تجاوز ميزانية المقرر يمنع الطلب قبل إرساله للنموذج"""
+        AIUsageLedger.objects.create(
+            course=self.course, semester=self.course.semester, operation='summary',
+            prompt_tokens=80, completion_tokens=30
+        )
+        self.client.force_login(self.user)
+        fake = FakeGeminiClient()
+        with patch('apps.ai_features.views.GeminiService', lambda: GeminiService(client=fake)):
+            response = self.client.post(reverse('ai_features:summarize_stream', args=[self.file_obj.pk]))
+
+        body = b''.join(response.streaming_content).decode('utf-8')
+        self.assertIn('الحصة اليومية لهذا المقرر', body)
+        self.assertEqual(fake.prompts, [])
+
+
+class AIJobQueueTest(AIFeaturesTestMixin, TestCase):
+    """اختبارات طابور المهام: الأولويات والحصة العادلة ومتابعة الحالة"""
+
+    def setUp(self):
+        super().setUp()
+        self.users = [
+            User.objects.create_user(
+                academic_id=f'2025010{i}', password='pass', id_card_number=f'100010{i}',
+                full_name='مستخدم تجريبي', account_status='active'
+            )
+            for i in range(2)
+        ]
+        self.file_obj = self.make_file('المكدس بنية بيانات خطية')
+
+    def test_interactive_lane_is_claimed_first(self):
+        """المهمة التفاعلية تسبق دفعة المدرس حتى لو أُضيفت بعدها"""
+        enqueue_job('questions', user=self.users[0], lane=AIJob.LANE_BATCH, file_id=self.file_obj.pk)
+        interactive = enqueue_job(
+            'summary', user=self.users[1], lane=AIJob.LANE_INTERACTIVE, file_id=self.file_obj.pk
+        )
+
+        job = AIJob.claim('test')
+        self.assertEqual(job.pk, interactive.pk)
+        self.assertEqual((job.status, job.attempts, job.worker), ('running', 1, 'test'))
+
+    def test_fair_share_prefers_user_with_fewer_running_jobs(self):
+        """مستخدم لديه مهمة جارية لا يحجز العامل التالي قبل غيره"""
+        heavy, light = self.users
+        for _ in range(3):
+            enqueue_job('summary', user=heavy, file_id=self.file_obj.pk)
+        light_job = enqueue_job('summary', user=light, file_id=self.file_obj.pk)
+
+        self.assertEqual(AIJob.claim('w1').user, heavy)
+        self.assertEqual(AIJob.claim('w2').pk, light_job.pk)
+        self.assertEqual(AIJob.claim('w3').user, heavy)
+
+    def test_worker_runs_job_and_status_endpoint_shows_result(self):
+        """العامل ينفذ المهمة ثم يعرض الـ partial النتيجة بدلاً من الاستعلام"""
+        user = self.users[0]
+        job = enqueue_job(
+            'summary', user=user, lane=AIJob.LANE_INTERACTIVE,
+            file_id=self.file_obj.pk, user_id=user.pk
+        )
+        self.client.force_login(user)
+        url = reverse('ai_features:job_status', args=[job.pk])
+        self.assertIn('hx-trigger="every 2s"', self.client.get(url, HTTP_HX_REQUEST='true').content.decode())
+
+        fake = FakeGeminiClient(reply='ملخص من الطابور')
+        with patch.object(services, 'GeminiService', lambda: GeminiService(client=fake)):
+            self.assertTrue(AIJobWorker().run_next('test'))
+        self.assertFalse(AIJobWorker().run_next('test'))
+
+        data = self.client.get(url).json()
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual(data['result']['summary'], 'ملخص من الطابور')
+        body = self.client.get(url, HTTP_HX_REQUEST='true').content.decode()
+        self.assertIn('ملخص من الطابور', body)
+        self.assertNotIn('hx-trigger', body)
+        self.assertEqual(AISummary.objects.get(file=self.file_obj).user, user)
+
+    def test_model_outage_is_retried_with_backoff(self):
+        """تعطل النموذج يعيد المهمة إلى الطابور بدلاً من إنهائها كخطأ نهائي"""
+        job = enqueue_job('summary', user=self.users[0], file_id=self.file_obj.pk)
+        failing = GeminiService(client=FakeGeminiBackend(rate_limit_rate=1.0))
+        with patch.object(services, 'GeminiService', lambda: failing), patch.object(services.time, 'sleep'):
+            self.assertTrue(AIJobWorker().run_next('test'))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertFalse(AISummary.objects.filter(file=self.file_obj).exists())
+
+    def test_long_running_job_with_heartbeat_is_not_requeued(self):
+        """المهمة الطويلة لا تُعاد إلى الطابور ما دام عاملها يرسل نبضات"""
+        enqueue_job('summary', user=self.users[0], file_id=self.file_obj.pk)
+        enqueue_job('summary', user=self.users[1], file_id=self.file_obj.pk)
+        alive, dead = AIJob.claim('w1'), AIJob.claim('w2')
+        old = timezone.now() - timedelta(seconds=3600)
+        AIJob.objects.update(started_at=old, heartbeat_at=old)
+
+        worker = AIJobWorker()
+        worker._active.add('w1')
+        self.assertEqual(worker.heartbeat(), 1)
+        self.assertEqual(AIJob.requeue_stale(900), 1)
+
+        alive.refresh_from_db()
+        dead.refresh_from_db()
+        self.assertEqual((alive.status, alive.worker), ('running', 'w1'))
+        self.assertEqual((dead.status, dead.worker), ('queued', ''))
+
+    def test_worker_cannot_finish_job_taken_over_by_another(self):
+        """العامل الذي أُعيدت مهمته وحجزها غيره لا يكتب نتيجتها"""
+        enqueue_job('summary', user=self.users[0], file_id=self.file_obj.pk, user_id=self.users[0].pk)
+        job = AIJob.claim('w1')
+        AIJob.objects.filter(pk=job.pk).update(status='queued', worker='')
+        AIJob.claim('w2')
+
+        fake = FakeGeminiClient(reply='ملخص العامل الأول')
+        with patch.object(services, 'GeminiService', lambda: GeminiService(client=fake)):
+            run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.result), ('running', 'w2', None))
+
+
+class QuestionBankTest(AIFeaturesTestMixin, TestCase):
+    """اختبارات توليد بنك أسئلة المقرر"""
+
+    def setUp(self):
+        super().setUp()
+        self.files = [self.make_file(f'المحاضرة {i}: المكدس والطابور', name=f'lecture{i}.txt') for i in range(3)]
+        for file_obj in self.files:
+            file_obj.is_visible = True
+            file_obj.save()
+        reply = json.dumps([
+            {'type': 'short_answer', 'question': 'ما هو المكدس؟', 'answer': 'بنية LIFO'},
+            {'type': 'short_answer', 'question': 'عرّف الطابور', 'answer': 'بنية FIFO'},
+        ], ensure_ascii=False)
+        self.fake = FakeGeminiClient(reply=reply)
+        self.service = GeminiService(client=self.fake)
+
+    def test_near_duplicates_are_detected(self):
+        dedupe = QuestionDeduplicator()
+        self.assertFalse(dedupe.is_duplicate('ما هو المكدس؟'))
+        self.assertTrue(dedupe.is_duplicate('ما المكدس'))
+        self.assertFalse(dedupe.is_duplicate('ما هي شجرة البحث الثنائية؟'))
+
+    def test_bank_dedupes_across_files_and_reuses_stored_questions(self):
+        """كل ملف يُولد مرة واحدة، والبنك يحتفظ بأول ظهور للسؤال فقط"""
+        steps = []
+        bank = build_question_bank(
+            self.course, 'short_answer', 2, service=self.service,
+            progress=lambda done, total: steps.append((done, total)) or True
+        )
+        self.assertEqual((bank.files, bank.generated, bank.reused), (3, 3, 0))
+        self.assertEqual(bank.duplicates, 4)
+        self.assertEqual(len(bank.question_ids), 2)
+        self.assertEqual(AIGeneratedQuestion.objects.filter(file__in=self.files).count(), 6)
+        self.assertEqual(steps[0], (0, 3))
+        self.assertEqual(steps[-1], (3, 3))
+
+        again = build_question_bank(self.course, 'short_answer', 2, service=self.service)
+        self.assertEqual((again.generated, again.reused), (0, 3))
+        self.assertEqual(again.question_ids, bank.question_ids)
+        self.assertEqual(len(self.fake.prompts), 3)
+
+
+class StreamingViewsTest(AIFeaturesTestMixin, TestCase):
+    """اختبارات بث الإجابات والملخصات (SSE)"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            academic_id='20250001', password='pass', id_card_number='1000001',
+            full_name='مدرس تجريبي', account_status='active',
+            role=Role.objects.create(code=Role.INSTRUCTOR, display_name='مدرس')
+        )
+        self.client.force_login(self.user)
+        self.file_obj = self.make_file('المكدس بنية بيانات خطية')
+        self.fake = FakeGeminiClient(reply='المكدس بنية خطية')
+        self.service_patch = patch(
+            'apps.ai_features.views.GeminiService', lambda: GeminiService(client=self.fake)
+        )
+        self.service_patch.start()
+        self.addCleanup(self.service_patch.stop)
+
+    def read_events(self, response):
+        body = b''.join(response.streaming_content).decode('utf-8')
+        events = []
+        for block in body.strip().split('\n\n'):
+            lines = dict(line.split(': ', 1) for line in block.split('\n'))
+            events.append((lines['event'], json.loads(lines['data'])))
+        return events
+
+    def test_answer_is_streamed_then_saved(self):
+        """الإجابة تُبث على دفعات ثم تُحفظ كاملة في AIChat"""
+        response = self.client.post(
+            reverse('ai_features:ask_stream', args=[self.file_obj.pk]), {'question': 'ما هو المكدس؟'}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        events = self.read_events(response)
+        deltas = [data['text'] for name, data in events if name == 'delta']
+        self.assertEqual(events[0][0], 'start')
+        self.assertGreater(len(deltas), 1)
+        self.assertEqual(events[-1][0], 'done')
+        chat = AIChat.objects.get(pk=events[-1][1]['chat_id'])
+        self.assertEqual(chat.answer, ''.join(deltas).strip())
+
+    def test_stored_summary_is_streamed_without_model_call(self):
+        """الملخص المحفوظ يُرسل مباشرة دون استدعاء النموذج"""
+        AIArtifactStore.save_summary(self.file_obj, 'ملخص محفوظ')
+        response = self.client.post(reverse('ai_features:summarize_stream', args=[self.file_obj.pk]))
+
+        events = self.read_events(response)
+        self.assertEqual(events[0], ('delta', {'text': 'ملخص محفوظ'}))
+        self.assertTrue(events[-1][1]['was_cached'])
+        self.assertEqual(self.fake.prompts, [])
+
+    def test_generated_summary_is_saved_on_completion(self):
+        """الملخص المبثوث يُحفظ في AISummary عند الانتهاء"""
+        response = self.client.post(reverse('ai_features:summarize_stream', args=[self.file_obj.pk]))
+
+        events = self.read_events(response)
+        self.assertEqual(events[-1][0], 'done')
+        summary = AISummary.objects.get(file=self.file_obj)
+        self.assertEqual(summary.summary_text, 'المكدس بنية خطية')
+        self.assertEqual(summary.source_hash, self.file_obj.get_content_hash())
+
+    def test_stream_requires_file_access(self):
+        """طالب غير مسجل في المقرر يُرفض قبل استدعاء النموذج"""
+        outsider = User.objects.create_user(
+            academic_id='20250002', password='pass', id_card_number='1000002',
+            full_name='طالب', account_status='active',
+            role=Role.objects.create(code=Role.STUDENT, display_name='طالب')
+        )
+        self.client.force_login(outsider)
+        for url, data in (
+            (reverse('ai_features:summarize_stream', args=[self.file_obj.pk]), {}),
+            (reverse('ai_features:ask_stream', args=[self.file_obj.pk]), {'question': 'ما هو المكدس؟'}),
+        ):
+            response = self.client.post(url, data)
+            self.assertEqual(response.status_code, 403)
+            self.assertEqual(self.read_events(response)[0][0], 'error')
+        self.assertEqual(self.fake.prompts, [])
+
+    @override_settings(AI_RATE_LIMIT_PER_HOUR=1)
+    def test_rate_limit_only_counts_model_calls(self):
+        """الملخص المحفوظ لا يستهلك الحصة، والطلب بعد تجاوز الحد يُرفض"""
+        AIArtifactStore.save_summary(self.file_obj, 'ملخص محفوظ')
+        url = reverse('ai_features:summarize_stream', args=[self.file_obj.pk])
+        self.read_events(self.client.post(url))
+
+        self.assertEqual(self.read_events(self.client.post(url, {'refresh': '1'}))[-1][0], 'done')
+        events = self.read_events(self.client.post(url, {'refresh': '1'}))
+        self.assertEqual(events[-1][0], 'error')
+        self.assertEqual(len(self.fake.prompts), 1)
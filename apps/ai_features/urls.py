@@ -11,10 +11,16 @@ app_name = 'ai_features'
 urlpatterns = [
     # AI Features
     path('summarize/<int:file_id>/', views.SummarizeView.as_view(), name='summarize'),
+    path('summarize/<int:file_id>/stream/', views.SummaryStreamView.as_view(), name='summarize_stream'),
     path('questions/<int:file_id>/', views.GenerateQuestionsView.as_view(), name='questions'),
     path('ask/<int:file_id>/', views.AskDocumentView.as_view(), name='ask_document'),
+    path('ask/<int:file_id>/stream/', views.AskDocumentStreamView.as_view(), name='ask_stream'),
     path('ask/<int:file_id>/clear/', views.ClearChatHistoryView.as_view(), name='clear_chat'),
     
+    # Job Queue
+    path('jobs/<int:job_id>/', views.JobStatusView.as_view(), name='job_status'),
+    path('jobs/<int:job_id>/cancel/', views.CancelJobView.as_view(), name='job_cancel'),
+    
     # Usage Stats
     path('usage/', views.AIUsageStatsView.as_view(), name='usage_stats'),
 ]
@@ -0,0 +1,248 @@
+"""
+محاسبة استهلاك التوكنات وميزانياتها
+S-ACM - Smart Academic Content Management System
+
+- عدادات دقيقة من usage_metadata في استجابة النموذج (وليس عدد الكلمات)
+- سجل إلحاقي مختصر (AIUsageLedger): سطر لكل استدعاء للنموذج
+- ميزانيات يومية لكل مستخدم ولكل مقرر، وميزانية لكل فصل دراسي،
+  تُفحص من عدادات الكاش قبل إرسال الطلب إلى النموذج
+
+Example:
+    with usage_meter(user, file_obj, 'summary') as meter:
+        response = AIArtifactStore.get_summary(file_obj, user=user)
+    meter.total_tokens
+"""
+
+import contextvars
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, time as dt_time
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger('ai_features')
+
+_current_meter: contextvars.ContextVar = contextvars.ContextVar('ai_usage_meter', default=None)
+
+
+# ========== Metering ==========
+
+@dataclass
+class CallUsage:
+    """استهلاك استدعاء واحد للنموذج."""
+    model_name: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency: float
+
+
+@dataclass
+class UsageMeter:
+    """استدعاءات النموذج التي تمت أثناء عملية واحدة."""
+    calls: List[CallUsage] = field(default_factory=list)
+
+    @property
+    def prompt_tokens(self) -> int:
+        return sum(call.prompt_tokens for call in self.calls)
+
+    @property
+    def completion_tokens(self) -> int:
+        return sum(call.completion_tokens for call in self.calls)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def cached(self) -> bool:
+        """لم يُستدعَ النموذج: النتيجة من الذاكرة المؤقتة أو من المخزن."""
+        return not self.calls
+
+
+def record_model_call(model_name: str, usage_metadata, latency: float) -> None:
+    """تسجيل استدعاء في العداد النشط (إن وجد). تستدعيه GeminiService."""
+    meter = _current_meter.get()
+    if meter is None:
+        return
+    meter.calls.append(CallUsage(
+        model_name=model_name,
+        prompt_tokens=getattr(usage_metadata, 'prompt_token_count', None) or 0,
+        completion_tokens=getattr(usage_metadata, 'candidates_token_count', None) or 0,
+        latency=latency,
+    ))
+
+
+@contextmanager
+def collect_usage():
+    """
+    جمع استدعاءات النموذج في عداد جديد دون خصمها أو تسجيلها.
+
+    للعمل داخل خيوط التنفيذ المتوازي؛ الخيط الرئيسي يحاسب لاحقاً عبر account_usage.
+    """
+    meter = UsageMeter()
+    token = _current_meter.set(meter)
+    try:
+        yield meter
+    finally:
+        try:
+            _current_meter.reset(token)
+        except ValueError:
+            # مولّد بث أُغلق من سياق آخر (مثل خادم ASGI)
+            _current_meter.set(None)
+
+
+def account_usage(user, file_obj, operation: str, meter: UsageMeter) -> None:
+    """خصم استهلاك العداد من الميزانيات وكتابته في السجل."""
+    try:
+        TokenBudget(user, file_obj).charge(meter.total_tokens)
+        write_ledger(user, file_obj, operation, meter)
+    except Exception as e:
+        logger.error(f"Failed to account AI usage for {operation}: {e}")
+
+
+@contextmanager
+def usage_meter(user, file_obj, operation: str):
+    """
+    قياس استهلاك عملية ثم خصمه من الميزانيات وكتابته في السجل.
+
+    الاستدعاءات في خيوط أخرى تُحسب إذا نُفذت داخل نسخة من السياق
+    (contextvars.copy_context)، كما في مرحلة map للتلخيص.
+    """
+    meter = None
+    try:
+        with collect_usage() as meter:
+            yield meter
+    finally:
+        if meter is not None:
+            account_usage(user, file_obj, operation, meter)
+
+
+def write_ledger(user, file_obj, operation: str, meter: UsageMeter) -> None:
+    """كتابة سطور السجل في الخلفية بعد تأكيد المعاملة."""
+    from django.db import transaction
+    from apps.ai_features.services import write_usage_ledger_async
+
+    course = getattr(file_obj, 'course', None)
+    context = {
+        'user_id': getattr(user, 'pk', None),
+        'course_id': getattr(course, 'pk', None),
+        'semester_id': getattr(course, 'semester_id', None),
+        'operation': operation,
+    }
+    rows = [
+        (call.model_name, call.prompt_tokens, call.completion_tokens, round(call.latency * 1000), False)
+        for call in meter.calls
+    ] or [('', 0, 0, 0, True)]
+
+    def dispatch():
+        try:
+            write_usage_ledger_async.delay(context, rows)
+        except Exception as e:
+            logger.error(f"Failed to schedule usage ledger write: {e}")
+
+    transaction.on_commit(dispatch)
+
+
+# ========== Budgets ==========
+
+@dataclass
+class BudgetScope:
+    """عداد ميزانية واحد (مستخدم / مقرر / فصل)."""
+    name: str
+    object_id: int
+    limit: int
+    since: Optional[datetime]
+
+    @property
+    def key(self) -> str:
+        period = self.since.strftime('%Y%m%d') if self.since else 'all'
+        return f"ai_tokens:{self.name}:{self.object_id}:{period}"
+
+    def ledger_total(self) -> int:
+        """الاستهلاك من السجل (عند غياب العداد من الكاش فقط)."""
+        from django.db.models import F, Sum
+        from apps.ai_features.models import AIUsageLedger
+
+        rows = AIUsageLedger.objects.filter(**{f'{self.name}_id': self.object_id})
+        if self.since is not None:
+            rows = rows.filter(created_at__gte=self.since)
+        total = rows.aggregate(total=Sum(F('prompt_tokens') + F('completion_tokens')))['total']
+        return total or 0
+
+
+@dataclass
+class BudgetStatus:
+    """نتيجة فحص الميزانيات."""
+    allowed: bool
+    scope: Optional[str] = None
+    remaining: Optional[int] = None
+
+
+class TokenBudget:
+    """
+    ميزانيات التوكنات لعملية على ملف.
+
+    الحدود من الإعدادات (0 = بدون حد):
+    AI_TOKEN_BUDGET_USER_DAILY و AI_TOKEN_BUDGET_COURSE_DAILY و AI_TOKEN_BUDGET_SEMESTER
+    """
+
+    COUNTER_TIMEOUT = 60 * 60 * 24 * 2
+
+    def __init__(self, user, file_obj=None):
+        today = timezone.make_aware(datetime.combine(timezone.localdate(), dt_time.min))
+        course = getattr(file_obj, 'course', None)
+        candidates = [
+            ('user', getattr(user, 'pk', None), 'AI_TOKEN_BUDGET_USER_DAILY', today),
+            ('course', getattr(course, 'pk', None), 'AI_TOKEN_BUDGET_COURSE_DAILY', today),
+            ('semester', getattr(course, 'semester_id', None), 'AI_TOKEN_BUDGET_SEMESTER', None),
+        ]
+        self.scopes = [
+            BudgetScope(name, object_id, getattr(settings, setting, 0), since)
+            for name, object_id, setting, since in candidates
+            if object_id is not None and getattr(settings, setting, 0)
+        ]
+
+    def _used(self, scope: BudgetScope) -> int:
+        used = cache.get(scope.key)
+        if used is None:
+            cache.add(scope.key, scope.ledger_total(), self.COUNTER_TIMEOUT)
+            used = cache.get(scope.key, 0)
+        return used
+
+    def check(self) -> BudgetStatus:
+        """فحص جميع الميزانيات قبل إرسال الطلب (بدون خصم)."""
+        remaining = None
+        for scope in self.scopes:
+            left = scope.limit - self._used(scope)
+            if left <= 0:
+                return BudgetStatus(False, scope.name, 0)
+            remaining = left if remaining is None else min(remaining, left)
+        return BudgetStatus(True, None, remaining)
+
+    def charge(self, tokens: int) -> None:
+        """خصم التوكنات المستهلكة من جميع الميزانيات."""
+        if tokens <= 0:
+            return
+        for scope in self.scopes:
+            self._used(scope)
+            try:
+                cache.incr(scope.key, tokens)
+            except ValueError:
+                cache.set(scope.key, tokens, self.COUNTER_TIMEOUT)
+
+
+BUDGET_MESSAGES = {
+    'user': 'لقد استهلكت حصتك اليومية من الذكاء الاصطناعي. حاول غداً.',
+    'course': 'تم استهلاك الحصة اليومية لهذا المقرر. حاول غداً.',
+    'semester': 'تم استهلاك حصة الذكاء الاصطناعي لهذا الفصل الدراسي.',
+}
+
+
+def check_budget(user, file_obj=None) -> Optional[str]:
+    """رسالة الخطأ إذا تجاوزت العملية إحدى الميزانيات، وإلا None."""
+    status = TokenBudget(user, file_obj).check()
+    return None if status.allowed else BUDGET_MESSAGES[status.scope]
@@ -3,47 +3,51 @@ Views لتطبيق ai_features
 S-ACM - Smart Academic Content Management System
 """
 
+import json
+import logging
+import time
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.views import View
 from django.views.generic import ListView, DetailView
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.conf import settings
 from datetime import timedelta
 
 # تصحيح الاستيراد: AIGeneratedQuestion بدلاً من AIQuestion
-from .models import AISummary, AIGeneratedQuestion, AIChat, AIUsageLog
-from .services import GeminiService
-from apps.courses.models import LectureFile
+from .models import AISummary, AIGeneratedQuestion, AIChat, AIUsageLog, AIJob
+from .services import GeminiService, GeminiError, AIArtifactStore, record_usage
+from .usage import check_budget, usage_meter
+from .jobs import queue_position
+from apps.courses.models import Course, LectureFile
+from apps.courses.services import EnhancedFileService
 from apps.accounts.views import StudentRequiredMixin
+from apps.core.ratelimit import ai_rate_limiter
+
+logger = logging.getLogger('ai_features')
+
+RATE_LIMIT_MESSAGE = 'لقد تجاوزت الحد المسموح من الطلبات. حاول بعد ساعة.'
 
 
 class AIRateLimitMixin:
-    """Mixin للتحقق من حد الاستخدام"""
+    """Mixin للتحقق من حد الاستخدام (عداد في الكاش، انظر core.ratelimit)"""
     
     def check_rate_limit(self, user):
-        """التحقق من عدم تجاوز حد الاستخدام"""
-        one_hour_ago = timezone.now() - timedelta(hours=1)
-        usage_count = AIUsageLog.objects.filter(
-            user=user,
-            request_time__gte=one_hour_ago
-        ).count()
-        
-        limit = getattr(settings, 'AI_RATE_LIMIT_PER_HOUR', 10)
-        return usage_count < limit
+        """تسجيل طلب توليد والتحقق من عدم تجاوز حد الاستخدام"""
+        return ai_rate_limiter().hit(user.pk).allowed
     
     def get_remaining_requests(self, user):
         """الحصول على عدد الطلبات المتبقية"""
-        one_hour_ago = timezone.now() - timedelta(hours=1)
-        usage_count = AIUsageLog.objects.filter(
-            user=user,
-            request_time__gte=one_hour_ago
-        ).count()
-        
-        limit = getattr(settings, 'AI_RATE_LIMIT_PER_HOUR', 10)
-        return max(0, limit - usage_count)
+        return ai_rate_limiter().peek(user.pk).remaining
+    
+    def quota_error(self, user, file_obj=None):
+        """رسالة الخطأ عند تجاوز ميزانية التوكنات أو حد الطلبات، وإلا None"""
+        return check_budget(user, file_obj) or (
+            None if self.check_rate_limit(user) else RATE_LIMIT_MESSAGE
+        )
 
 
 class SummarizeView(LoginRequiredMixin, AIRateLimitMixin, View):
@@ -70,46 +74,36 @@ class SummarizeView(LoginRequiredMixin, AIRateLimitMixin, View):
     def post(self, request, file_id):
         file_obj = get_object_or_404(LectureFile, pk=file_id, is_deleted=False)
         
-        # التحقق من حد الاستخدام
-        if not self.check_rate_limit(request.user):
-            messages.error(request, 'لقد تجاوزت الحد المسموح من الطلبات. حاول بعد ساعة.')
+        refresh = request.POST.get('refresh') == '1'
+        
+        # التحقق من حد الاستخدام (فقط عند الحاجة لاستدعاء النموذج)
+        needs_generation = refresh or AIArtifactStore.stored_summary(file_obj) is None
+        error = needs_generation and self.quota_error(request.user, file_obj)
+        if error:
+            messages.error(request, error)
             return redirect('ai_features:summarize', file_id=file_id)
         
-        # استخراج النص من الملف
         try:
-            gemini = GeminiService()
-            text_content = gemini.extract_text_from_file(file_obj)
+            # الملخص المحفوظ يُعاد مباشرة، ولا يُولّد إلا عند غيابه أو طلب التحديث
+            with usage_meter(request.user, file_obj, 'summary') as meter:
+                response = AIArtifactStore.get_summary(file_obj, user=request.user, refresh=refresh)
             
-            if not text_content:
-                messages.error(request, 'لم نتمكن من استخراج النص من هذا الملف.')
+            if not response.success:
+                messages.error(request, response.error or 'لم نتمكن من استخراج النص من هذا الملف.')
                 return redirect('ai_features:summarize', file_id=file_id)
             
-            # توليد التلخيص
-            summary_text = gemini.generate_summary(text_content)
-            
-            # حفظ التلخيص
-            summary, created = AISummary.objects.update_or_create(
-                file=file_obj,
-                defaults={
-                    'user': request.user,
-                    'summary_text': summary_text,
-                    'word_count': len(summary_text.split()),
-                    'language': 'ar',
-                    'model_used': 'gemini-2.0-flash',
-                    'is_cached': True
-                }
-            )
-            
             # تسجيل الاستخدام
-            AIUsageLog.objects.create(
-                user=request.user,
-                request_type='summary',
-                file=file_obj,
-                tokens_used=len(text_content.split()) + len(summary_text.split()),
+            record_usage(
+                request.user, 'summary', file=file_obj,
+                tokens_used=meter.total_tokens,
+                was_cached=response.cached,
                 success=True
             )
             
-            messages.success(request, 'تم إنشاء التلخيص بنجاح!')
+            if response.cached:
+                messages.success(request, 'تم عرض التلخيص المحفوظ لهذا الملف.')
+            else:
+                messages.success(request, 'تم إنشاء التلخيص بنجاح!')
             
         except Exception as e:
             messages.error(request, f'حدث خطأ أثناء التلخيص: {str(e)}')
@@ -127,6 +121,7 @@ class GenerateQuestionsView(LoginRequiredMixin, AIRateLimitMixin, View):
         # الأسئلة السابقة - تم تحديث الاستعلام للمودل الجديد
         existing_questions = AIGeneratedQuestion.objects.filter(
             file=file_obj,
+            is_cached=True,
             # user=request.user # يمكن إزالة هذا الشرط لعرض الأسئلة العامة للمقرر
         ).order_by('-generated_at')
         
@@ -141,60 +136,47 @@ class GenerateQuestionsView(LoginRequiredMixin, AIRateLimitMixin, View):
     def post(self, request, file_id):
         file_obj = get_object_or_404(LectureFile, pk=file_id, is_deleted=False)
         
-        if not self.check_rate_limit(request.user):
-            messages.error(request, 'لقد تجاوزت الحد المسموح من الطلبات. حاول بعد ساعة.')
-            return redirect('ai_features:questions', file_id=file_id)
-        
         question_type_req = request.POST.get('question_type', 'mixed')
         num_questions = int(request.POST.get('num_questions', 5))
+        refresh = request.POST.get('refresh') == '1'
+        
+        needs_generation = refresh or AIArtifactStore.stored_questions(
+            file_obj, question_type_req, num_questions
+        ) is None
+        error = needs_generation and self.quota_error(request.user, file_obj)
+        if error:
+            messages.error(request, error)
+            return redirect('ai_features:questions', file_id=file_id)
         
         try:
-            gemini = GeminiService()
-            text_content = gemini.extract_text_from_file(file_obj)
+            # الأسئلة المحفوظة تُعاد مباشرة، ولا تُولّد إلا عند نقصها أو طلب التحديث
+            with usage_meter(request.user, file_obj, 'questions') as meter:
+                response = AIArtifactStore.get_questions(
+                    file_obj,
+                    question_type=question_type_req,
+                    num_questions=num_questions,
+                    user=request.user,
+                    refresh=refresh
+                )
             
-            if not text_content:
-                messages.error(request, 'لم نتمكن من استخراج النص من هذا الملف.')
+            if not response.success:
+                messages.error(request, response.error or 'لم نتمكن من استخراج النص من هذا الملف.')
                 return redirect('ai_features:questions', file_id=file_id)
             
-            # توليد الأسئلة (تعود كقائمة من القواميس)
-            # يجب تحويل question_type_req إلى Enum داخل Service أو تمريره كنص كما هو مدعوم
-            from .services import QuestionType
-            q_type_enum = QuestionType.MIXED
-            try:
-                q_type_enum = QuestionType(question_type_req)
-            except ValueError:
-                pass
-
-            questions_data = gemini.generate_questions(
-                text_content,
-                question_type=q_type_enum,
-                num_questions=num_questions
-            )
+            questions = response.data
             
-            # حفظ الأسئلة - تم التحديث للحفظ كسجلات متعددة
-            if questions_data:
-                for q in questions_data:
-                    AIGeneratedQuestion.objects.create(
-                        file=file_obj,
-                        user=request.user,
-                        question_text=q.get('question', 'سؤال بدون نص'),
-                        question_type=q.get('type', 'short_answer'),
-                        options=q.get('options'), # سيتم حفظه كـ JSON تلقائياً
-                        correct_answer=q.get('answer', ''),
-                        explanation=q.get('explanation', ''),
-                        difficulty_level='medium',
-                        is_cached=True
-                    )
-                
-                AIUsageLog.objects.create(
-                    user=request.user,
-                    request_type='questions',
-                    file=file_obj,
-                    tokens_used=len(text_content.split()),
+            if questions:
+                record_usage(
+                    request.user, 'questions', file=file_obj,
+                    tokens_used=meter.total_tokens,
+                    was_cached=response.cached,
                     success=True
                 )
                 
-                messages.success(request, f'تم توليد {len(questions_data)} سؤال بنجاح!')
+                if response.cached:
+                    messages.success(request, f'تم عرض {len(questions)} سؤال محفوظ لهذا الملف.')
+                else:
+                    messages.success(request, f'تم توليد {len(questions)} سؤال بنجاح!')
             else:
                 messages.warning(request, 'لم يتمكن الذكاء الاصطناعي من توليد أسئلة مفيدة من هذا النص.')
             
@@ -227,13 +209,11 @@ class AskDocumentView(LoginRequiredMixin, AIRateLimitMixin, View):
     def post(self, request, file_id):
         file_obj = get_object_or_404(LectureFile, pk=file_id, is_deleted=False)
         
-        if not self.check_rate_limit(request.user):
+        error = self.quota_error(request.user, file_obj)
+        if error:
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return JsonResponse({
-                    'success': False,
-                    'error': 'لقد تجاوزت الحد المسموح من الطلبات. حاول بعد ساعة.'
-                })
-            messages.error(request, 'لقد تجاوزت الحد المسموح من الطلبات. حاول بعد ساعة.')
+                return JsonResponse({'success': False, 'error': error})
+            messages.error(request, error)
             return redirect('ai_features:ask_document', file_id=file_id)
         
         question = request.POST.get('question', '').strip()
@@ -246,17 +226,16 @@ class AskDocumentView(LoginRequiredMixin, AIRateLimitMixin, View):
         
         try:
             gemini = GeminiService()
-            text_content = gemini.extract_text_from_file(file_obj)
+            with usage_meter(request.user, file_obj, 'chat') as meter:
+                answer = gemini.ask_file(file_obj, question)
             
-            if not text_content:
+            if answer is None:
                 error_msg = 'لم نتمكن من استخراج النص من هذا الملف.'
                 if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                     return JsonResponse({'success': False, 'error': error_msg})
                 messages.error(request, error_msg)
                 return redirect('ai_features:ask_document', file_id=file_id)
             
-            answer = gemini.ask_document(text_content, question)
-            
             chat = AIChat.objects.create(
                 file=file_obj,
                 user=request.user,
@@ -264,11 +243,9 @@ class AskDocumentView(LoginRequiredMixin, AIRateLimitMixin, View):
                 answer=answer
             )
             
-            AIUsageLog.objects.create(
-                user=request.user,
-                request_type='chat',
-                file=file_obj,
-                tokens_used=len(question.split()) + len(answer.split()),
+            record_usage(
+                request.user, 'chat', file=file_obj,
+                tokens_used=meter.total_tokens,
                 success=True
             )
             
@@ -291,6 +268,169 @@ class AskDocumentView(LoginRequiredMixin, AIRateLimitMixin, View):
         return redirect('ai_features:ask_document', file_id=file_id)
 
 
+def _sse_event(event: str, data: dict) -> str:
+    """تنسيق حدث Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _sse_response(events, status: int = 200) -> StreamingHttpResponse:
+    """استجابة SSE بدون تخزين مؤقت في المتصفح أو الخادم الوسيط."""
+    response = StreamingHttpResponse(events, content_type='text/event-stream', status=status)
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _stream_file_or_error(request, file_id):
+    """
+    الملف بعد التحقق من صلاحية الوصول (كما في العروض الجزئية)، أو استجابة
+    SSE بحدث error وحالة 403.
+    
+    Returns:
+        Tuple: (الملف، None) أو (None، استجابة الرفض)
+    """
+    file_obj = get_object_or_404(LectureFile, pk=file_id, is_deleted=False)
+    allowed, error = EnhancedFileService.check_file_access(request.user, file_obj)
+    if not allowed:
+        return None, _sse_response(iter([_sse_event('error', {'error': error})]), status=403)
+    return file_obj, None
+
+
+class SummaryStreamView(LoginRequiredMixin, AIRateLimitMixin, View):
+    """
+    بث التلخيص إلى المتصفح أثناء توليده (Server-Sent Events)
+    
+    الأحداث: start ثم delta لكل جزء من النص ثم done (أو error).
+    يُحفظ الملخص الكامل في AISummary عند الانتهاء.
+    """
+    
+    def post(self, request, file_id):
+        file_obj, denied = _stream_file_or_error(request, file_id)
+        if denied:
+            return denied
+        refresh = request.POST.get('refresh') == '1'
+        
+        stored = None if refresh else AIArtifactStore.stored_summary(file_obj)
+        if stored is not None:
+            record_usage(
+                request.user, 'summary', file=file_obj,
+                tokens_used=0, was_cached=True, success=True
+            )
+            return _sse_response(iter([
+                _sse_event('delta', {'text': stored.summary_text}),
+                _sse_event('done', {'summary_id': stored.id, 'was_cached': True}),
+            ]))
+        
+        error = self.quota_error(request.user, file_obj)
+        if error:
+            return _sse_response(iter([_sse_event('error', {'error': error})]))
+        
+        return _sse_response(self._stream(file_obj, request.user))
+    
+    def _stream(self, file_obj, user):
+        with usage_meter(user, file_obj, 'summary') as meter:
+            yield from self._stream_summary(file_obj, user, meter)
+    
+    def _stream_summary(self, file_obj, user, meter):
+        # حدث فوري حتى يصل أول بايت قبل الاستخراج واستدعاء النموذج
+        yield _sse_event('start', {})
+        started = time.monotonic()
+        parts = []
+        try:
+            service = GeminiService()
+            text = service.extract_text_from_file(file_obj)
+            if not text:
+                yield _sse_event('error', {'error': 'لم نتمكن من استخراج النص من هذا الملف.'})
+                return
+            for delta in service.stream_summary(text):
+                parts.append(delta)
+                yield _sse_event('delta', {'text': delta})
+        except GeminiError as e:
+            logger.error(f"Summary stream failed for file {file_obj.id}: {e}")
+            record_usage(
+                user, 'summary', file=file_obj,
+                success=False, error_message=str(e)
+            )
+            yield _sse_event('error', {'error': 'حدث خطأ أثناء التلخيص.'})
+            return
+        
+        summary = AIArtifactStore.save_summary(
+            file_obj, ''.join(parts).strip(), user=user,
+            model_used=service._model_name,
+            generation_time=time.monotonic() - started
+        )
+        record_usage(
+            user, 'summary', file=file_obj,
+            tokens_used=meter.total_tokens, success=True
+        )
+        yield _sse_event('done', {'summary_id': summary.id, 'was_cached': False})
+
+
+class AskDocumentStreamView(LoginRequiredMixin, AIRateLimitMixin, View):
+    """
+    بث إجابة "اسأل المستند" أثناء توليدها (Server-Sent Events)
+    
+    تُحفظ الإجابة الكاملة في AIChat عند الانتهاء.
+    """
+    
+    def post(self, request, file_id):
+        file_obj, denied = _stream_file_or_error(request, file_id)
+        if denied:
+            return denied
+        question = request.POST.get('question', '').strip()
+        
+        if not question:
+            return _sse_response(iter([_sse_event('error', {'error': 'يرجى إدخال سؤال.'})]))
+        error = self.quota_error(request.user, file_obj)
+        if error:
+            return _sse_response(iter([_sse_event('error', {'error': error})]))
+        
+        return _sse_response(self._stream(file_obj, request.user, question))
+    
+    def _stream(self, file_obj, user, question):
+        with usage_meter(user, file_obj, 'chat') as meter:
+            yield from self._stream_answer(file_obj, user, question, meter)
+    
+    def _stream_answer(self, file_obj, user, question, meter):
+        yield _sse_event('start', {})
+        started = time.monotonic()
+        parts = []
+        try:
+            deltas = GeminiService().stream_answer(file_obj, question)
+            if deltas is None:
+                yield _sse_event('error', {'error': 'لم نتمكن من استخراج النص من هذا الملف.'})
+                return
+            for delta in deltas:
+                parts.append(delta)
+                yield _sse_event('delta', {'text': delta})
+        except GeminiError as e:
+            logger.error(f"Answer stream failed for file {file_obj.id}: {e}")
+            record_usage(
+                user, 'chat', file=file_obj,
+                success=False, error_message=str(e)
+            )
+            yield _sse_event('error', {'error': 'عذراً، حدث خطأ أثناء معالجة سؤالك.'})
+            return
+        
+        answer = ''.join(parts).strip()
+        chat = AIChat.objects.create(
+            file=file_obj,
+            user=user,
+            question=question,
+            answer=answer,
+            response_time=time.monotonic() - started
+        )
+        record_usage(
+            user, 'chat', file=file_obj,
+            tokens_used=meter.total_tokens,
+            success=True
+        )
+        yield _sse_event('done', {
+            'chat_id': chat.id,
+            'created_at': chat.created_at.strftime('%Y-%m-%d %H:%M')
+        })
+
+
 class AIUsageStatsView(LoginRequiredMixin, View):
     """إحصائيات استخدام الذكاء الاصطناعي"""
     template_name = 'ai_features/usage_stats.html'
@@ -338,4 +478,63 @@ class ClearChatHistoryView(LoginRequiredMixin, View):
             return JsonResponse({'success': True})
         
         messages.success(request, 'تم مسح سجل المحادثة.')
-        return redirect('ai_features:ask_document', file_id=file_id)
\ No newline at end of file
+        return redirect('ai_features:ask_document', file_id=file_id)
+
+
+class JobStatusView(LoginRequiredMixin, View):
+    """
+    حالة مهمة في طابور الذكاء الاصطناعي
+    
+    HTMX: يُرجع partial يعيد الاستعلام كل ثانيتين حتى تنتهي المهمة ثم يعرض النتيجة.
+    غير ذلك: JSON.
+    """
+    template_name = 'ai_features/partials/job_status.html'
+    
+    def get(self, request, job_id):
+        job = get_object_or_404(AIJob, pk=job_id, user=request.user)
+        position = queue_position(job)
+        
+        if not request.headers.get('HX-Request'):
+            return JsonResponse({
+                'id': job.id,
+                'task': job.task,
+                'lane': job.get_lane_display(),
+                'status': job.status,
+                'position': position,
+                'progress': {'done': job.progress_done, 'total': job.progress_total},
+                'result': job.result,
+                'error': job.error if job.is_finished else '',
+            })
+        
+        context = {'job': job, 'position': position}
+        result = job.result or {}
+        if job.status == 'done':
+            context['file'] = LectureFile.objects.filter(pk=job.kwargs.get('file_id')).first()
+            if job.task == 'summary':
+                context['summary'] = result.get('summary', '')
+            elif job.task in ('questions', 'question_bank'):
+                if job.task == 'question_bank':
+                    context['course'] = Course.objects.filter(pk=job.kwargs.get('course_id')).first()
+                questions = AIGeneratedQuestion.objects.filter(pk__in=result.get('question_ids', []))
+                context['questions'] = [
+                    {
+                        'type': q.question_type,
+                        'question': q.question_text,
+                        'options': q.options,
+                        'answer': q.correct_answer,
+                        'explanation': q.explanation,
+                    }
+                    for q in questions.order_by('id')
+                ]
+        return render(request, self.template_name, context)
+
+
+class CancelJobView(LoginRequiredMixin, View):
+    """إلغاء مهمة (الجارية تتوقف عند تحديث تقدمها التالي أو تُهمل نتيجتها)"""
+    
+    def post(self, request, job_id):
+        job = get_object_or_404(AIJob, pk=job_id, user=request.user)
+        cancelled = AIJob.objects.filter(pk=job.pk, status__in=['queued', 'running']).update(
+            status='cancelled', finished_at=timezone.now()
+        )
+        return JsonResponse({'success': bool(cancelled)})
@@ -0,0 +1,32 @@
+"""
+دوال تُنفذ داخل عمليات فرعية لاستخراج النص
+S-ACM - Smart Academic Content Management System
+
+تُستورد هذه الوحدة في عمليات منفصلة (spawn)، لذا يجب ألا تعتمد
+على Django أو على إعدادات المشروع.
+"""
+
+from typing import List
+
+
+def extract_pdf_range(path: str, start: int, end: int) -> List[str]:
+    """
+    استخراج نصوص صفحات PDF من start إلى end (بدون end).
+
+    Args:
+        path: مسار الملف
+        start: رقم أول صفحة (من الصفر)
+        end: رقم الصفحة التالية لآخر صفحة
+
+    Returns:
+        List[str]: نصوص الصفحات بالترتيب
+    """
+    import pdfplumber
+
+    texts = []
+    with pdfplumber.open(path) as pdf:
+        for index in range(start, min(end, len(pdf.pages))):
+            page = pdf.pages[index]
+            texts.append(page.extract_text() or "")
+            page.close()
+    return texts
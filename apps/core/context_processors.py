@@ -19,27 +19,17 @@ def site_settings(request):
 
 
 def user_notifications(request):
-    # نرجع صفر مؤقتاً لتفادي خطأ قاعدة البيانات
-    return {'unread_count': 0}
-
-'''def user_notifications(request):
     """
-    إضافة عدد الإشعارات غير المقروءة
+    إضافة عدد الإشعارات غير المقروءة (عداد في الكاش، بدون استعلام عادةً)
     """
     if request.user.is_authenticated:
-        from apps.notifications.models import Notification
-        unread_count = Notification.objects.filter(
-            user=request.user,
-            is_read=False
-        ).count()
+        from apps.notifications.models import NotificationManager
         return {
-            'unread_notifications_count': unread_count
+            'unread_notifications_count': NotificationManager.get_unread_count(request.user)
         }
     return {
         'unread_notifications_count': 0
     }
-'''
-
 
 
 def user_role_info(request):
@@ -47,20 +37,21 @@ def user_role_info(request):
     إضافة معلومات دور المستخدم والصلاحيات والقائمة الديناميكية
     """
     if request.user.is_authenticated:
-        role = request.user.role
+        user = request.user
         
         # الحصول على القائمة والصلاحيات من الـ middleware
         menu_items = getattr(request, 'menu_items', [])
         user_permissions = getattr(request, 'user_permissions', set())
         
         return {
-            'user_role': role.display_name if role else None,
-            'user_role_code': role.code if role else None,
-            'is_admin': request.user.is_admin(),
-            'is_instructor': request.user.is_instructor(),
-            'is_student': request.user.is_student(),
+            'user_role': user.get_role_display() if user.role_id else None,
+            'user_role_code': user.role_code,
+            'is_admin': user.is_admin(),
+            'is_instructor': user.is_instructor(),
+            'is_student': user.is_student(),
             # القائمة الديناميكية
             'menu_items': menu_items,
+            'current_menu_item': getattr(request, 'current_menu_item', None),
             'user_permissions': user_permissions,
             # دالة للتحقق من الصلاحية في القوالب
             'has_perm': lambda p: '__all__' in user_permissions or p in user_permissions,
@@ -72,6 +63,7 @@ def user_role_info(request):
         'is_instructor': False,
         'is_student': False,
         'menu_items': [],
+        'current_menu_item': None,
         'user_permissions': set(),
         'has_perm': lambda p: False,
     }
@@ -84,7 +76,7 @@ def current_semester(request):
     from apps.accounts.models import Semester
     
     try:
-        semester = Semester.objects.filter(is_current=True).first()
+        semester = Semester.get_current()
         return {
             'current_semester': semester
         }
@@ -4,11 +4,17 @@ S-ACM - Smart Academic Content Management System
 
 هذا الملف يعرف عناصر القائمة الجانبية (Sidebar) بناءً على الصلاحيات.
 القائمة تتشكل ديناميكياً حسب صلاحيات المستخدم - لا حاجة لتحديد الدور.
+
+القائمة تُترجم مسبقاً (compile) لكل مجموعة صلاحيات مختلفة:
+- روابط reverse() تُحسب مرة واحدة لكل URLconf
+- العناصر المرئية مرتبة ومفلترة ومشتركة بين الطلبات
+- العنصر النشط يُحدد بشجرة بادئات (trie) لمقاطع المسار بدلاً من reverse() لكل عنصر
 """
 
-from dataclasses import dataclass, field
-from typing import List, Optional
-from django.urls import reverse, NoReverseMatch
+import threading
+from dataclasses import dataclass, field, replace
+from typing import Dict, FrozenSet, List, Optional
+from django.urls import get_resolver, get_script_prefix, get_urlconf, reverse, NoReverseMatch
 
 
 @dataclass
@@ -36,6 +42,8 @@ class MenuItem:
     order: int = 0
     badge: str = ''
     badge_class: str = 'bg-primary'
+    # الرابط المحسوب مسبقاً في القائمة المترجمة
+    resolved_url: Optional[str] = field(default=None, compare=False, repr=False)
     
     @property
     def title(self):
@@ -49,6 +57,8 @@ class MenuItem:
     
     def get_url(self) -> str:
         """الحصول على URL العنصر"""
+        if self.resolved_url is not None:
+            return self.resolved_url
         if not self.url_name:
             return '#'
         try:
@@ -280,60 +290,173 @@ MENU_ITEMS = [
 ]
 
 
+# ========== القائمة المترجمة ==========
+
+ALL_PERMISSIONS = '__all__'
+
+# الصلاحيات التي تؤثر على القائمة: بصمة المستخدم تقتصر عليها
+MENU_PERMISSIONS = frozenset(
+    perm
+    for item in MENU_ITEMS
+    for perm in [item.required_perm] + [child.required_perm for child in item.children]
+    if perm
+)
+
+# حد أقصى لعدد القوائم المترجمة (بصمات صلاحيات مختلفة) لكل URLconf
+MAX_COMPILED_MENUS = 256
+
+
+class MenuPathTrie:
+    """
+    شجرة بادئات لمقاطع المسار: أطول رابط عنصر يبدأ به المسار هو العنصر النشط.
+    
+    عند تساوي الروابط يبقى العنصر الأسبق في ترتيب القائمة.
+    """
+    
+    def __init__(self):
+        self._root = {}
+    
+    @staticmethod
+    def _segments(path: str) -> List[str]:
+        return [segment for segment in path.split('/') if segment]
+    
+    def add(self, path: str, code: str) -> None:
+        node = self._root
+        for segment in self._segments(path):
+            node = node.setdefault(segment, {})
+        node.setdefault(None, code)
+    
+    def match(self, path: str) -> Optional[str]:
+        node = self._root
+        best = node.get(None)
+        for segment in self._segments(path):
+            node = node.get(segment)
+            if node is None:
+                break
+            best = node.get(None, best)
+        return best
+
+
+class UserMenu(list):
+    """عناصر القائمة المرئية لمجموعة صلاحيات، مع شجرة تحديد العنصر النشط."""
+    
+    def __init__(self, items: List[MenuItem]):
+        super().__init__(items)
+        self.trie = MenuPathTrie()
+        for item in items:
+            for entry in [item] + list(getattr(item, 'children', [])):
+                url = entry.get_url()
+                if url != '#':
+                    self.trie.add(url, entry.code)
+    
+    def current_item(self, path: str) -> Optional[str]:
+        """كود العنصر النشط للمسار."""
+        return self.trie.match(path)
+
+
+class CompiledMenu:
+    """
+    القائمة بعد حساب الروابط لـ URLconf واحد، وقوائم المستخدمين حسب بصمة الصلاحيات.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._menus: Dict[FrozenSet[str], UserMenu] = {}
+        self.items = [self._resolve(item) for item in sorted(MENU_ITEMS, key=lambda x: x.order)]
+    
+    @classmethod
+    def _resolve(cls, item: MenuItem) -> MenuItem:
+        url = '#'
+        if item.url_name:
+            try:
+                url = reverse(item.url_name)
+            except NoReverseMatch:
+                pass
+        return replace(
+            item,
+            resolved_url=url,
+            children=[cls._resolve(child) for child in sorted(item.children, key=lambda x: x.order)]
+        )
+    
+    def menu_for(self, fingerprint: FrozenSet[str]) -> UserMenu:
+        menu = self._menus.get(fingerprint)
+        if menu is None:
+            menu = UserMenu(self._build(fingerprint))
+            with self._lock:
+                if len(self._menus) >= MAX_COMPILED_MENUS:
+                    self._menus.clear()
+                self._menus[fingerprint] = menu
+        return menu
+    
+    def _build(self, fingerprint: FrozenSet[str]) -> List[MenuItem]:
+        if ALL_PERMISSIONS in fingerprint:
+            return list(self.items)
+        
+        visible_items = []
+        for item in self.items:
+            # تحقق من الصلاحية
+            if item.required_perm is not None and item.required_perm not in fingerprint:
+                continue
+            
+            # نسخ العنصر مع الأطفال المرئيين فقط
+            if item.has_children():
+                visible_children = item.get_visible_children(fingerprint)
+                # تخطي إذا لم يكن هناك أطفال مرئيين
+                if not visible_children:
+                    continue
+                item = replace(item, children=visible_children)
+            visible_items.append(item)
+        return visible_items
+
+
+_compiled: Dict[tuple, CompiledMenu] = {}
+
+
+def get_compiled_menu() -> CompiledMenu:
+    """
+    القائمة المترجمة للـ URLconf الحالي.
+    
+    المفتاح هو كائن الـ resolver (يتغير عند clear_url_caches أو تبديل
+    ROOT_URLCONF) مع بادئة السكربت، فتُعاد الترجمة عند تحميل URLconf جديد.
+    """
+    key = (id(get_resolver(get_urlconf())), get_script_prefix())
+    compiled = _compiled.get(key)
+    if compiled is None:
+        compiled = CompiledMenu()
+        _compiled.clear()
+        _compiled[key] = compiled
+    return compiled
+
+
+def menu_fingerprint(user_permissions) -> FrozenSet[str]:
+    """بصمة الصلاحيات: الصلاحيات التي تظهر في القائمة فقط."""
+    if ALL_PERMISSIONS in user_permissions:
+        return frozenset([ALL_PERMISSIONS])
+    return MENU_PERMISSIONS.intersection(user_permissions)
+
+
 def get_menu_for_user(user) -> List[MenuItem]:
     """
     الحصول على القائمة المخصصة للمستخدم بناءً على صلاحياته
     
+    العناصر مشتركة بين المستخدمين بنفس البصمة: لا تُعدل.
+    
     Args:
         user: كائن المستخدم
         
     Returns:
-        قائمة عناصر القائمة المرئية للمستخدم
+        UserMenu: قائمة عناصر القائمة المرئية للمستخدم
     """
     if not user.is_authenticated:
-        return []
+        return UserMenu([])
     
     # الأدمن يرى كل شيء
     if user.is_superuser or user.is_admin():
-        user_permissions = {'__all__'}
+        user_permissions = {ALL_PERMISSIONS}
     else:
         user_permissions = user.get_permissions()
     
-    visible_items = []
-    
-    for item in sorted(MENU_ITEMS, key=lambda x: x.order):
-        # تحقق من الصلاحية
-        if item.required_perm is not None:
-            if '__all__' not in user_permissions and item.required_perm not in user_permissions:
-                continue
-        
-        # نسخ العنصر مع الأطفال المرئيين فقط
-        if item.has_children():
-            visible_children = item.get_visible_children(
-                user_permissions if '__all__' not in user_permissions else {'__all__'}
-            )
-            
-            # تخطي إذا لم يكن هناك أطفال مرئيين
-            if not visible_children and '__all__' not in user_permissions:
-                continue
-            
-            # إنشاء نسخة مع الأطفال المرئيين
-            new_item = MenuItem(
-                code=item.code,
-                icon=item.icon,
-                label=item.label,
-                url_name=item.url_name,
-                required_perm=item.required_perm,
-                children=visible_children if '__all__' not in user_permissions else item.children,
-                order=item.order,
-                badge=item.badge,
-                badge_class=item.badge_class,
-            )
-            visible_items.append(new_item)
-        else:
-            visible_items.append(item)
-    
-    return visible_items
+    return get_compiled_menu().menu_for(menu_fingerprint(user_permissions))
 
 
 def get_current_menu_item(request, menu_items: List[MenuItem]) -> Optional[str]:
@@ -343,22 +466,6 @@ def get_current_menu_item(request, menu_items: List[MenuItem]) -> Optional[str]:
     Returns:
         كود العنصر الحالي أو None
     """
-    current_path = request.path
-    
-    for item in menu_items:
-        if item.url_name:
-            try:
-                if current_path.startswith(reverse(item.url_name)):
-                    return item.code
-            except NoReverseMatch:
-                pass
-        
-        for child in item.children:
-            if child.url_name:
-                try:
-                    if current_path.startswith(reverse(child.url_name)):
-                        return child.code
-                except NoReverseMatch:
-                    pass
-    
-    return None
+    if not isinstance(menu_items, UserMenu):
+        menu_items = UserMenu(list(menu_items))
+    return menu_items.current_item(request.path)
@@ -10,11 +10,10 @@ S-ACM - Smart Academic Content Management System
 
 import time
 import logging
-from collections import defaultdict
-from threading import Lock
 from django.http import HttpResponse, JsonResponse
 from django.conf import settings
-from django.core.cache import cache
+
+from .ratelimit import RateLimiter
 
 logger = logging.getLogger('security')
 
@@ -50,7 +49,6 @@ class RateLimitMiddleware:
     
     def __init__(self, get_response):
         self.get_response = get_response
-        self._lock = Lock()
         
         # التحقق من تفعيل Rate Limiting
         self.enabled = getattr(settings, 'RATE_LIMIT_ENABLED', True)
@@ -92,34 +90,13 @@ class RateLimitMiddleware:
     
     def _check_rate_limit(self, client_ip: str, path: str, limits: dict) -> bool:
         """
-        التحقق من Rate Limit باستخدام Cache
+        التحقق من Rate Limit (عداد ذري في الكاش، انظر core.ratelimit)
         
         Returns:
             bool: True إذا كان الطلب مسموحاً
         """
-        cache_key = f"rate_limit:{client_ip}:{path}"
-        
-        with self._lock:
-            # الحصول على البيانات من الكاش
-            data = cache.get(cache_key, {'count': 0, 'start_time': time.time()})
-            
-            current_time = time.time()
-            
-            # إعادة تعيين إذا انتهت الفترة
-            if current_time - data['start_time'] > limits['window']:
-                data = {'count': 1, 'start_time': current_time}
-                cache.set(cache_key, data, limits['window'])
-                return True
-            
-            # زيادة العداد
-            data['count'] += 1
-            
-            # التحقق من تجاوز الحد
-            if data['count'] > limits['requests']:
-                return False
-            
-            cache.set(cache_key, data, limits['window'])
-            return True
+        limiter = RateLimiter('ip', limits['requests'], limits['window'])
+        return limiter.hit(f"{client_ip}:{path}").allowed
     
     def _rate_limit_response(self, request):
         """إنشاء استجابة Rate Limit"""
@@ -355,6 +332,12 @@ def get_user_menu(request):
     return request._cached_menu
 
 
+def get_current_menu_code(request):
+    """كود عنصر القائمة النشط للمسار الحالي (lazy loading)"""
+    from .menu import get_current_menu_item
+    return get_current_menu_item(request, get_user_menu(request))
+
+
 class PermissionMiddleware:
     """
     Middleware لتحميل الصلاحيات والقائمة تلقائياً
@@ -362,6 +345,7 @@ class PermissionMiddleware:
     يضيف للـ request:
         - request.user_permissions: مجموعة صلاحيات المستخدم
         - request.menu_items: قائمة العناصر المرئية للمستخدم
+        - request.current_menu_item: كود العنصر النشط في القائمة
     """
     
     def __init__(self, get_response):
@@ -371,6 +355,7 @@ class PermissionMiddleware:
         # استخدام SimpleLazyObject لتحميل البيانات عند الحاجة فقط
         request.user_permissions = SimpleLazyObject(lambda: get_user_permissions(request))
         request.menu_items = SimpleLazyObject(lambda: get_user_menu(request))
+        request.current_menu_item = SimpleLazyObject(lambda: get_current_menu_code(request))
         
         return self.get_response(request)
 
@@ -0,0 +1,100 @@
+"""
+محدد معدل الطلبات (Rate Limiter) المشترك
+S-ACM - Smart Academic Content Management System
+
+نافذة منزلقة تقريبية (Sliding Window Counter) فوق الكاش:
+عدادان لكل هوية (النافذة الحالية والسابقة) مع زيادة ذرية (cache.incr)،
+فكل فحص يكلف عمليات كاش ثابتة العدد بدلاً من استعلام COUNT.
+
+يستخدمه:
+- AIRateLimitMixin وعروض HTMX (حد طلبات الذكاء الاصطناعي لكل مستخدم)
+- RateLimitMiddleware (حد الطلبات لكل IP)
+"""
+
+import math
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+@dataclass
+class RateLimitResult:
+    """نتيجة فحص الحد."""
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: int = 0
+
+
+class RateLimiter:
+    """
+    محدد معدل بنافذة منزلقة تقريبية.
+
+    التقدير = عداد النافذة الحالية + عداد النافذة السابقة × الجزء المتبقي منها.
+
+    Example:
+        limiter = RateLimiter('ai', limit=10, window=3600)
+        if not limiter.hit(user.pk).allowed:
+            ...
+    """
+
+    def __init__(self, scope: str, limit: int, window: int):
+        self.scope = scope
+        self.limit = limit
+        self.window = window
+
+    def _keys(self, identity, now: float):
+        index = int(now // self.window)
+        base = f"ratelimit:{self.scope}:{identity}"
+        elapsed = (now % self.window) / self.window
+        return f"{base}:{index}", f"{base}:{index - 1}", elapsed
+
+    def _result(self, allowed: bool, estimate: float, now: float) -> RateLimitResult:
+        remaining = max(0, math.floor(self.limit - estimate))
+        retry_after = 0 if allowed else int(self.window - now % self.window) + 1
+        return RateLimitResult(allowed, self.limit, remaining, retry_after)
+
+    def hit(self, identity, cost: int = 1) -> RateLimitResult:
+        """
+        تسجيل طلب والتحقق من الحد (الطلب المرفوض لا يُحسب).
+        """
+        now = time.time()
+        current_key, previous_key, elapsed = self._keys(identity, now)
+
+        # النافذة تبقى حية لنافذتين لأنها تدخل في تقدير النافذة التالية
+        cache.add(current_key, 0, self.window * 2)
+        try:
+            current = cache.incr(current_key, cost)
+        except ValueError:
+            # انتهت صلاحية المفتاح بين add و incr
+            cache.set(current_key, cost, self.window * 2)
+            current = cost
+
+        estimate = current + cache.get(previous_key, 0) * (1 - elapsed)
+        if estimate > self.limit:
+            try:
+                cache.decr(current_key, cost)
+            except ValueError:
+                pass
+            return self._result(False, estimate - cost, now)
+        return self._result(True, estimate, now)
+
+    def peek(self, identity) -> RateLimitResult:
+        """الحالة الحالية بدون تسجيل طلب."""
+        now = time.time()
+        current_key, previous_key, elapsed = self._keys(identity, now)
+        counts = cache.get_many([current_key, previous_key])
+        estimate = counts.get(current_key, 0) + counts.get(previous_key, 0) * (1 - elapsed)
+        return self._result(estimate < self.limit, estimate, now)
+
+    def reset(self, identity) -> None:
+        """مسح عدادات الهوية."""
+        current_key, previous_key, _ = self._keys(identity, time.time())
+        cache.delete_many([current_key, previous_key])
+
+
+def ai_rate_limiter() -> RateLimiter:
+    """حد طلبات الذكاء الاصطناعي لكل مستخدم (AI_RATE_LIMIT_PER_HOUR)."""
+    return RateLimiter('ai', getattr(settings, 'AI_RATE_LIMIT_PER_HOUR', 10), 3600)
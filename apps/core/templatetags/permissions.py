@@ -15,7 +15,6 @@ Usage in templates:
 """
 
 from django import template
-from django.urls import reverse, NoReverseMatch
 
 register = template.Library()
 
@@ -67,27 +66,9 @@ def render_sidebar(context):
     request = context.get('request')
     menu_items = context.get('menu_items', [])
     
-    # تحديد العنصر الحالي
-    current_path = request.path if request else ''
-    current_item = None
-    
-    for item in menu_items:
-        if item.url_name:
-            try:
-                if current_path.startswith(reverse(item.url_name)):
-                    current_item = item.code
-                    break
-            except NoReverseMatch:
-                pass
-        
-        for child in getattr(item, 'children', []):
-            if child.url_name:
-                try:
-                    if current_path.startswith(reverse(child.url_name)):
-                        current_item = child.code
-                        break
-                except NoReverseMatch:
-                    pass
+    # تحديد العنصر الحالي (شجرة البادئات المحسوبة مع القائمة)
+    from apps.core.menu import get_current_menu_item
+    current_item = get_current_menu_item(request, menu_items) if request else None
     
     return {
         'menu_items': menu_items,
@@ -104,12 +85,7 @@ def menu_item_url(item):
     Usage:
         {% menu_item_url item as url %}
     """
-    if not item.url_name:
-        return '#'
-    try:
-        return reverse(item.url_name)
-    except NoReverseMatch:
-        return '#'
+    return item.get_url()
 
 
 @register.simple_tag(takes_context=True)
@@ -1,3 +1,177 @@
-from django.test import TestCase
+"""
+اختبارات تطبيق core
+S-ACM - Smart Academic Content Management System
+"""
 
-# Create your tests here.
+from unittest.mock import patch
+
+from datetime import date
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from apps.accounts.models import Level, Major, Permission, Role, RolePermission, Semester, User
+from apps.accounts.permissions import VERSION_KEY, get_role_permissions
+from .menu import get_compiled_menu, menu_fingerprint
+from .ratelimit import RateLimiter
+
+
+class RateLimiterTest(TestCase):
+    """اختبارات محدد معدل الطلبات"""
+
+    def setUp(self):
+        cache.clear()
+        self.limiter = RateLimiter('test', limit=3, window=60)
+
+    def test_denies_after_limit_without_counting_denied_requests(self):
+        """الطلب الزائد يُرفض ولا يُضاف إلى العداد"""
+        results = [self.limiter.hit('user-1') for _ in range(5)]
+
+        self.assertEqual([r.allowed for r in results], [True, True, True, False, False])
+        self.assertGreater(results[-1].retry_after, 0)
+        self.assertEqual(self.limiter.peek('user-1').remaining, 0)
+        self.assertTrue(self.limiter.hit('user-2').allowed)
+
+    def test_previous_window_is_weighted_by_overlap(self):
+        """نصف النافذة السابقة ما زال داخل النافذة المنزلقة"""
+        with patch('apps.core.ratelimit.time.time', return_value=1000 * 60 + 30):
+            for _ in range(3):
+                self.limiter.hit('user-1')
+        with patch('apps.core.ratelimit.time.time', return_value=1001 * 60 + 30):
+            self.assertEqual(self.limiter.peek('user-1').remaining, 1)
+            self.assertTrue(self.limiter.hit('user-1').allowed)
+            self.assertFalse(self.limiter.hit('user-1').allowed)
+
+    def test_peek_does_not_consume(self):
+        """peek لا يسجل طلباً"""
+        self.limiter.peek('user-1')
+        self.assertEqual(self.limiter.peek('user-1').remaining, 3)
+        self.limiter.reset('user-1')
+        self.assertEqual(self.limiter.peek('user-1').remaining, 3)
+
+
+class PermissionSnapshotTest(TestCase):
+    """اختبارات لقطات صلاحيات الأدوار المشتركة"""
+
+    def setUp(self):
+        cache.clear()
+        self.role = Role.objects.create(code='reviewer', display_name='مراجع')
+        self.view = Permission.objects.create(code='view_courses', display_name='عرض المقررات')
+        self.manage = Permission.objects.create(code='manage_files', display_name='إدارة الملفات')
+        RolePermission.objects.create(role=self.role, permission=self.view)
+        self.user = User.objects.create_user(
+            academic_id='30000001', password='pass12345', id_card_number='3000000001',
+            full_name='مراجع', account_status='active', role=self.role
+        )
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_snapshot_is_shared_without_queries(self):
+        self.assertEqual(self.fresh_user().get_permissions(), {'view_courses'})
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            permissions = user.get_permissions()
+        self.assertIn('view_courses', permissions)
+        self.assertNotIn('manage_files', permissions)
+
+    def test_changes_bump_version(self):
+        get_role_permissions(self.role.pk)
+        RolePermission.objects.create(role=self.role, permission=self.manage)
+        self.assertEqual(self.fresh_user().get_permissions(), {'view_courses', 'manage_files'})
+
+        self.view.is_active = False
+        self.view.save()
+        self.assertEqual(self.fresh_user().get_permissions(), {'manage_files'})
+
+    def test_version_bumped_by_another_process_rebuilds_snapshot(self):
+        get_role_permissions(self.role.pk)
+        # update() لا يرسل إشارات؛ الإصدار يُرفع مباشرة في الكاش المشترك كما تفعل عملية أخرى
+        Permission.objects.filter(pk=self.view.pk).update(is_active=False)
+        self.assertEqual(get_role_permissions(self.role.pk), {'view_courses'})
+        cache.incr(VERSION_KEY)
+        self.assertEqual(get_role_permissions(self.role.pk), frozenset())
+
+    @override_settings(PERMISSIONS_CACHE_TIMEOUT=0)
+    def test_snapshot_expires_without_shared_invalidation(self):
+        """بدون كاش مشترك لا يصل رفع الإصدار، لكن اللقطة تنتهي وتُبنى من جديد"""
+        get_role_permissions(self.role.pk)
+        Permission.objects.filter(pk=self.view.pk).update(is_active=False)
+        self.assertEqual(get_role_permissions(self.role.pk), frozenset())
+
+
+class CompiledMenuTest(TestCase):
+    """اختبارات القائمة المترجمة مسبقاً"""
+
+    def test_menu_is_shared_per_fingerprint_without_reverse(self):
+        compiled = get_compiled_menu()
+        menu = compiled.menu_for(menu_fingerprint({'view_courses', 'unrelated'}))
+        with patch('apps.core.menu.reverse') as reverse:
+            again = get_compiled_menu().menu_for(menu_fingerprint({'view_courses'}))
+            urls = [item.get_url() for item in again]
+        reverse.assert_not_called()
+        self.assertIs(menu, again)
+        self.assertEqual([item.code for item in menu], ['dashboard', 'courses', 'notifications'])
+        self.assertIn('/courses/', urls)
+
+    def test_current_item_uses_longest_prefix(self):
+        menu = get_compiled_menu().menu_for(menu_fingerprint({'__all__'}))
+        self.assertEqual(menu.current_item('/courses/create/'), 'courses_add')
+        self.assertEqual(menu.current_item('/courses/5/'), 'courses')
+        self.assertEqual(menu.current_item('/accounts/admin/users/create/'), 'users_add')
+        self.assertIsNone(menu.current_item('/unknown/'))
+
+
+class PageQueryCountTest(TestCase):
+    """
+    عدد الاستعلامات لكل صفحة رئيسية بعد تسخين الكاش.
+    
+    الدور والصلاحيات والقائمة والفصل الحالي لا تُقرأ من قاعدة البيانات.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.semester = Semester.objects.create(
+            name='الفصل الأول', academic_year='2025/2026', semester_number=1,
+            start_date=date(2025, 9, 1), end_date=date(2026, 1, 15), is_current=True
+        )
+        self.student = User.objects.create_user(
+            academic_id='40000001', password='pass12345', id_card_number='4000000001',
+            full_name='طالب', account_status='active',
+            role=Role.objects.create(code=Role.STUDENT, display_name='طالب'),
+            level=Level.objects.create(level_name='المستوى الأول', level_number=1),
+            major=Major.objects.create(major_name='علوم الحاسب')
+        )
+        self.client.force_login(self.student)
+
+    def assertPageQueries(self, url, expected):
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        tables = [q['sql'] for q in queries if 'FROM "roles"' in q['sql'] or 'FROM "semesters"' in q['sql']]
+        self.assertEqual(tables, [], url)
+        self.assertEqual(len(queries), expected, f"{url}: {[q['sql'] for q in queries]}")
+
+    def test_main_pages_query_counts(self):
+        self.assertPageQueries('/dashboard/', 12)
+        self.assertPageQueries('/notifications/', 3)
+        self.assertPageQueries('/profile/', 4)
+        self.assertPageQueries('/ai/usage/', 8)
+
+    def test_current_semester_cache_follows_saves(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(Semester.get_current(), self.semester)
+            self.assertEqual(Semester.get_current(), self.semester)
+        self.semester.is_current = False
+        self.semester.save()
+        self.assertIsNone(Semester.get_current())
+
+    @override_settings(SEMESTER_CACHE_TIMEOUT=0)
+    def test_current_semester_cache_expires(self):
+        """تعديل من عملية أخرى (بدون إشارة هنا) يظهر بعد انتهاء مدة الكاش"""
+        Semester.get_current()
+        Semester.objects.filter(pk=self.semester.pk).update(is_current=False)
+        self.assertIsNone(Semester.get_current())
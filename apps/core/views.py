@@ -338,8 +338,8 @@ class UnifiedDashboardView(LoginRequiredMixin, TemplateView):
     def _get_current_semester(self):
         """الحصول على الفصل الدراسي الحالي"""
         try:
-            from apps.courses.models import Semester
-            return Semester.objects.filter(is_current=True).first()
+            from apps.accounts.models import Semester
+            return Semester.get_current()
         except:
             return None
     
@@ -476,14 +476,14 @@ class ProfileView(LoginRequiredMixin, TemplateView):
         
         # الفصل الحالي
         try:
-            from apps.courses.models import Semester
-            context['current_semester'] = Semester.objects.filter(is_current=True).first()
+            from apps.accounts.models import Semester
+            context['current_semester'] = Semester.get_current()
         except:
             pass
         
         # اسم الدور
-        if hasattr(user, 'role') and user.role:
-            context['user_role'] = user.role.role_name
+        if user.role_id:
+            context['user_role'] = user.get_role_display()
         elif hasattr(user, 'is_admin') and user.is_admin():
             context['user_role'] = 'مسؤول'
         elif hasattr(user, 'is_instructor') and user.is_instructor():
@@ -0,0 +1,229 @@
+"""
+عدادات التحميل والمشاهدة المؤجلة
+S-ACM - Smart Academic Content Management System
+
+بدلاً من تحديث صف الملف وإضافة سجل نشاط مع كل نقرة، تُجمع الأحداث
+في ذاكرة العملية وتُكتب دفعة واحدة:
+- تحديث واحد لكل ملف بتعبير F (لا يفقد الزيادات المتزامنة)
+- bulk_create واحد لسجلات UserActivity
+
+العدادات والسجلات تُكتب في معاملتين منفصلتين: سجل نشاط تالف (مستخدم أو
+ملف حُذف قبل الكتابة) لا يوقف العدادات، وعند فشل الإدراج الجماعي تُكتب
+السجلات واحداً واحداً ويُتجاهل السجل الذي لا يمكن كتابته.
+
+الكتابة تتم كل FILE_COUNTER_FLUSH_INTERVAL ثانية أو عند بلوغ
+FILE_COUNTER_BATCH_SIZE حدثاً، وعند إيقاف العملية (atexit).
+FILE_COUNTER_FLUSH_INTERVAL = 0 يعيد الكتابة الفورية.
+
+Example:
+    record_file_activity(file_obj, request.user, 'download', ip_address=ip)
+"""
+
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger('courses')
+
+COUNTER_FIELDS = {
+    'download': 'download_count',
+    'view': 'view_count',
+}
+ACTIVITY_DESCRIPTIONS = {
+    'download': 'تحميل ملف: {title}',
+    'view': 'عرض ملف: {title}',
+}
+
+
+class FileActivityBuffer:
+    """
+    مخزن مؤقت لأحداث الملفات في ذاكرة العملية.
+
+    Args:
+        flush_interval: الفترة بين عمليات الكتابة (ثوانٍ)
+        batch_size: عدد الأحداث الذي يفرض الكتابة فوراً
+    """
+
+    def __init__(self, flush_interval: float = 5.0, batch_size: int = 500):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        # الحد الأقصى للأحداث المعلقة عند تعذر الكتابة (قاعدة البيانات متوقفة)
+        self.max_pending = batch_size * 20
+        self._counts: Dict[int, Counter] = defaultdict(Counter)
+        self._activities: List[dict] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, file_id: int, event: str, activity: dict) -> None:
+        with self._lock:
+            self._counts[file_id][COUNTER_FIELDS[event]] += 1
+            self._activities.append(activity)
+            pending = len(self._activities)
+        if pending >= self.batch_size:
+            self.flush()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._activities)
+
+    def flush(self) -> int:
+        """كتابة الأحداث المعلقة. يُرجع عدد سجلات النشاط المكتوبة."""
+        from .models import LectureFile
+
+        with self._flush_lock:
+            with self._lock:
+                counts, self._counts = self._counts, defaultdict(Counter)
+                activities, self._activities = self._activities, []
+            if not activities and not counts:
+                return 0
+
+            try:
+                with transaction.atomic():
+                    for file_id, fields in counts.items():
+                        LectureFile.objects.filter(pk=file_id).update(
+                            **{name: F(name) + count for name, count in fields.items()}
+                        )
+            except Exception as e:
+                logger.error(f"Failed to flush counters for {len(counts)} files: {e}")
+                self._restore(counts, [])
+            written = self._write_activities(activities)
+
+        logger.debug(f"Flushed {written} file activities for {len(counts)} files")
+        return written
+
+    def _write_activities(self, activities: List[dict]) -> int:
+        from apps.accounts.models import UserActivity
+
+        if not activities:
+            return 0
+        try:
+            with transaction.atomic():
+                UserActivity.objects.bulk_create(
+                    [UserActivity(**activity) for activity in activities],
+                    batch_size=self.batch_size
+                )
+            return len(activities)
+        except (IntegrityError, DataError) as e:
+            logger.warning(f"Bulk insert of {len(activities)} file activities failed, inserting one by one: {e}")
+        except Exception as e:
+            logger.error(f"Failed to flush {len(activities)} file activities: {e}")
+            self._restore({}, activities)
+            return 0
+
+        written = index = 0
+        try:
+            activities = self._drop_orphans(activities)
+            for index, activity in enumerate(activities):
+                try:
+                    with transaction.atomic():
+                        UserActivity.objects.create(**activity)
+                    written += 1
+                except (IntegrityError, DataError) as e:
+                    logger.warning(f"Dropped invalid file activity row {activity}: {e}")
+        except Exception as e:
+            logger.error(f"Failed to flush {len(activities) - index} file activities: {e}")
+            self._restore({}, activities[index:])
+        return written
+
+    def _drop_orphans(self, activities: List[dict]) -> List[dict]:
+        """حذف السجلات التي حُذف مستخدمها أو ملفها قبل الكتابة."""
+        from apps.accounts.models import User
+        from .models import LectureFile
+
+        users = set(User.objects.filter(
+            pk__in={a['user_id'] for a in activities}
+        ).values_list('pk', flat=True))
+        files = set(LectureFile.objects.filter(
+            pk__in={a['file_id'] for a in activities if a.get('file_id')}
+        ).values_list('pk', flat=True))
+        kept = [
+            a for a in activities
+            if a['user_id'] in users and (not a.get('file_id') or a['file_id'] in files)
+        ]
+        if len(kept) < len(activities):
+            logger.warning(f"Dropped {len(activities) - len(kept)} file activities for deleted users or files")
+        return kept
+
+    def _restore(self, counts: Dict[int, Counter], activities: List[dict]) -> None:
+        """إعادة الأحداث إلى المخزن لمحاولة لاحقة (مع حد أقصى للذاكرة)."""
+        with self._lock:
+            for file_id, fields in counts.items():
+                self._counts[file_id].update(fields)
+            self._activities[:0] = activities
+            dropped = len(self._activities) - self.max_pending
+            if dropped > 0:
+                del self._activities[:dropped]
+                logger.warning(f"Dropped {dropped} buffered file activity rows")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            finally:
+                connections.close_all()
+
+    def start(self) -> None:
+        """تشغيل خيط الكتابة الدورية."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='file-activity-flush', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """إيقاف الخيط وكتابة ما تبقى (يُستدعى عند إيقاف العملية)."""
+        self._stop.set()
+        self.flush()
+
+
+_buffer: Optional[FileActivityBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_activity_buffer() -> FileActivityBuffer:
+    """المخزن المشترك على مستوى العملية (يبدأ خيط الكتابة عند أول استخدام)."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = FileActivityBuffer(
+                flush_interval=getattr(settings, 'FILE_COUNTER_FLUSH_INTERVAL', 5),
+                batch_size=getattr(settings, 'FILE_COUNTER_BATCH_SIZE', 500),
+            )
+            _buffer.start()
+            atexit.register(_buffer.stop)
+        return _buffer
+
+
+def record_file_activity(file_obj, user, event: str, ip_address: str = None) -> None:
+    """
+    تسجيل تحميل أو مشاهدة ملف (العداد وسجل النشاط).
+
+    Args:
+        event: 'download' أو 'view'
+    """
+    activity = {
+        'user_id': user.pk,
+        'activity_type': event,
+        'description': ACTIVITY_DESCRIPTIONS[event].format(title=file_obj.title),
+        'file_id': file_obj.id,
+        'ip_address': ip_address,
+        'activity_time': timezone.now(),
+    }
+
+    if getattr(settings, 'FILE_COUNTER_FLUSH_INTERVAL', 5) <= 0:
+        from apps.accounts.models import UserActivity
+        from .models import LectureFile
+
+        field = COUNTER_FIELDS[event]
+        LectureFile.objects.filter(pk=file_obj.pk).update(**{field: F(field) + 1})
+        UserActivity.objects.create(**activity)
+        return
+
+    get_activity_buffer().add(file_obj.pk, event, activity)
@@ -0,0 +1,266 @@
+"""
+تقديم ملفات المحاضرات عبر HTTP
+S-ACM - Smart Academic Content Management System
+
+يدعم ما يحتاجه المتصفح لعارض PDF ومشغل الفيديو:
+- طلبات الأجزاء Range (استجابة 206) للتقديم والترجيع دون إعادة التحميل
+- الطلبات الشرطية If-None-Match / If-Modified-Since (استجابة 304)
+- ETag قوي من بصمة المحتوى (LectureFile.content_hash)
+
+التحقق من الصلاحيات يبقى في العرض (SecureFileDownloadMixin) قبل استدعاء deliver_file.
+
+نقل البايتات نفسها يختاره FILE_DELIVERY_BACKEND:
+- django: Django يقدم الملف (الافتراضي، للتطوير)
+- nginx: ترويسة X-Accel-Redirect وnginx ينقل الملف من موقع داخلي:
+      location /protected/ {
+          internal;
+          alias /path/to/media/;
+      }
+- apache: ترويسة X-Sendfile (mod_xsendfile مع XSendFilePath لمجلد media)
+- أو مسار كامل لصنف بنفس الواجهة (module.path.Backend)
+
+Example:
+    file_obj = self.get_secure_file(pk)
+    return deliver_file(request, file_obj, as_attachment=True)
+"""
+
+import mimetypes
+import os
+import re
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+from django.utils.module_loading import import_string
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    """نطاق خارج حجم الملف (استجابة 416)."""
+    pass
+
+
+def file_etag(file_obj) -> Optional[str]:
+    """ETag قوي من بصمة المحتوى (None إذا تعذر حسابها)."""
+    content_hash = file_obj.get_content_hash()
+    return quote_etag(content_hash) if content_hash else None
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    تحليل ترويسة Range لنطاق واحد.
+
+    Returns:
+        (البداية، النهاية) شاملة، أو None لتقديم الملف كاملاً
+        (ترويسة غير صالحة أو عدة نطاقات)
+
+    Raises:
+        RangeNotSatisfiable: إذا كان النطاق خارج الملف
+    """
+    match = _RANGE_RE.match(header.replace(' ', ''))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N: آخر N بايت
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def _if_range_matches(request, etag: Optional[str], last_modified: int) -> bool:
+    """If-Range: النطاق يُطبق فقط إذا لم يتغير الملف منذ أن حصل عليه المتصفح."""
+    if_range = request.META.get('HTTP_IF_RANGE', '').strip()
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return etag is not None and if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and last_modified <= since
+
+
+def _iter_range(path: str, start: int, length: int):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def serve_file(request, file_obj, as_attachment: bool = False) -> HttpResponse:
+    """
+    استجابة تقدم الملف المحلي مع دعم Range والطلبات الشرطية.
+
+    Args:
+        file_obj: ملف محاضرة بعد التحقق من صلاحية الوصول إليه
+        as_attachment: تحميل (attachment) أو عرض داخل الصفحة (inline)
+
+    Raises:
+        Http404: إذا لم يكن الملف موجوداً على القرص
+    """
+    path = file_obj.local_file.path
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404('الملف غير موجود.')
+    size = stat.st_size
+    last_modified = int(stat.st_mtime)
+    etag = file_etag(file_obj)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return _with_validators(not_modified, etag, last_modified)
+
+    content_type, _ = mimetypes.guess_type(path)
+    content_type = content_type or 'application/octet-stream'
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            response['Accept-Ranges'] = 'bytes'
+            return response
+
+    if byte_range is None:
+        response = FileResponse(
+            open(path, 'rb'),
+            content_type=content_type,
+            as_attachment=as_attachment,
+            filename=Path(path).name
+        )
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _iter_range(path, start, end - start + 1), status=206, content_type=content_type
+        )
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Disposition'] = content_disposition_header(as_attachment, Path(path).name)
+
+    response['Accept-Ranges'] = 'bytes'
+    return _with_validators(response, etag, last_modified)
+
+
+def _with_validators(response, etag: Optional[str], last_modified: int):
+    response['Last-Modified'] = http_date(last_modified)
+    if etag:
+        response['ETag'] = etag
+    # الملفات محمية بالصلاحيات: لا تُخزن في الذاكرات المشتركة، ويُعاد التحقق كل مرة
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# ========== Delivery Backends ==========
+
+class DjangoFileDelivery:
+    """تقديم الملف من عملية Django (serve_file)."""
+
+    def deliver(self, request, file_obj, as_attachment: bool = False) -> HttpResponse:
+        return serve_file(request, file_obj, as_attachment)
+
+
+class InternalRedirectDelivery:
+    """
+    تسليم نقل الملف لخادم الويب الأمامي بترويسة إعادة توجيه داخلية.
+
+    Django يتحقق من الصلاحية ويُرجع استجابة فارغة؛ خادم الويب يرسل الملف
+    ويتولى Range والطلبات الشرطية بنفسه. الطلب الشرطي الذي تطابق بصمته
+    يُجاب هنا بـ 304 دون المرور بخادم الويب.
+    """
+
+    header = ''
+
+    def header_value(self, file_obj) -> str:
+        raise NotImplementedError
+
+    def deliver(self, request, file_obj, as_attachment: bool = False) -> HttpResponse:
+        path = file_obj.local_file.path
+        try:
+            last_modified = int(os.stat(path).st_mtime)
+        except FileNotFoundError:
+            raise Http404('الملف غير موجود.')
+        etag = file_etag(file_obj)
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return _with_validators(not_modified, etag, last_modified)
+
+        content_type, _ = mimetypes.guess_type(path)
+        response = HttpResponse(content_type=content_type or 'application/octet-stream')
+        response[self.header] = self.header_value(file_obj)
+        response['Content-Disposition'] = content_disposition_header(as_attachment, Path(path).name)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class NginxAccelDelivery(InternalRedirectDelivery):
+    """nginx: X-Accel-Redirect إلى موقع internal يشير إلى MEDIA_ROOT."""
+
+    header = 'X-Accel-Redirect'
+
+    def header_value(self, file_obj) -> str:
+        prefix = getattr(settings, 'FILE_DELIVERY_INTERNAL_PREFIX', '/protected/')
+        return prefix.rstrip('/') + '/' + quote(file_obj.local_file.name.replace(os.sep, '/'))
+
+
+class ApacheSendfileDelivery(InternalRedirectDelivery):
+    """Apache: X-Sendfile بالمسار الكامل على القرص (mod_xsendfile)."""
+
+    header = 'X-Sendfile'
+
+    def header_value(self, file_obj) -> str:
+        return file_obj.local_file.path
+
+
+FILE_DELIVERY_BACKENDS = {
+    'django': DjangoFileDelivery,
+    'nginx': NginxAccelDelivery,
+    'apache': ApacheSendfileDelivery,
+}
+
+
+def get_file_delivery():
+    """واجهة التسليم حسب FILE_DELIVERY_BACKEND."""
+    backend = getattr(settings, 'FILE_DELIVERY_BACKEND', 'django')
+    backend_class = FILE_DELIVERY_BACKENDS.get(backend) or import_string(backend)
+    return backend_class()
+
+
+def deliver_file(request, file_obj, as_attachment: bool = False) -> HttpResponse:
+    """تقديم ملف بعد التحقق من الصلاحية عبر الواجهة المضبوطة."""
+    return get_file_delivery().deliver(request, file_obj, as_attachment)
+
+
+def is_initial_request(request, response) -> bool:
+    """
+    هل الطلب بداية تحميل جديد (وليس تقديماً داخل الملف أو 304)؟
+
+    يعتمد على ترويسة Range في الطلب لا على الاستجابة، لأن الاستجابة
+    مع X-Accel-Redirect تكون 200 دائماً من جهة Django.
+    تُستخدم لعدم احتساب كل طلب جزئي من المشغل تحميلاً جديداً.
+    """
+    if response.status_code not in (200, 206):
+        return False
+    range_header = request.META.get('HTTP_RANGE', '').replace(' ', '')
+    return not range_header or range_header.startswith('bytes=0-')
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-17 11:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lecturefile',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 لمحتوى الملف المحلي - تُلغى عند استبدال الملف', max_length=64, null=True, verbose_name='بصمة المحتوى'),
+        ),
+    ]
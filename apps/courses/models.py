@@ -7,6 +7,7 @@ from django.db import models
 from django.conf import settings
 from django.core.validators import FileExtensionValidator
 from pathlib import Path
+import hashlib
 import os
 
 
@@ -278,6 +279,14 @@ class LectureFile(models.Model):
         default=0,
         verbose_name='عدد المشاهدات'
     )
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='بصمة المحتوى',
+        help_text='SHA-256 لمحتوى الملف المحلي - تُلغى عند استبدال الملف'
+    )
     
     class Meta:
         db_table = 'lectures_files'
@@ -293,6 +302,15 @@ class LectureFile(models.Model):
     def __str__(self):
         return f"{self.title} - {self.course.course_code}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # حفظ اسم الملف كما حُمّل لاكتشاف استبداله عند الحفظ
+        loaded = dict(zip(field_names, (v for v in values if v is not models.DEFERRED)))
+        if 'local_file' in loaded:
+            instance._loaded_file_name = loaded['local_file']
+        return instance
+    
     def save(self, *args, **kwargs):
         # تحديث معلومات الملف عند الحفظ
         if self.local_file:
@@ -303,7 +321,37 @@ class LectureFile(models.Model):
                 self.file_extension = Path(self.local_file.name).suffix.lower()
         elif self.external_link:
             self.content_type = 'external_link'
+        
+        # استبدال الملف يُبطل البصمة (ومعها النص المستخرج المخزن)
+        current_name = self.local_file.name if self.local_file else None
+        if self._state.adding or getattr(self, '_loaded_file_name', current_name) != current_name:
+            self.content_hash = None
+        
         super().save(*args, **kwargs)
+        self._loaded_file_name = self.local_file.name if self.local_file else None
+    
+    def get_content_hash(self):
+        """
+        الحصول على بصمة SHA-256 لمحتوى الملف المحلي
+        تُحسب مرة واحدة لكل إصدار من الملف ثم تُخزن في قاعدة البيانات
+        """
+        if self.content_hash:
+            return self.content_hash
+        if not self.local_file:
+            return None
+        
+        digest = hashlib.sha256()
+        try:
+            with self.local_file.open('rb') as f:
+                for chunk in f.chunks():
+                    digest.update(chunk)
+        except (OSError, ValueError):
+            return None
+        
+        self.content_hash = digest.hexdigest()
+        # update() بدلاً من save() لتجنب تعديل updated_at وإعادة فحص الملف
+        LectureFile.objects.filter(pk=self.pk).update(content_hash=self.content_hash)
+        return self.content_hash
     
     def get_content_url(self):
         """الحصول على رابط المحتوى (محلي أو خارجي)"""
@@ -314,14 +362,14 @@ class LectureFile(models.Model):
         return None
     
     def increment_download(self):
-        """زيادة عداد التحميلات"""
+        """زيادة عداد التحميلات (تحديث ذري بـ F لا يفقد الزيادات المتزامنة)"""
+        LectureFile.objects.filter(pk=self.pk).update(download_count=models.F('download_count') + 1)
         self.download_count += 1
-        self.save(update_fields=['download_count'])
     
     def increment_view(self):
-        """زيادة عداد المشاهدات"""
+        """زيادة عداد المشاهدات (تحديث ذري بـ F)"""
+        LectureFile.objects.filter(pk=self.pk).update(view_count=models.F('view_count') + 1)
         self.view_count += 1
-        self.save(update_fields=['view_count'])
     
     def soft_delete(self):
         """حذف ناعم للملف"""
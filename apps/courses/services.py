@@ -189,7 +189,7 @@ class ArchiveService:
         from apps.accounts.models import Semester
         
         # الحصول على الفصل الحالي
-        current_semester = Semester.objects.filter(is_current=True).first()
+        current_semester = Semester.get_current()
         
         if not current_semester:
             return False
@@ -565,6 +565,10 @@ class EnhancedFileService:
             if file_obj.is_visible:
                 NotificationManager.create_file_upload_notification(file_obj, course)
             
+            # فهرسة النص في الخلفية بعد تأكيد المعاملة
+            from apps.ai_features.services import schedule_file_indexing
+            schedule_file_indexing(file_obj)
+            
             logger.info(f"File uploaded: {file_obj.title} by {uploader.academic_id}")
             
             return FileUploadResult(success=True, file_id=file_obj.id)
@@ -631,31 +635,15 @@ class EnhancedFileService:
         """
         تسجيل تحميل الملف
         """
-        from apps.accounts.models import UserActivity
+        from .counters import record_file_activity
         
-        file_obj.increment_download()
-        
-        UserActivity.objects.create(
-            user=user,
-            activity_type='download',
-            description=f'تحميل ملف: {file_obj.title}',
-            file_id=file_obj.id,
-            ip_address=ip_address
-        )
+        record_file_activity(file_obj, user, 'download', ip_address=ip_address)
     
     @staticmethod
     def record_view(file_obj, user, ip_address: str = None):
         """
         تسجيل مشاهدة الملف
         """
-        from apps.accounts.models import UserActivity
-        
-        file_obj.increment_view()
+        from .counters import record_file_activity
         
-        UserActivity.objects.create(
-            user=user,
-            activity_type='view',
-            description=f'عرض ملف: {file_obj.title}',
-            file_id=file_obj.id,
-            ip_address=ip_address
-        )
+        record_file_activity(file_obj, user, 'view', ip_address=ip_address)
@@ -1,3 +1,168 @@
-from django.test import TestCase
+"""
+اختبارات تطبيق courses
+S-ACM - Smart Academic Content Management System
+"""
 
-# Create your tests here.
+import shutil
+import tempfile
+from datetime import date, timedelta
+
+from django.core.files.base import ContentFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from apps.accounts.models import Level, Semester, User, UserActivity
+from .counters import FileActivityBuffer
+from .file_serving import deliver_file, is_initial_request, serve_file
+from .models import Course, LectureFile
+
+
+class FileServingTest(TestCase):
+    """اختبارات تقديم الملفات: Range والطلبات الشرطية"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.media_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.media_override.enable()
+
+        level = Level.objects.create(level_name='المستوى الأول', level_number=1)
+        semester = Semester.objects.create(
+            name='الفصل الأول', academic_year='2025/2026', semester_number=1,
+            start_date=date(2025, 9, 1), end_date=date(2026, 1, 15), is_current=True
+        )
+        course = Course.objects.create(
+            course_name='مقدمة في البرمجة', course_code='CS101', level=level, semester=semester
+        )
+        self.content = bytes(range(256)) * 40
+        self.file_obj = LectureFile(course=course, title='محاضرة')
+        self.file_obj.local_file.save('lecture.pdf', ContentFile(self.content), save=False)
+        self.file_obj.save()
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        self.media_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def get(self, **headers):
+        self.request = self.factory.get('/', headers=headers)
+        return serve_file(self.request, self.file_obj)
+
+    def test_full_response_has_validators(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['ETag'], f'"{self.file_obj.get_content_hash()}"')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(is_initial_request(self.request, response))
+
+    def test_range_returns_partial_content(self):
+        response = self.get(Range='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+        self.assertFalse(is_initial_request(self.request, response))
+
+        suffix = self.get(Range='bytes=-10')
+        self.assertEqual(b''.join(suffix.streaming_content), self.content[-10:])
+
+    def test_unsatisfiable_range_and_stale_if_range(self):
+        self.assertEqual(self.get(Range=f'bytes={len(self.content)}-').status_code, 416)
+        # الملف تغير منذ أن حصل المتصفح على الجزء الأول: يُرسل كاملاً
+        self.assertEqual(self.get(Range='bytes=0-9', If_Range='"old"').status_code, 200)
+
+    def test_conditional_get_returns_not_modified(self):
+        etag = self.get()['ETag']
+        response = self.get(If_None_Match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(is_initial_request(self.request, response))
+
+    @override_settings(FILE_DELIVERY_BACKEND='nginx', FILE_DELIVERY_INTERNAL_PREFIX='/protected/')
+    def test_nginx_backend_hands_off_transfer(self):
+        """Django يُرجع ترويسة X-Accel-Redirect فقط، و304 يُجاب دون خادم الويب"""
+        request = self.factory.get('/', headers={'Range': 'bytes=100-'})
+        response = deliver_file(request, self.file_obj, as_attachment=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/' + self.file_obj.local_file.name)
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertFalse(is_initial_request(request, response))
+
+        etag = f'"{self.file_obj.get_content_hash()}"'
+        cached = deliver_file(self.factory.get('/', headers={'If-None-Match': etag}), self.file_obj)
+        self.assertEqual(cached.status_code, 304)
+        self.assertNotIn('X-Accel-Redirect', cached)
+
+
+class FileActivityBufferTest(TestCase):
+    """اختبارات العدادات المؤجلة"""
+
+    def setUp(self):
+        level = Level.objects.create(level_name='المستوى الأول', level_number=1)
+        semester = Semester.objects.create(
+            name='الفصل الأول', academic_year='2025/2026', semester_number=1,
+            start_date=date(2025, 9, 1), end_date=date(2026, 1, 15), is_current=True
+        )
+        course = Course.objects.create(
+            course_name='مقدمة في البرمجة', course_code='CS101', level=level, semester=semester
+        )
+        self.file_obj = LectureFile.objects.create(course=course, title='محاضرة', external_link='https://example.com')
+        self.user = User.objects.create_user(
+            academic_id='20250001', password='pass12345', id_card_number='1000000001',
+            full_name='طالب', account_status='active'
+        )
+
+    def activity(self, event, when):
+        return {
+            'user_id': self.user.pk, 'activity_type': event, 'description': event,
+            'file_id': self.file_obj.pk, 'ip_address': None, 'activity_time': when,
+        }
+
+    def test_flush_writes_counters_and_activities_in_batch(self):
+        buffer = FileActivityBuffer(batch_size=100)
+        earlier = timezone.now() - timedelta(minutes=3)
+        for _ in range(3):
+            buffer.add(self.file_obj.pk, 'download', self.activity('download', earlier))
+        buffer.add(self.file_obj.pk, 'view', self.activity('view', earlier))
+        self.assertEqual(UserActivity.objects.count(), 0)
+
+        with self.assertNumQueries(6):  # (savepoint + تحديث واحد للملف + release) + (savepoint + bulk_create + release)
+            self.assertEqual(buffer.flush(), 4)
+        self.assertEqual(buffer.pending(), 0)
+
+        self.file_obj.refresh_from_db()
+        self.assertEqual((self.file_obj.download_count, self.file_obj.view_count), (3, 1))
+        activities = UserActivity.objects.filter(file_id=self.file_obj.pk)
+        self.assertEqual(activities.count(), 4)
+        # وقت النشاط هو وقت الطلب لا وقت الكتابة
+        self.assertTrue(all(a.activity_time == earlier for a in activities))
+
+    def test_invalid_activity_row_does_not_block_counters(self):
+        """سجل نشاط تالف يُتجاهل ولا يمنع كتابة العدادات والسجلات السليمة"""
+        buffer = FileActivityBuffer(batch_size=100)
+        now = timezone.now()
+        ghost = User.objects.create_user(
+            academic_id='20250002', password='pass12345', id_card_number='1000000002',
+            full_name='طالب محذوف', account_status='active'
+        )
+        buffer.add(self.file_obj.pk, 'download', self.activity('download', now))
+        buffer.add(self.file_obj.pk, 'download', {**self.activity('download', now), 'activity_type': None})
+        buffer.add(self.file_obj.pk, 'view', {**self.activity('view', now), 'user_id': ghost.pk})
+        buffer.add(self.file_obj.pk, 'view', self.activity('view', now))
+        ghost.delete()
+
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(buffer.pending(), 0)
+        self.file_obj.refresh_from_db()
+        self.assertEqual((self.file_obj.download_count, self.file_obj.view_count), (2, 2))
+        self.assertEqual(UserActivity.objects.filter(file_id=self.file_obj.pk).count(), 2)
+
+    def test_batch_size_forces_flush(self):
+        buffer = FileActivityBuffer(batch_size=2)
+        now = timezone.now()
+        buffer.add(self.file_obj.pk, 'view', self.activity('view', now))
+        self.assertEqual(buffer.pending(), 1)
+        buffer.add(self.file_obj.pk, 'view', self.activity('view', now))
+        self.assertEqual(buffer.pending(), 0)
+        self.file_obj.refresh_from_db()
+        self.assertEqual(self.file_obj.view_count, 2)
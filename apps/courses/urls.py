@@ -37,6 +37,7 @@ urlpatterns = [
     path('files/upload/', views.FileUploadView.as_view(), name='file_upload'),
     path('files/<int:pk>/download/', views.FileDownloadView.as_view(), name='file_download'),
     path('files/<int:pk>/view/', views.FileViewView.as_view(), name='file_view'),
+    path('files/<int:pk>/content/', views.FileContentView.as_view(), name='file_content'),
     path('files/<int:pk>/update/', views.FileUpdateView.as_view(), name='file_update'),
     path('files/<int:pk>/delete/', views.FileDeleteView.as_view(), name='file_delete'),
     path('files/<int:pk>/toggle-visibility/', views.FileToggleVisibilityView.as_view(), name='file_toggle_visibility'),
@@ -45,4 +46,5 @@ urlpatterns = [
     # AI Features
     # ==============================
     path('files/<int:pk>/ai/', views.InstructorAIGenerationView.as_view(), name='file_ai'),
+    path('<int:pk>/ai/question-bank/', views.InstructorQuestionBankView.as_view(), name='course_question_bank'),
 ]
\ No newline at end of file
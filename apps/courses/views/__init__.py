@@ -23,6 +23,7 @@ from .student import (
 from .common import (
     FileDownloadView,
     FileViewView,
+    FileContentView,
 )
 
 # Instructor views
@@ -32,6 +33,7 @@ from .instructor import (
     InstructorCourseDetailView,
     FileUploadView,
     InstructorAIGenerationView,
+    InstructorQuestionBankView,
     FileUpdateView,
     FileDeleteView,
     FileToggleVisibilityView,
@@ -59,12 +61,14 @@ __all__ = [
     # Common
     'FileDownloadView',
     'FileViewView',
+    'FileContentView',
     # Instructor
     'InstructorDashboardView',
     'InstructorCourseListView',
     'InstructorCourseDetailView',
     'FileUploadView',
     'InstructorAIGenerationView',
+    'InstructorQuestionBankView',
     'FileUpdateView',
     'FileDeleteView',
     'FileToggleVisibilityView',
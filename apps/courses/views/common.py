@@ -9,15 +9,16 @@ such as file download and file viewing.
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.views import View
-from django.http import FileResponse
 from django.core.exceptions import PermissionDenied
-from pathlib import Path
-import mimetypes
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views.decorators.clickjacking import xframe_options_sameorigin
 import logging
 
 from ..models import LectureFile
 from ..mixins import SecureFileDownloadMixin
-from apps.accounts.models import UserActivity
+from ..file_serving import deliver_file, is_initial_request
+from ..counters import record_file_activity
 
 logger = logging.getLogger('courses')
 
@@ -45,35 +46,25 @@ class FileDownloadView(SecureFileDownloadMixin, View):
                 return redirect('courses:instructor_dashboard')
             return redirect('core:dashboard_redirect')
         
-        # زيادة عداد التحميل
-        file_obj.increment_download()
-        
-        # تسجيل النشاط
-        UserActivity.objects.create(
-            user=user,
-            activity_type='download',
-            description=f'تحميل ملف: {file_obj.title}',
-            file_id=file_obj.id,
-            ip_address=request.META.get('REMOTE_ADDR')
-        )
-        
         # إذا كان رابط خارجي
         if file_obj.content_type == 'external_link':
+            self.record_download(request, file_obj)
             return redirect(file_obj.external_link)
         
-        # إذا كان ملف محلي
+        # إذا كان ملف محلي (مع دعم Range والطلبات الشرطية)
         if file_obj.local_file:
-            file_path = file_obj.local_file.path
-            content_type, _ = mimetypes.guess_type(file_path)
-            response = FileResponse(
-                open(file_path, 'rb'),
-                content_type=content_type or 'application/octet-stream'
-            )
-            response['Content-Disposition'] = f'attachment; filename="{Path(file_path).name}"'
+            response = deliver_file(request, file_obj, as_attachment=True)
+            # استكمال تحميل متقطع أو استجابة 304 لا تُحسب تحميلاً جديداً
+            if is_initial_request(request, response):
+                self.record_download(request, file_obj)
             return response
         
         messages.error(request, 'الملف غير موجود.')
         return redirect('courses:student_dashboard')
+    
+    def record_download(self, request, file_obj):
+        """زيادة عداد التحميل وتسجيل النشاط (كتابة مؤجلة على دفعات)"""
+        record_file_activity(file_obj, request.user, 'download', ip_address=request.META.get('REMOTE_ADDR'))
 
 
 class FileViewView(SecureFileDownloadMixin, View):
@@ -95,21 +86,29 @@ class FileViewView(SecureFileDownloadMixin, View):
             messages.error(request, str(e) if str(e) else 'ليس لديك صلاحية الوصول لهذا الملف.')
             return redirect('courses:student_dashboard')
         
-        # زيادة عداد المشاهدة
-        file_obj.increment_view()
-        
-        # تسجيل النشاط
-        UserActivity.objects.create(
-            user=request.user,
-            activity_type='view',
-            description=f'عرض ملف: {file_obj.title}',
-            file_id=file_obj.id,
-            ip_address=request.META.get('REMOTE_ADDR')
-        )
+        # زيادة عداد المشاهدة وتسجيل النشاط (كتابة مؤجلة على دفعات)
+        record_file_activity(file_obj, request.user, 'view', ip_address=request.META.get('REMOTE_ADDR'))
         
         context = {
             'file': file_obj,
-            'course': file_obj.course
+            'course': file_obj.course,
+            'content_url': reverse('courses:file_content', args=[file_obj.pk]) if file_obj.local_file else None
         }
         
         return render(request, 'courses/file_viewer.html', context)
+
+
+@method_decorator(xframe_options_sameorigin, name='dispatch')
+class FileContentView(SecureFileDownloadMixin, View):
+    """
+    محتوى الملف للعرض داخل الصفحة (مصدر مشغل الفيديو وعارض PDF)
+    
+    يدعم طلبات Range حتى يستطيع المتصفح التقديم داخل الملف،
+    ولا يُحتسب مشاهدة (تُحتسب في FileViewView).
+    """
+    
+    def get(self, request, pk):
+        file_obj = self.get_secure_file(pk, require_visible=request.user.is_student())
+        if not file_obj.local_file:
+            return redirect('courses:file_view', pk=file_obj.pk)
+        return deliver_file(request, file_obj, as_attachment=False)
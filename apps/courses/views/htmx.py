@@ -17,6 +17,7 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
 from django.template.loader import render_to_string
 from django.db.models import Q
+from django.urls import reverse
 
 from ..models import Course, LectureFile
 from ..services import EnhancedCourseService, EnhancedFileService
@@ -219,7 +220,7 @@ def htmx_notifications(request):
     from apps.notifications.models import NotificationManager
     
     user = request.user
-    notifications = NotificationManager.get_recent_notifications(user, limit=5)
+    notifications = NotificationManager.get_user_notifications(user, limit=5)
     unread_count = NotificationManager.get_unread_count(user)
     
     context = {
@@ -247,7 +248,7 @@ def htmx_generate_summary(request, file_id):
             توليد تلخيص
         </button>
     """
-    from apps.ai_features.services import GeminiService
+    from apps.ai_features.services import AIArtifactStore
     
     file_obj = get_object_or_404(LectureFile, pk=file_id, is_deleted=False)
     
@@ -258,16 +259,12 @@ def htmx_generate_summary(request, file_id):
         return HttpResponse(f"<div class='alert alert-danger'>{error}</div>")
     
     # توليد التلخيص
-    service = GeminiService()
-    text = service.extract_text_from_file(file_obj)
-    
-    if not text:
-        return HttpResponse("<div class='alert alert-warning'>لا يمكن استخراج النص من هذا الملف</div>")
-    
-    summary = service.generate_summary(text)
+    # الملخص المحفوظ يُعرض مباشرة، وإلا يُبث أثناء توليده
+    stored = AIArtifactStore.stored_summary(file_obj)
     
     context = {
-        'summary': summary,
+        'summary': stored.summary_text if stored else None,
+        'stream_url': None if stored else reverse('ai_features:summarize_stream', args=[file_obj.id]),
         'file': file_obj
     }
     
@@ -287,7 +284,11 @@ def htmx_generate_questions(request, file_id):
             توليد أسئلة
         </button>
     """
-    from apps.ai_features.services import GeminiService
+    from apps.ai_features.services import AIArtifactStore
+    from apps.ai_features.usage import check_budget
+    from apps.ai_features.jobs import enqueue_job
+    from apps.ai_features.models import AIJob
+    from apps.core.ratelimit import ai_rate_limiter
     
     file_obj = get_object_or_404(LectureFile, pk=file_id, is_deleted=False)
     
@@ -301,21 +302,40 @@ def htmx_generate_questions(request, file_id):
     question_type = request.POST.get('type', 'mixed')
     num_questions = int(request.POST.get('count', 5))
     
-    # توليد الأسئلة
-    service = GeminiService()
-    text = service.extract_text_from_file(file_obj)
-    
-    if not text:
-        return HttpResponse("<div class='alert alert-warning'>لا يمكن استخراج النص من هذا الملف</div>")
-    
-    questions = service.generate_questions(text, question_type, num_questions)
-    
-    context = {
-        'questions': questions,
-        'file': file_obj
-    }
-    
-    return render(request, 'ai_features/partials/questions_result.html', context)
+    # الأسئلة المحفوظة تُعرض مباشرة بدون المرور بالطابور
+    stored = AIArtifactStore.stored_questions(file_obj, question_type, num_questions)
+    if stored is not None:
+        questions = [
+            {
+                'type': q.question_type,
+                'question': q.question_text,
+                'options': q.options,
+                'answer': q.correct_answer,
+                'explanation': q.explanation,
+            }
+            for q in stored
+        ]
+        return render(request, 'ai_features/partials/questions_result.html', {
+            'questions': questions,
+            'file': file_obj
+        })
+    
+    # حد الاستخدام يُطبق فقط عند الحاجة لاستدعاء النموذج
+    error = check_budget(user, file_obj)
+    if error is None and not ai_rate_limiter().hit(user.pk).allowed:
+        error = 'لقد تجاوزت الحد المسموح من الطلبات. حاول بعد ساعة.'
+    if error:
+        return HttpResponse(f"<div class='alert alert-warning'>{error}</div>")
+    
+    # التوليد في المسار التفاعلي؛ الـ partial يستعلم عن الحالة حتى تظهر النتيجة
+    job = enqueue_job(
+        'questions', user=user, lane=AIJob.LANE_INTERACTIVE,
+        file_id=file_obj.id, question_type=question_type,
+        num_questions=num_questions, user_id=user.pk
+    )
+    if job is None:
+        return HttpResponse("<div class='alert alert-info'>جاري توليد الأسئلة في الخلفية...</div>")
+    return render(request, 'ai_features/partials/job_status.html', {'job': job, 'position': 0})
 
 
 @login_required
@@ -332,8 +352,6 @@ def htmx_ask_document(request, file_id):
             <button type="submit">اسأل</button>
         </form>
     """
-    from apps.ai_features.services import GeminiService
-    
     file_obj = get_object_or_404(LectureFile, pk=file_id, is_deleted=False)
     
     # التحقق من صلاحية الوصول
@@ -346,18 +364,10 @@ def htmx_ask_document(request, file_id):
     if not question:
         return HttpResponse("<div class='alert alert-warning'>يرجى كتابة سؤال</div>")
     
-    # الإجابة على السؤال
-    service = GeminiService()
-    text = service.extract_text_from_file(file_obj)
-    
-    if not text:
-        return HttpResponse("<div class='alert alert-warning'>لا يمكن استخراج النص من هذا الملف</div>")
-    
-    answer = service.ask_document(text, question)
-    
+    # الإجابة تُبث إلى القالب الجزئي أثناء توليدها
     context = {
         'question': question,
-        'answer': answer,
+        'stream_url': reverse('ai_features:ask_stream', args=[file_obj.id]),
         'file': file_obj
     }
     
@@ -25,7 +25,9 @@ from apps.core.models import AuditLog
 
 # استيراد خدمات الذكاء الاصطناعي (تأكد من وجود Celery أو استدعاء الدالة مباشرة)
 try:
-    from apps.ai_features.services import generate_summary_async, generate_questions_async
+    from apps.ai_features.services import schedule_file_indexing
+    from apps.ai_features.jobs import enqueue_job
+    from apps.ai_features.models import AIJob
     AI_AVAILABLE = True
 except ImportError:
     AI_AVAILABLE = False
@@ -159,12 +161,19 @@ class FileUploadView(LoginRequiredMixin, InstructorRequiredMixin, CreateView):
                 file_obj.course
             )
         
+        # استخراج النص وفهرسته في الخلفية
+        if AI_AVAILABLE:
+            schedule_file_indexing(file_obj)
+        
         # [جديد] تشغيل الذكاء الاصطناعي إذا طُلب ذلك
         # ملاحظة: نفترض وجود checkbox في الـ HTML اسمه 'auto_generate_ai'
         if AI_AVAILABLE and self.request.POST.get('auto_generate_ai') == 'on':
             try:
-                # إرسال مهمة التلخيص (Async)
-                generate_summary_async.delay(file_obj.id)
+                # مهمة التلخيص في مسار الخلفية (أولوية أقل من الطلبات التفاعلية)
+                enqueue_job(
+                    'summary', user=self.request.user, lane=AIJob.LANE_BACKFILL,
+                    file_id=file_obj.id, user_id=self.request.user.pk
+                )
                 messages.info(self.request, 'جاري توليد ملخص ذكي للملف في الخلفية...')
             except Exception as e:
                 logger.error(f"Failed to trigger AI summary: {e}")
@@ -189,15 +198,25 @@ class InstructorAIGenerationView(LoginRequiredMixin, InstructorRequiredMixin, Vi
             messages.error(request, 'خدمة الذكاء الاصطناعي غير مفعلة حالياً.')
             return redirect('courses:instructor_course_detail', pk=file_obj.course.pk)
 
+        # refresh=1 يفرض إعادة التوليد بدلاً من إعادة استخدام النتائج المحفوظة
+        refresh = request.POST.get('refresh') == '1'
+        
         try:
             if action == 'summary':
-                generate_summary_async.delay(file_obj.id)
+                enqueue_job(
+                    'summary', user=request.user, lane=AIJob.LANE_BATCH,
+                    file_id=file_obj.id, refresh=refresh, user_id=request.user.pk
+                )
                 messages.success(request, 'تم إرسال طلب توليد الملخص. سيظهر قريباً.')
             
             elif action == 'questions':
                 num_questions = int(request.POST.get('num_questions', 5))
                 q_type = request.POST.get('question_type', 'mixed')
-                generate_questions_async.delay(file_obj.id, question_type=q_type, num_questions=num_questions)
+                enqueue_job(
+                    'questions', user=request.user, lane=AIJob.LANE_BATCH,
+                    file_id=file_obj.id, question_type=q_type,
+                    num_questions=num_questions, refresh=refresh, user_id=request.user.pk
+                )
                 messages.success(request, 'تم إرسال طلب توليد الأسئلة.')
                 
             else:
@@ -210,6 +229,38 @@ class InstructorAIGenerationView(LoginRequiredMixin, InstructorRequiredMixin, Vi
         return redirect('courses:instructor_course_detail', pk=file_obj.course.pk)
 
 
+class InstructorQuestionBankView(LoginRequiredMixin, InstructorRequiredMixin, View):
+    """
+    توليد بنك أسئلة لجميع ملفات المقرر في مهمة واحدة
+    
+    طلب HTMX يُرجع partial يعرض التقدم ثم الأسئلة؛ غير ذلك يُعاد التوجيه لصفحة المقرر.
+    """
+    def post(self, request, pk):
+        course = get_object_or_404(Course.objects.get_courses_for_instructor(request.user), pk=pk)
+        
+        if not AI_AVAILABLE:
+            messages.error(request, 'خدمة الذكاء الاصطناعي غير مفعلة حالياً.')
+            return redirect('courses:course_detail', pk=course.pk)
+        
+        try:
+            num_questions = min(max(int(request.POST.get('num_questions', 5)), 1), 20)
+        except ValueError:
+            num_questions = 5
+        job = enqueue_job(
+            'question_bank', user=request.user, lane=AIJob.LANE_BATCH,
+            course_id=course.pk,
+            question_type=request.POST.get('question_type', 'mixed'),
+            num_questions=num_questions,
+            refresh=request.POST.get('refresh') == '1',
+            user_id=request.user.pk
+        )
+        
+        if request.headers.get('HX-Request') and job is not None:
+            return render(request, 'ai_features/partials/job_status.html', {'job': job, 'position': 0})
+        messages.success(request, 'تم إرسال طلب توليد بنك الأسئلة للمقرر.')
+        return redirect('courses:course_detail', pk=course.pk)
+
+
 class FileUpdateView(LoginRequiredMixin, InstructorRequiredMixin, UpdateView):
     """تحديث ملف"""
     model = LectureFile
@@ -228,7 +279,10 @@ class FileUpdateView(LoginRequiredMixin, InstructorRequiredMixin, UpdateView):
         return kwargs
     
     def form_valid(self, form):
+        file_changed = 'local_file' in form.changed_data
         response = super().form_valid(form)
+        if AI_AVAILABLE and file_changed:
+            schedule_file_indexing(self.object)
         messages.success(self.request, f'تم تحديث الملف "{self.object.title}" بنجاح.')
         return response
     
@@ -84,7 +84,7 @@ class UnifiedCourseListView(LoginRequiredMixin, ListView):
         context['majors'] = Major.objects.all()
         
         # الفصل الحالي
-        context['current_semester'] = Semester.objects.filter(is_current=True).first()
+        context['current_semester'] = Semester.get_current()
         
         # إحصائيات
         if hasattr(user, 'is_admin') and user.is_admin():
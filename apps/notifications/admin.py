@@ -18,10 +18,10 @@ class NotificationRecipientInline(admin.TabularInline):
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ['title', 'notification_type', 'priority', 'sender', 'course', 'recipients_count', 'read_count', 'created_at']
-    list_filter = ['notification_type', 'priority', 'is_active', 'created_at']
+    list_display = ['title', 'notification_type', 'priority', 'sender', 'course', 'audience', 'delivery_status', 'recipients_count', 'read_count', 'created_at']
+    list_filter = ['notification_type', 'priority', 'audience', 'delivery_status', 'is_active', 'created_at']
     search_fields = ['title', 'body', 'sender__full_name']
-    readonly_fields = ['created_at']
+    readonly_fields = ['created_at', 'delivery_status', 'delivery_total', 'delivery_done']
     autocomplete_fields = ['sender', 'course', 'file']
     inlines = [NotificationRecipientInline]
     date_hierarchy = 'created_at'
@@ -33,6 +33,13 @@ class NotificationAdmin(admin.ModelAdmin):
         ('المرسل والارتباطات', {
             'fields': ('sender', 'course', 'file')
         }),
+        ('الجمهور', {
+            'fields': ('audience', 'target_role', 'target_major', 'target_level', 'target_course')
+        }),
+        ('التوصيل', {
+            'fields': ('delivery_status', 'delivery_total', 'delivery_done'),
+            'classes': ('collapse',)
+        }),
         ('الحالة', {
             'fields': ('is_active', 'expires_at')
         }),
@@ -43,7 +50,7 @@ class NotificationAdmin(admin.ModelAdmin):
     )
     
     def recipients_count(self, obj):
-        return obj.recipients.count()
+        return obj.get_recipients_count()
     recipients_count.short_description = 'عدد المستلمين'
     
     def read_count(self, obj):
@@ -0,0 +1,134 @@
+"""
+عدادات الإشعارات غير المقروءة في الكاش
+S-ACM - Smart Academic Content Management System
+
+عدد الإشعارات غير المقروءة لكل مستخدم يُحفظ في الكاش ويُعدَّل مباشرة:
+- زيادة عند إنشاء سجلات المستلمين (الإرسال المباشر والتوصيل في الخلفية)
+- نقصان عند القراءة أو الحذف، وتصفير عند "تحديد الكل كمقروء"
+
+الإشعارات المستهدفة لا تُنشئ سجلات، فمفتاح العداد يتضمن رقم إصدار
+الجمهور (عام + تخصص المستخدم)؛ إرسال إشعار مستهدف يرفع إصدار نطاقه
+فيُعاد حساب عدادات المتأثرين فقط عند قراءتها التالية.
+
+كل عداد ينتهي بعد NOTIFICATION_UNREAD_TTL ثانية ويُعاد حسابه من قاعدة
+البيانات (مطابقة دورية تصحح أي انحراف: انتهاء صلاحية إشعار، حذفه...).
+
+Example:
+    count = get_unread_count(request.user)
+    adjust_unread([(user.pk, user.major_id)], -1)
+"""
+
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+GLOBAL_SCOPE = 'all'
+
+
+def _ttl() -> int:
+    return getattr(settings, 'NOTIFICATION_UNREAD_TTL', 300)
+
+
+def _version_key(scope) -> str:
+    return f'notifications:audience:{scope}'
+
+
+def _audience_versions(major_ids: Iterable[Optional[int]]) -> Dict:
+    """إصدارات الجمهور للنطاق العام وللتخصصات المطلوبة (طلب كاش واحد عادةً)."""
+    keys = {_version_key(GLOBAL_SCOPE)} | {_version_key(m) for m in major_ids if m}
+    versions = cache.get_many(keys)
+    for key in keys - versions.keys():
+        # قيمة أولية من الوقت حتى لا يعود إصدار مفقود إلى رقم قديم
+        cache.add(key, int(time.time() * 1000), None)
+        versions[key] = cache.get(key)
+    return versions
+
+
+def _counter_key(user_id: int, major_id: Optional[int], versions: Dict) -> str:
+    major_version = versions.get(_version_key(major_id), 0) if major_id else 0
+    return f'notifications:unread:{user_id}:{versions[_version_key(GLOBAL_SCOPE)]}.{major_version}'
+
+
+def unread_key(user) -> str:
+    return _counter_key(user.pk, user.major_id, _audience_versions([user.major_id]))
+
+
+def count_unread(user) -> int:
+    """العدد الفعلي من قاعدة البيانات."""
+    from .models import NotificationManager
+
+    return NotificationManager.visible_to(user).filter(is_read=False).count()
+
+
+def get_unread_count(user) -> int:
+    """عدد الإشعارات غير المقروءة (من الكاش، ويُحسب عند غيابه)."""
+    key = unread_key(user)
+    count = cache.get(key)
+    if count is None or count < 0:
+        count = count_unread(user)
+        cache.set(key, count, _ttl())
+    return count
+
+
+def adjust_unread(users: List[Tuple[int, Optional[int]]], delta: int) -> None:
+    """
+    تعديل عدادات موجودة في الكاش.
+
+    Args:
+        users: (معرف المستخدم، معرف التخصص)
+        delta: مقدار التغيير (+1 إشعار جديد، -1 قراءة أو حذف)
+
+    العداد غير الموجود لا يُنشأ؛ يُحسب من قاعدة البيانات عند أول قراءة.
+    """
+    versions = _audience_versions({major_id for _, major_id in users})
+    for user_id, major_id in users:
+        key = _counter_key(user_id, major_id, versions)
+        try:
+            if cache.incr(key, delta) < 0:
+                cache.delete(key)
+        except ValueError:
+            pass
+
+
+def discard_unread(users: List[Tuple[int, Optional[int]]]) -> None:
+    """حذف العدادات ليُعاد حسابها (عندما لا يُعرف مقدار التغيير)."""
+    versions = _audience_versions({major_id for _, major_id in users})
+    cache.delete_many([_counter_key(user_id, major_id, versions) for user_id, major_id in users])
+
+
+def reset_unread(user) -> None:
+    """جميع إشعارات المستخدم أصبحت مقروءة."""
+    cache.set(unread_key(user), 0, _ttl())
+
+
+def _bump_scopes(scopes: List) -> None:
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(time.time() * 1000), None)
+            cache.incr(key)
+
+
+def invalidate_audience(notification) -> None:
+    """
+    إبطال عدادات جمهور إشعار مستهدف (الآن ومرة أخرى بعد الـ commit،
+    حتى لا يبقى عدد حُسب قبل ظهور الإشعار).
+    """
+    from apps.courses.models import CourseMajor
+
+    if notification.target_major_id:
+        scopes = [notification.target_major_id]
+    elif notification.target_course_id:
+        scopes = list(
+            CourseMajor.objects.filter(course_id=notification.target_course_id).values_list('major_id', flat=True)
+        )
+    else:
+        scopes = [GLOBAL_SCOPE]
+
+    _bump_scopes(scopes)
+    transaction.on_commit(lambda: _bump_scopes(scopes))
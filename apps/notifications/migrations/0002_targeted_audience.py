@@ -0,0 +1,47 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_activity_time_default'),
+        ('courses', '0002_lecturefile_content_hash'),
+        ('notifications', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='audience',
+            field=models.CharField(choices=[('direct', 'مستلمون محددون'), ('targeted', 'جمهور مستهدف')], default='direct', max_length=10, verbose_name='الجمهور'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='target_course',
+            field=models.ForeignKey(blank=True, help_text='المستخدمون في أحد تخصصات هذا المقرر', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='targeted_notifications', to='courses.course', verbose_name='تخصصات المقرر المستهدفة'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='target_level',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='targeted_notifications', to='accounts.level', verbose_name='المستوى المستهدف'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='target_major',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='targeted_notifications', to='accounts.major', verbose_name='التخصص المستهدف'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='target_role',
+            field=models.CharField(blank=True, default='', help_text='كود الدور (فارغ = جميع الأدوار)', max_length=50, verbose_name='الدور المستهدف'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['audience', 'is_active', 'created_at'], name='notificatio_audienc_e31f1f_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_targeted_audience'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='delivery_done',
+            field=models.PositiveIntegerField(default=0, verbose_name='المستلمون المُنشؤون'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='delivery_status',
+            field=models.CharField(choices=[('pending', 'في الانتظار'), ('running', 'جارٍ التوصيل'), ('done', 'مكتمل'), ('failed', 'فشل')], default='done', help_text='إنشاء سجلات المستلمين في الخلفية (NOTIFICATION_FANOUT = write)', max_length=10, verbose_name='حالة التوصيل'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='delivery_total',
+            field=models.PositiveIntegerField(default=0, verbose_name='إجمالي المستلمين'),
+        ),
+    ]
@@ -4,12 +4,18 @@ S-ACM - Smart Academic Content Management System
 """
 
 from django.db import models
+from django.db.models import Exists, OuterRef, Q
 from django.conf import settings
 
 
 class Notification(models.Model):
     """
     جدول الإشعارات (Notifications)
+    
+    نوعان من الجمهور:
+    - direct: المستلمون سجلات NotificationRecipient
+    - targeted: الإشعار يُحفظ مرة واحدة مع شروط الجمهور (الدور/التخصص/المستوى/المقرر)
+      ويُطابق مع المستخدم وقت القراءة؛ سجل المستلم يُنشأ فقط عند القراءة أو الحذف
     """
     NOTIFICATION_TYPES = [
         ('general', 'إشعار عام'),
@@ -26,6 +32,24 @@ class Notification(models.Model):
         ('urgent', 'عاجلة'),
     ]
     
+    AUDIENCE_DIRECT = 'direct'
+    AUDIENCE_TARGETED = 'targeted'
+    AUDIENCE_CHOICES = [
+        (AUDIENCE_DIRECT, 'مستلمون محددون'),
+        (AUDIENCE_TARGETED, 'جمهور مستهدف'),
+    ]
+    
+    DELIVERY_PENDING = 'pending'
+    DELIVERY_RUNNING = 'running'
+    DELIVERY_DONE = 'done'
+    DELIVERY_FAILED = 'failed'
+    DELIVERY_CHOICES = [
+        (DELIVERY_PENDING, 'في الانتظار'),
+        (DELIVERY_RUNNING, 'جارٍ التوصيل'),
+        (DELIVERY_DONE, 'مكتمل'),
+        (DELIVERY_FAILED, 'فشل'),
+    ]
+    
     sender = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -83,6 +107,60 @@ class Notification(models.Model):
         default=True,
         verbose_name='نشط'
     )
+    # الجمهور المستهدف (يُطابق وقت القراءة)
+    audience = models.CharField(
+        max_length=10,
+        choices=AUDIENCE_CHOICES,
+        default=AUDIENCE_DIRECT,
+        verbose_name='الجمهور'
+    )
+    target_role = models.CharField(
+        max_length=50,
+        blank=True,
+        default='',
+        verbose_name='الدور المستهدف',
+        help_text='كود الدور (فارغ = جميع الأدوار)'
+    )
+    target_major = models.ForeignKey(
+        'accounts.Major',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='targeted_notifications',
+        verbose_name='التخصص المستهدف'
+    )
+    target_level = models.ForeignKey(
+        'accounts.Level',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='targeted_notifications',
+        verbose_name='المستوى المستهدف'
+    )
+    target_course = models.ForeignKey(
+        'courses.Course',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='targeted_notifications',
+        verbose_name='تخصصات المقرر المستهدفة',
+        help_text='المستخدمون في أحد تخصصات هذا المقرر'
+    )
+    delivery_status = models.CharField(
+        max_length=10,
+        choices=DELIVERY_CHOICES,
+        default=DELIVERY_DONE,
+        verbose_name='حالة التوصيل',
+        help_text='إنشاء سجلات المستلمين في الخلفية (NOTIFICATION_FANOUT = write)'
+    )
+    delivery_total = models.PositiveIntegerField(
+        default=0,
+        verbose_name='إجمالي المستلمين'
+    )
+    delivery_done = models.PositiveIntegerField(
+        default=0,
+        verbose_name='المستلمون المُنشؤون'
+    )
     
     class Meta:
         db_table = 'notifications'
@@ -93,13 +171,47 @@ class Notification(models.Model):
             models.Index(fields=['notification_type']),
             models.Index(fields=['created_at']),
             models.Index(fields=['course']),
+            models.Index(fields=['audience', 'is_active', 'created_at']),
         ]
     
     def __str__(self):
         return self.title
     
+    @property
+    def is_targeted(self):
+        return self.audience == self.AUDIENCE_TARGETED
+    
+    @property
+    def is_delivering(self):
+        return self.delivery_status in (self.DELIVERY_PENDING, self.DELIVERY_RUNNING)
+    
+    def audience_users(self):
+        """
+        المستخدمون النشطون المطابقون لشروط الجمهور
+        (المسجلون قبل إنشاء الإشعار، كما في الإرسال المباشر)
+        """
+        from apps.accounts.models import User
+        from apps.courses.models import CourseMajor
+        
+        users = User.objects.filter(account_status='active')
+        if self.created_at:
+            users = users.filter(date_joined__lte=self.created_at)
+        if self.target_role:
+            users = users.filter(role__code=self.target_role)
+        if self.target_major_id:
+            users = users.filter(major_id=self.target_major_id)
+        if self.target_level_id:
+            users = users.filter(level_id=self.target_level_id)
+        if self.target_course_id:
+            users = users.filter(
+                major_id__in=CourseMajor.objects.filter(course_id=self.target_course_id).values('major_id')
+            )
+        return users
+    
     def get_recipients_count(self):
         """الحصول على عدد المستلمين"""
+        if self.is_targeted or self.delivery_status != self.DELIVERY_DONE:
+            return self.audience_users().count()
         return self.recipients.count()
     
     def get_read_count(self):
@@ -154,24 +266,61 @@ class NotificationRecipient(models.Model):
     def mark_as_read(self):
         """تحديد الإشعار كمقروء"""
         from django.utils import timezone
+        from .counters import adjust_unread
         if not self.is_read:
             self.is_read = True
             self.read_at = timezone.now()
             self.save(update_fields=['is_read', 'read_at'])
+            if not self.is_deleted:
+                adjust_unread([(self.user_id, self.user.major_id)], -1)
+    
+    def delete_for_user(self):
+        """إخفاء الإشعار من قائمة المستخدم"""
+        from .counters import adjust_unread
+        if not self.is_deleted:
+            self.is_deleted = True
+            self.save(update_fields=['is_deleted'])
+            if not self.is_read:
+                adjust_unread([(self.user_id, self.user.major_id)], -1)
 
 
 class NotificationManager:
     """
     مدير لإنشاء وإرسال الإشعارات
+    
+    الإشعارات الموجهة لفئة (طلاب مقرر، دور، الجميع) تُحفظ بجمهور مستهدف
+    وتُطابق وقت القراءة بدلاً من إنشاء سجل لكل مستلم.
+    NOTIFICATION_FANOUT = 'write' يعيد إنشاء سجلات المستلمين، في مهمة خلفية
+    بعد تأكيد المعاملة (apps.notifications.tasks).
     """
     
+    @staticmethod
+    def send_targeted(notification):
+        """
+        إرسال إشعار بجمهور مستهدف (شروط الجمهور محددة على الإشعار)
+        """
+        if getattr(settings, 'NOTIFICATION_FANOUT', 'read') == 'write':
+            from .tasks import schedule_recipient_delivery
+            
+            notification.audience = Notification.AUDIENCE_DIRECT
+            notification.delivery_status = Notification.DELIVERY_PENDING
+            notification.save(update_fields=['audience', 'delivery_status'])
+            schedule_recipient_delivery(notification)
+        else:
+            from .counters import invalidate_audience
+            
+            notification.audience = Notification.AUDIENCE_TARGETED
+            notification.save(update_fields=['audience'])
+            invalidate_audience(notification)
+        return notification
+    
     @staticmethod
     def create_file_upload_notification(file_obj, course):
         """
         إنشاء إشعار عند رفع ملف جديد
         يرسل إلى جميع طلاب المقرر
         """
-        from apps.accounts.models import User
+        from apps.accounts.models import Role
         
         notification = Notification.objects.create(
             sender=file_obj.uploader,
@@ -179,74 +328,39 @@ class NotificationManager:
             body=f"تم رفع ملف جديد: {file_obj.title}",
             notification_type='file_upload',
             course=course,
-            file=file_obj
-        )
-        
-        # الحصول على جميع طلاب المقرر
-        students = User.objects.filter(
-            role__role_name='Student',
-            major__in=course.course_majors.values_list('major', flat=True),
-            level=course.level,
-            account_status='active'
+            file=file_obj,
+            # طلاب تخصصات المقرر في مستواه
+            target_role=Role.STUDENT,
+            target_course=course,
+            target_level=course.level
         )
-        
-        # إنشاء سجلات المستلمين
-        recipients = [
-            NotificationRecipient(notification=notification, user=student)
-            for student in students
-        ]
-        NotificationRecipient.objects.bulk_create(recipients)
-        
-        return notification
+        return NotificationManager.send_targeted(notification)
     
     @staticmethod
     def create_course_notification(sender, course, title, body, send_to_all_department=False):
         """
         إنشاء إشعار للمقرر
         """
-        from apps.accounts.models import User
+        from apps.accounts.models import Role
         
         notification = Notification.objects.create(
             sender=sender,
             title=title,
             body=body,
             notification_type='course',
-            course=course
+            course=course,
+            target_role=Role.STUDENT,
+            target_course=course,
+            # إرسال لجميع طلاب القسم، أو لطلاب مستوى المقرر فقط
+            target_level=None if send_to_all_department else course.level
         )
-        
-        # تحديد المستلمين
-        if send_to_all_department:
-            # إرسال لجميع طلاب القسم والمستوى
-            students = User.objects.filter(
-                role__role_name='Student',
-                major__in=course.course_majors.values_list('major', flat=True),
-                account_status='active'
-            )
-        else:
-            # إرسال لطلاب المقرر فقط
-            students = User.objects.filter(
-                role__role_name='Student',
-                major__in=course.course_majors.values_list('major', flat=True),
-                level=course.level,
-                account_status='active'
-            )
-        
-        # إنشاء سجلات المستلمين
-        recipients = [
-            NotificationRecipient(notification=notification, user=student)
-            for student in students
-        ]
-        NotificationRecipient.objects.bulk_create(recipients)
-        
-        return notification
+        return NotificationManager.send_targeted(notification)
     
     @staticmethod
     def create_system_notification(title, body, users=None):
         """
         إنشاء إشعار نظام
         """
-        from apps.accounts.models import User
-        
         notification = Notification.objects.create(
             sender=None,
             title=title,
@@ -257,7 +371,7 @@ class NotificationManager:
         
         if users is None:
             # إرسال لجميع المستخدمين النشطين
-            users = User.objects.filter(account_status='active')
+            return NotificationManager.send_targeted(notification)
         
         # إنشاء سجلات المستلمين
         recipients = [
@@ -266,35 +380,100 @@ class NotificationManager:
         ]
         NotificationRecipient.objects.bulk_create(recipients)
         
+        from .counters import adjust_unread
+        adjust_unread([(user.pk, user.major_id) for user in users], 1)
+        
         return notification
     
     @staticmethod
-    def get_unread_count(user):
+    def audience_filter(user):
+        """شرط الإشعارات المستهدفة التي يطابقها المستخدم"""
+        from apps.courses.models import CourseMajor
+        
+        return (
+            Q(audience=Notification.AUDIENCE_TARGETED, created_at__gte=user.date_joined)
+            & (Q(target_role='') | Q(target_role=user.role_code or ''))
+            & (Q(target_major__isnull=True) | Q(target_major_id=user.major_id))
+            & (Q(target_level__isnull=True) | Q(target_level_id=user.level_id))
+            & (
+                Q(target_course__isnull=True)
+                | Q(target_course_id__in=CourseMajor.objects.filter(major_id=user.major_id).values('course_id'))
+            )
+        )
+    
+    @staticmethod
+    def visible_to(user):
+        """
+        إشعارات المستخدم غير المحذوفة (المباشرة والمستهدفة)
+        
+        Returns:
+            QuerySet من Notification مع is_read لهذا المستخدم
+        """
+        states = NotificationRecipient.objects.filter(user=user)
+        return Notification.objects.filter(is_active=True).filter(
+            Q(audience=Notification.AUDIENCE_DIRECT, pk__in=states.values('notification_id'))
+            | NotificationManager.audience_filter(user)
+        ).exclude(
+            pk__in=states.filter(is_deleted=True).values('notification_id')
+        ).annotate(
+            is_read=Exists(states.filter(notification=OuterRef('pk'), is_read=True))
+        )
+    
+    @staticmethod
+    def get_recipient(notification, user):
+        """سجل حالة الإشعار للمستخدم (يُنشأ عند أول قراءة أو حذف لإشعار مستهدف)"""
+        recipient, _ = NotificationRecipient.objects.get_or_create(notification=notification, user=user)
+        recipient.user = user
+        return recipient
+    
+    @staticmethod
+    def mark_all_as_read(user):
         """
-        الحصول على عدد الإشعارات غير المقروءة للمستخدم
+        تحديد جميع إشعارات المستخدم كمقروءة
         """
-        return NotificationRecipient.objects.filter(
+        from django.utils import timezone
+        
+        now = timezone.now()
+        NotificationRecipient.objects.filter(
             user=user,
-            is_read=False,
-            is_deleted=False,
-            notification__is_active=True
-        ).count()
+            is_read=False
+        ).update(is_read=True, read_at=now)
+        
+        # الإشعارات المستهدفة التي لم يُنشأ لها سجل بعد
+        unread = NotificationManager.visible_to(user).filter(
+            audience=Notification.AUDIENCE_TARGETED,
+            is_read=False
+        ).values_list('pk', flat=True)
+        NotificationRecipient.objects.bulk_create(
+            [
+                NotificationRecipient(notification_id=pk, user=user, is_read=True, read_at=now)
+                for pk in unread
+            ],
+            ignore_conflicts=True
+        )
+        
+        from .counters import reset_unread
+        reset_unread(user)
+    
+    @staticmethod
+    def get_unread_count(user):
+        """
+        الحصول على عدد الإشعارات غير المقروءة للمستخدم (عداد في الكاش)
+        """
+        from .counters import get_unread_count
+        return get_unread_count(user)
     
     @staticmethod
     def get_user_notifications(user, include_read=True, limit=None):
         """
         الحصول على إشعارات المستخدم
         """
-        queryset = NotificationRecipient.objects.filter(
-            user=user,
-            is_deleted=False,
-            notification__is_active=True
-        ).select_related('notification', 'notification__sender', 'notification__course')
+        queryset = NotificationManager.visible_to(user).select_related('sender', 'course')
         
         if not include_read:
             queryset = queryset.filter(is_read=False)
         
-        queryset = queryset.order_by('-notification__created_at')
+        queryset = queryset.order_by('-created_at')
         
         if limit:
             queryset = queryset[:limit]
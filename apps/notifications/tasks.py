@@ -0,0 +1,118 @@
+"""
+توصيل الإشعارات في الخلفية
+S-ACM - Smart Academic Content Management System
+
+عند NOTIFICATION_FANOUT = 'write' تُنشأ سجلات المستلمين بعد تأكيد معاملة
+الإرسال، فلا ينتظر طلب رفع الملف إنشاء سجل لكل طالب:
+- معرفات المستخدمين تُقرأ بـ iterator على دفعات (لا تُحمل القائمة كاملة)
+- الإدراج بدفعات ثابتة الحجم مع ignore_conflicts (إعادة التشغيل آمنة)
+- التقدم يُحفظ على الإشعار (delivery_done / delivery_total)
+- عدادات غير المقروء في الكاش تُزاد مع كل دفعة (وتُحذف عند إعادة التشغيل،
+  لأن بعض السجلات قد تكون موجودة)
+
+Example:
+    schedule_recipient_delivery(notification)  # داخل المعاملة
+"""
+
+import logging
+from typing import Any, Dict
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.ai_features.services import CELERY_AVAILABLE, shared_task
+from .counters import adjust_unread, discard_unread
+from .models import Notification, NotificationRecipient
+
+logger = logging.getLogger('notifications')
+
+
+def deliver_recipients(notification: Notification, batch_size: int = None) -> int:
+    """
+    إنشاء سجلات المستلمين لجمهور الإشعار.
+
+    Args:
+        notification: إشعار بشروط جمهور
+        batch_size: عدد السجلات في كل إدراج (افتراضياً NOTIFICATION_FANOUT_BATCH_SIZE)
+
+    Returns:
+        int: عدد المستخدمين الذين عولجوا
+    """
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_FANOUT_BATCH_SIZE', 1000)
+    progress = Notification.objects.filter(pk=notification.pk)
+
+    # أول تشغيل: كل سجل جديد؛ إعادة التشغيل: العدادات تُعاد حسابها
+    first_run = notification.delivery_status == Notification.DELIVERY_PENDING
+    users = notification.audience_users().order_by('pk').values_list('id', 'major_id')
+    progress.update(
+        delivery_status=Notification.DELIVERY_RUNNING,
+        delivery_total=users.count(),
+        delivery_done=0
+    )
+
+    done = 0
+    batch = []
+    for user in users.iterator(chunk_size=batch_size):
+        batch.append(user)
+        if len(batch) >= batch_size:
+            done += _insert_batch(notification.pk, batch, first_run)
+            progress.update(delivery_done=done)
+            batch = []
+    if batch:
+        done += _insert_batch(notification.pk, batch, first_run)
+
+    progress.update(delivery_status=Notification.DELIVERY_DONE, delivery_done=done)
+    logger.info(f"Delivered notification {notification.pk} to {done} recipients")
+    return done
+
+
+def _insert_batch(notification_id: int, batch, first_run: bool) -> int:
+    """batch: أزواج (معرف المستخدم، معرف التخصص)"""
+    NotificationRecipient.objects.bulk_create(
+        [NotificationRecipient(notification_id=notification_id, user_id=user_id) for user_id, _ in batch],
+        ignore_conflicts=True
+    )
+    if first_run:
+        adjust_unread(batch, 1)
+    else:
+        discard_unread(batch)
+    return len(batch)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def deliver_recipients_async(self, notification_id: int) -> Dict[str, Any]:
+    """
+    مهمة إنشاء سجلات مستلمي الإشعار في الخلفية.
+
+    Args:
+        notification_id: معرف الإشعار
+
+    Returns:
+        Dict: عدد المستلمين
+    """
+    try:
+        notification = Notification.objects.get(pk=notification_id)
+        return {'success': True, 'recipients': deliver_recipients(notification)}
+
+    except Notification.DoesNotExist:
+        return {'success': False, 'error': 'الإشعار غير موجود'}
+    except Exception as e:
+        logger.error(f"Recipient delivery failed for notification {notification_id}: {e}")
+        Notification.objects.filter(pk=notification_id).update(delivery_status=Notification.DELIVERY_FAILED)
+        if CELERY_AVAILABLE:
+            raise self.retry(exc=e)
+        return {'success': False, 'error': str(e)}
+
+
+def schedule_recipient_delivery(notification: Notification) -> None:
+    """جدولة إنشاء سجلات المستلمين بعد تأكيد المعاملة الحالية."""
+    notification_id = notification.pk
+
+    def dispatch():
+        try:
+            deliver_recipients_async.delay(notification_id)
+        except Exception as e:
+            logger.error(f"Failed to schedule delivery for notification {notification_id}: {e}")
+            Notification.objects.filter(pk=notification_id).update(delivery_status=Notification.DELIVERY_FAILED)
+
+    transaction.on_commit(dispatch)
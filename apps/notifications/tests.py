@@ -1,3 +1,138 @@
-from django.test import TestCase
+"""
+اختبارات تطبيق notifications
+S-ACM - Smart Academic Content Management System
+"""
 
-# Create your tests here.
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.accounts.models import Level, Major, Role, Semester, User
+from apps.courses.models import Course, CourseMajor
+from .models import Notification, NotificationManager, NotificationRecipient
+from .tasks import deliver_recipients
+
+
+class NotificationDeliveryTest(TestCase):
+    """اختبارات الإشعارات المستهدفة (المطابقة وقت القراءة)"""
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        student = Role.objects.create(code=Role.STUDENT, display_name='طالب')
+        instructor_role = Role.objects.create(code=Role.INSTRUCTOR, display_name='مدرس')
+        self.level = Level.objects.create(level_name='المستوى الأول', level_number=1)
+        other_level = Level.objects.create(level_name='المستوى الثاني', level_number=2)
+        self.major = Major.objects.create(major_name='علوم الحاسب')
+        other_major = Major.objects.create(major_name='نظم المعلومات')
+        semester = Semester.objects.create(
+            name='الفصل الأول', academic_year='2025/2026', semester_number=1,
+            start_date=date(2025, 9, 1), end_date=date(2026, 1, 15), is_current=True
+        )
+        self.course = Course.objects.create(
+            course_name='مقدمة في البرمجة', course_code='CS101', level=self.level, semester=semester
+        )
+        CourseMajor.objects.create(course=self.course, major=self.major)
+
+        def user(academic_id, role, major=None, level=None):
+            return User.objects.create_user(
+                academic_id=academic_id, password='pass12345', id_card_number=academic_id,
+                full_name=academic_id, account_status='active', role=role, major=major, level=level,
+                date_joined=self.now - timedelta(days=1)
+            )
+
+        self.student = user('50000001', student, self.major, self.level)
+        self.other_major = user('50000002', student, other_major, self.level)
+        self.other_level = user('50000003', student, self.major, other_level)
+        self.instructor = user('50000004', instructor_role)
+
+    def notify(self, **kwargs):
+        return NotificationManager.create_course_notification(
+            self.instructor, self.course, 'اختبار قصير', 'الأحد القادم', **kwargs
+        )
+
+    def test_targeted_notification_is_matched_at_read_time(self):
+        notification = self.notify()
+        self.assertEqual(notification.audience, Notification.AUDIENCE_TARGETED)
+        self.assertFalse(NotificationRecipient.objects.exists())
+        self.assertEqual(notification.get_recipients_count(), 1)
+
+        self.assertEqual(NotificationManager.get_unread_count(self.student), 1)
+        for user in (self.other_major, self.other_level, self.instructor):
+            self.assertEqual(NotificationManager.get_user_notifications(user).count(), 0)
+
+        # المستوى غير محدد: جميع طلاب التخصص
+        self.notify(send_to_all_department=True)
+        self.assertEqual(NotificationManager.get_unread_count(self.other_level), 1)
+
+    def test_read_and_delete_state_rows(self):
+        first, second = self.notify(), self.notify()
+        NotificationManager.get_recipient(first, self.student).mark_as_read()
+        self.assertEqual(NotificationManager.get_unread_count(self.student), 1)
+        self.assertEqual(
+            [n.is_read for n in NotificationManager.get_user_notifications(self.student)], [False, True]
+        )
+
+        NotificationManager.mark_all_as_read(self.student)
+        self.assertEqual(NotificationManager.get_unread_count(self.student), 0)
+        self.assertEqual(NotificationRecipient.objects.filter(user=self.student).count(), 2)
+
+        recipient = NotificationManager.get_recipient(second, self.student)
+        recipient.is_deleted = True
+        recipient.save(update_fields=['is_deleted'])
+        self.assertEqual(list(NotificationManager.get_user_notifications(self.student)), [first])
+
+    @override_settings(NOTIFICATION_FANOUT='write')
+    def test_write_fanout_creates_recipient_rows_in_background(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            notification = self.notify()
+        # الطلب لا ينشئ السجلات: التوصيل مجدول بعد الـ commit
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(notification.delivery_status, Notification.DELIVERY_PENDING)
+        self.assertFalse(NotificationRecipient.objects.exists())
+        self.assertEqual(notification.get_recipients_count(), 1)
+
+        self.assertEqual(deliver_recipients(notification, batch_size=1), 1)
+        notification.refresh_from_db()
+        self.assertEqual(notification.audience, Notification.AUDIENCE_DIRECT)
+        self.assertEqual(
+            (notification.delivery_status, notification.delivery_done, notification.delivery_total),
+            (Notification.DELIVERY_DONE, 1, 1)
+        )
+        self.assertEqual(list(notification.recipients.values_list('user_id', flat=True)), [self.student.pk])
+        self.assertEqual(NotificationManager.get_unread_count(self.student), 1)
+        self.assertEqual(NotificationManager.get_unread_count(self.other_major), 0)
+
+        # إعادة التشغيل (إعادة المحاولة) لا تكرر السجلات
+        NotificationManager.get_recipient(notification, self.student).mark_as_read()
+        deliver_recipients(notification)
+        self.assertEqual(notification.recipients.count(), 1)
+        self.assertEqual(NotificationManager.get_unread_count(self.student), 0)
+
+    def assertUnread(self, user, expected, queries=0):
+        with self.assertNumQueries(queries):
+            self.assertEqual(NotificationManager.get_unread_count(user), expected)
+
+    def test_counter_follows_sends_reads_and_deletes(self):
+        # أول قراءة تحسب العداد من قاعدة البيانات
+        NotificationManager.get_unread_count(self.student)
+        NotificationManager.get_unread_count(self.other_major)
+        self.assertUnread(self.student, 0)
+
+        first, second = self.notify(), self.notify()
+        # إشعار المقرر يبطل عدادات تخصصه فقط
+        self.assertUnread(self.student, 2, queries=1)
+        self.assertUnread(self.other_major, 0)
+
+        NotificationManager.get_recipient(first, self.student).mark_as_read()
+        self.assertUnread(self.student, 1)
+        NotificationManager.get_recipient(second, self.student).delete_for_user()
+        self.assertUnread(self.student, 0)
+
+        NotificationManager.create_system_notification('صيانة', 'توقف النظام الليلة', users=[self.student])
+        self.assertUnread(self.student, 1)
+        NotificationManager.mark_all_as_read(self.student)
+        self.assertUnread(self.student, 0)
+        self.assertEqual(NotificationManager.get_unread_count(self.student), 0)
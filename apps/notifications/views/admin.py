@@ -14,7 +14,7 @@ from django.views.generic import ListView, CreateView, UpdateView, DeleteView, D
 from django.views import View
 from django.urls import reverse_lazy
 
-from ..models import Notification, NotificationRecipient
+from ..models import Notification, NotificationManager
 from ..forms import NotificationForm
 from apps.accounts.views import AdminRequiredMixin
 
@@ -28,7 +28,7 @@ class AdminNotificationCreateView(LoginRequiredMixin, AdminRequiredMixin, Create
     - الطلاب فقط (students)
     - المدرسين فقط (instructors)
     
-    يستخدم bulk_create لإنشاء سجلات المستلمين بكفاءة.
+    الإشعار يُحفظ مرة واحدة بجمهور مستهدف دون سجل لكل مستلم.
     """
     model = Notification
     form_class = NotificationForm
@@ -36,33 +36,24 @@ class AdminNotificationCreateView(LoginRequiredMixin, AdminRequiredMixin, Create
     success_url = reverse_lazy('notifications:admin_list')
     
     def form_valid(self, form):
-        """حفظ الإشعار وإنشاء سجلات المستلمين."""
+        """حفظ الإشعار مع الفئة المستهدفة."""
         notification = form.save(commit=False)
         notification.sender = self.request.user
-        notification.save()
         
-        # تحديد المستلمين حسب الفئة المختارة
+        # تحديد المستلمين حسب الفئة المختارة (جمهور مستهدف يُطابق وقت القراءة)
         target = form.cleaned_data.get('target')
         
-        from apps.accounts.models import User, Role
+        from apps.accounts.models import Role
         
-        if target == 'all':
-            users = User.objects.filter(account_status='active')
-        elif target == 'students':
-            users = User.objects.filter(role__code=Role.STUDENT, account_status='active')
+        if target == 'students':
+            notification.target_role = Role.STUDENT
         elif target == 'instructors':
-            users = User.objects.filter(role__code=Role.INSTRUCTOR, account_status='active')
-        else:
-            users = User.objects.filter(account_status='active')
+            notification.target_role = Role.INSTRUCTOR
         
-        # إنشاء سجلات المستلمين بالجملة
-        recipients = [
-            NotificationRecipient(notification=notification, user=user)
-            for user in users
-        ]
-        NotificationRecipient.objects.bulk_create(recipients)
+        notification.save()
+        NotificationManager.send_targeted(notification)
         
-        messages.success(self.request, f'تم إرسال الإشعار إلى {len(recipients)} مستخدم.')
+        messages.success(self.request, f'تم إرسال الإشعار إلى {notification.get_recipients_count()} مستخدم.')
         return redirect(self.success_url)
 
 
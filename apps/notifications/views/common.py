@@ -14,9 +14,8 @@ from django.contrib import messages
 from django.views import View
 from django.views.generic import ListView
 from django.http import JsonResponse
-from django.utils import timezone
 
-from ..models import Notification, NotificationRecipient, NotificationManager
+from ..models import NotificationManager
 
 
 class NotificationListView(LoginRequiredMixin, ListView):
@@ -57,18 +56,14 @@ class NotificationDetailView(LoginRequiredMixin, View):
     
     def get(self, request, pk):
         """عرض الإشعار وتحديده كمقروء."""
-        recipient = get_object_or_404(
-            NotificationRecipient,
-            notification_id=pk,
-            user=request.user,
-            is_deleted=False
-        )
+        notification = get_object_or_404(NotificationManager.visible_to(request.user), pk=pk)
+        recipient = NotificationManager.get_recipient(notification, request.user)
         
         # تحديد كمقروء
         recipient.mark_as_read()
         
         return render(request, self.template_name, {
-            'notification': recipient.notification,
+            'notification': notification,
             'recipient': recipient
         })
 
@@ -82,12 +77,8 @@ class MarkAsReadView(LoginRequiredMixin, View):
     
     def post(self, request, pk):
         """تحديد الإشعار كمقروء."""
-        recipient = get_object_or_404(
-            NotificationRecipient,
-            notification_id=pk,
-            user=request.user
-        )
-        recipient.mark_as_read()
+        notification = get_object_or_404(NotificationManager.visible_to(request.user), pk=pk)
+        NotificationManager.get_recipient(notification, request.user).mark_as_read()
         
         # دعم AJAX
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -100,15 +91,12 @@ class MarkAllAsReadView(LoginRequiredMixin, View):
     """
     تحديد جميع إشعارات المستخدم كمقروءة.
     
-    عملية جماعية تستخدم update() للأداء المحسّن.
+    عملية جماعية: update() للسجلات الموجودة وbulk_create لسجلات الإشعارات المستهدفة.
     """
     
     def post(self, request):
         """تحديد الكل كمقروء."""
-        NotificationRecipient.objects.filter(
-            user=request.user,
-            is_read=False
-        ).update(is_read=True, read_at=timezone.now())
+        NotificationManager.mark_all_as_read(request.user)
         
         # دعم AJAX
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -127,13 +115,8 @@ class DeleteNotificationView(LoginRequiredMixin, View):
     
     def post(self, request, pk):
         """حذف الإشعار (إخفاء)."""
-        recipient = get_object_or_404(
-            NotificationRecipient,
-            notification_id=pk,
-            user=request.user
-        )
-        recipient.is_deleted = True
-        recipient.save(update_fields=['is_deleted'])
+        notification = get_object_or_404(NotificationManager.visible_to(request.user), pk=pk)
+        NotificationManager.get_recipient(notification, request.user).delete_for_user()
         
         # دعم AJAX
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
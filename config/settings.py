@@ -103,6 +103,27 @@ else:
         }
     }
 
+# Cache
+# Permission snapshots, the current semester, rate limits and notification counters are
+# invalidated through the cache. With several processes (gunicorn workers, ai_worker) set
+# REDIS_URL so they share one cache; the per-process default only suits a single process
+REDIS_URL = os.getenv('REDIS_URL', '')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
@@ -140,6 +161,15 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Protected file delivery: 'django' streams from Python (development),
+# 'nginx' (X-Accel-Redirect) or 'apache' (X-Sendfile) hand the transfer to the web server
+FILE_DELIVERY_BACKEND = os.getenv('FILE_DELIVERY_BACKEND', 'django')
+FILE_DELIVERY_INTERNAL_PREFIX = os.getenv('FILE_DELIVERY_INTERNAL_PREFIX', '/protected/')  # nginx `internal` location aliased to MEDIA_ROOT
+
+# Download/view counters and activity rows are buffered per process and written in batches
+FILE_COUNTER_FLUSH_INTERVAL = float(os.getenv('FILE_COUNTER_FLUSH_INTERVAL', 5))  # seconds; 0 writes on every request
+FILE_COUNTER_BATCH_SIZE = int(os.getenv('FILE_COUNTER_BATCH_SIZE', 500))  # pending events that force a flush
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -160,15 +190,81 @@ DEFAULT_FROM_EMAIL = os.getenv('EMAIL_HOST_USER', 'noreply@s-acm.com')
 # Google Gemini API
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
 
+# Model backend: 'gemini', 'fake' (local deterministic model) or a dotted client factory path
+AI_BACKEND = os.getenv('AI_BACKEND', 'gemini')
+AI_FAKE_LATENCY = float(os.getenv('AI_FAKE_LATENCY', 0.5))  # seconds per call
+AI_FAKE_TOKENS_PER_SECOND = float(os.getenv('AI_FAKE_TOKENS_PER_SECOND', 0))  # 0 = instant
+AI_FAKE_ERROR_RATE = float(os.getenv('AI_FAKE_ERROR_RATE', 0))
+AI_FAKE_RATE_LIMIT_RATE = float(os.getenv('AI_FAKE_RATE_LIMIT_RATE', 0))
+
 # AI Rate Limiting (requests per hour per user)
 AI_RATE_LIMIT_PER_HOUR = int(os.getenv('AI_RATE_LIMIT_PER_HOUR', 10))
 
+# AI token budgets checked before each model call (0 = unlimited)
+AI_TOKEN_BUDGET_USER_DAILY = int(os.getenv('AI_TOKEN_BUDGET_USER_DAILY', 200000))
+AI_TOKEN_BUDGET_COURSE_DAILY = int(os.getenv('AI_TOKEN_BUDGET_COURSE_DAILY', 2000000))
+AI_TOKEN_BUDGET_SEMESTER = int(os.getenv('AI_TOKEN_BUDGET_SEMESTER', 50000000))
+
+# AI Indexing (extract + chunk uploaded files in the background)
+AI_INDEX_ON_UPLOAD = os.getenv('AI_INDEX_ON_UPLOAD', 'True') == 'True'
+AI_LOCAL_WORKERS = int(os.getenv('AI_LOCAL_WORKERS', 2))  # used when Celery is not installed
+
+# AI Job Queue (priority lanes + per-user fair share, see apps/ai_features/jobs.py)
+AI_JOB_QUEUE = os.getenv('AI_JOB_QUEUE', 'True') == 'True'
+# Jobs are executed by `python manage.py ai_worker` (the production path). Setting this
+# above 0 starts polling worker threads inside every web process instead (development only)
+AI_JOB_EMBEDDED_WORKERS = int(os.getenv('AI_JOB_EMBEDDED_WORKERS', 0))
+AI_JOB_POLL_INTERVAL = float(os.getenv('AI_JOB_POLL_INTERVAL', 1.0))  # seconds
+AI_JOB_STALE_TIMEOUT = int(os.getenv('AI_JOB_STALE_TIMEOUT', 900))  # seconds without a worker heartbeat before a running job is requeued
+AI_CHUNK_SIZE = int(os.getenv('AI_CHUNK_SIZE', 1500))  # characters
+AI_CHUNK_OVERLAP = int(os.getenv('AI_CHUNK_OVERLAP', 200))  # characters
+AI_RETRIEVAL_TOP_K = int(os.getenv('AI_RETRIEVAL_TOP_K', 5))  # chunks sent to "Ask the Document"
+
+# Text extraction: stop after this many characters (0 = no limit) and
+# extract large PDFs in parallel page ranges (0/1 processes = serial)
+AI_MAX_EXTRACT_CHARS = int(os.getenv('AI_MAX_EXTRACT_CHARS', 2000000))
+AI_EXTRACT_PROCESSES = int(os.getenv('AI_EXTRACT_PROCESSES', 0))
+AI_PDF_PARALLEL_MIN_PAGES = int(os.getenv('AI_PDF_PARALLEL_MIN_PAGES', 50))
+
+# Run extraction in a bounded pool of subprocesses instead of the web worker
+AI_EXTRACT_SANDBOX = os.getenv('AI_EXTRACT_SANDBOX', 'True') == 'True'
+AI_SANDBOX_WORKERS = int(os.getenv('AI_SANDBOX_WORKERS', 2))
+AI_SANDBOX_TIMEOUT = int(os.getenv('AI_SANDBOX_TIMEOUT', 60))  # seconds per file
+AI_SANDBOX_MAX_RSS_MB = int(os.getenv('AI_SANDBOX_MAX_RSS_MB', 1024))
+AI_SANDBOX_MAX_PAGES = int(os.getenv('AI_SANDBOX_MAX_PAGES', 1000))
+AI_SANDBOX_MAX_JOBS = int(os.getenv('AI_SANDBOX_MAX_JOBS', 50))  # recycle worker after N files
+
+# AI Summaries: 'auto' (map-reduce only for long texts), 'map_reduce' or 'truncate'
+AI_SUMMARY_MODE = os.getenv('AI_SUMMARY_MODE', 'auto')
+AI_SUMMARY_CHUNK_SIZE = int(os.getenv('AI_SUMMARY_CHUNK_SIZE', 12000))  # characters per map call
+AI_SUMMARY_WORKERS = int(os.getenv('AI_SUMMARY_WORKERS', 4))  # concurrent map calls
+AI_QUESTION_BANK_WORKERS = int(os.getenv('AI_QUESTION_BANK_WORKERS', 4))  # files generated concurrently per course bank
+
+# Cap on in-flight Gemini calls per process (shared client, sync and async paths)
+AI_MAX_CONCURRENT_CALLS = int(os.getenv('AI_MAX_CONCURRENT_CALLS', 8))
+# Max seconds a duplicate AI request waits for the identical in-flight one
+AI_SINGLE_FLIGHT_TIMEOUT = int(os.getenv('AI_SINGLE_FLIGHT_TIMEOUT', 120))
+
 # File Upload Settings
 MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50 MB
 ALLOWED_FILE_EXTENSIONS = ['.pdf', '.doc', '.docx', '.ppt', '.pptx', '.txt', '.md']
 ALLOWED_VIDEO_EXTENSIONS = ['.mp4', '.webm', '.avi', '.mov']
 ALLOWED_IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
 
+# Notifications: 'read' stores audience-targeted notifications once and matches
+# them at read time; 'write' creates one NotificationRecipient row per recipient
+NOTIFICATION_FANOUT = os.getenv('NOTIFICATION_FANOUT', 'read')
+# Rows per insert when 'write' fan-out runs in the background
+NOTIFICATION_FANOUT_BATCH_SIZE = int(os.getenv('NOTIFICATION_FANOUT_BATCH_SIZE', 1000))
+# Per-user unread counters in the cache are recomputed from the DB after this many seconds
+NOTIFICATION_UNREAD_TTL = int(os.getenv('NOTIFICATION_UNREAD_TTL', 300))
+
+# Role permission snapshots in the cache (invalidated by a version counter). Snapshots also
+# expire after this many seconds, which bounds staleness when the cache is not shared
+PERMISSIONS_CACHE_TIMEOUT = int(os.getenv('PERMISSIONS_CACHE_TIMEOUT', 60))  # seconds
+# Cached current semester (invalidated on save/delete; expiry bounds staleness across processes)
+SEMESTER_CACHE_TIMEOUT = int(os.getenv('SEMESTER_CACHE_TIMEOUT', 300))  # seconds
+
 # Session Settings
 SESSION_COOKIE_AGE = 86400  # 24 hours
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
@@ -9,6 +9,12 @@ document.addEventListener('DOMContentLoaded', function() {
     initTooltips();
     initConfirmDialogs();
     initFileUpload();
+    initAIStreams(document);
+});
+
+// Start streams inside HTMX partials once they are swapped in
+document.addEventListener('htmx:afterSwap', function(e) {
+    initAIStreams(e.target);
 });
 
 /**
@@ -245,6 +251,86 @@ function markNotificationRead(notificationId) {
     });
 }
 
+/**
+ * AI streaming (Server-Sent Events over fetch)
+ * Calls handlers.onDelta(text) for every chunk, then onDone(data) or onError(message).
+ */
+function streamAIResponse(url, formData, handlers) {
+    const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]')?.value;
+    
+    return fetch(url, {
+        method: 'POST',
+        body: formData,
+        headers: {
+            'X-CSRFToken': csrfToken,
+            'Accept': 'text/event-stream'
+        }
+    })
+    .then(response => {
+        // Denials from the stream views arrive as an SSE error event (403);
+        // anything else that failed (CSRF, 404, 429, 500) has no stream to read
+        const isStream = (response.headers.get('Content-Type') || '').startsWith('text/event-stream');
+        if (!response.ok && !isStream) {
+            handlers.onError?.(response.status === 429
+                ? 'تجاوزت الحد المسموح من الطلبات. حاول لاحقاً.'
+                : 'حدث خطأ (' + response.status + ')');
+            return;
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        function dispatch(block) {
+            let event = 'message';
+            let data = '';
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (!data) return;
+            const payload = JSON.parse(data);
+            if (event === 'delta') handlers.onDelta?.(payload.text);
+            else if (event === 'done') handlers.onDone?.(payload);
+            else if (event === 'error') handlers.onError?.(payload.error);
+        }
+        
+        function read() {
+            return reader.read().then(({ done, value }) => {
+                buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+                const blocks = buffer.split('\n\n');
+                buffer = blocks.pop();
+                blocks.forEach(dispatch);
+                if (!done) return read();
+            });
+        }
+        return read();
+    })
+    .catch(() => handlers.onError?.('حدث خطأ في الاتصال'));
+}
+
+/**
+ * Stream into elements rendered with data-ai-stream="<url>"
+ * (optional data-ai-question is sent as the question).
+ */
+function initAIStreams(root) {
+    root.querySelectorAll('[data-ai-stream]').forEach(function(el) {
+        const url = el.dataset.aiStream;
+        el.removeAttribute('data-ai-stream');
+        
+        const formData = new FormData();
+        if (el.dataset.aiQuestion) formData.append('question', el.dataset.aiQuestion);
+        
+        el.textContent = '';
+        streamAIResponse(url, formData, {
+            onDelta: text => { el.textContent += text; },
+            onError: message => {
+                el.classList.add('text-danger');
+                el.textContent = message;
+            }
+        });
+    });
+}
+
 /**
  * AI Chat functionality
  */
@@ -255,67 +341,48 @@ function sendChatMessage(fileId) {
     if (!question) return;
     
     const chatContainer = document.getElementById('chat-messages');
-    const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]')?.value;
     
     // Add user message
-    chatContainer.innerHTML += `
-        <div class="chat-message user">
-            <p class="mb-1">${question}</p>
-            <small class="message-time">الآن</small>
-        </div>
-    `;
+    const userMessage = document.createElement('div');
+    userMessage.className = 'chat-message user';
+    userMessage.innerHTML = '<p class="mb-1"></p><small class="message-time">الآن</small>';
+    userMessage.querySelector('p').textContent = question;
+    chatContainer.appendChild(userMessage);
     
     input.value = '';
-    chatContainer.scrollTop = chatContainer.scrollHeight;
     
-    // Show loading
-    const loadingId = 'loading-' + Date.now();
-    chatContainer.innerHTML += `
-        <div class="chat-message ai" id="${loadingId}">
-            <div class="spinner-border spinner-border-sm" role="status"></div>
-            <span class="ms-2">جاري التفكير...</span>
-        </div>
+    // AI message is filled in as the answer streams
+    const aiMessage = document.createElement('div');
+    aiMessage.className = 'chat-message ai';
+    aiMessage.innerHTML = `
+        <p class="mb-1"><span class="spinner-border spinner-border-sm" role="status"></span>
+        <span class="ms-2">جاري التفكير...</span></p>
+        <small class="message-time"></small>
     `;
+    chatContainer.appendChild(aiMessage);
+    chatContainer.scrollTop = chatContainer.scrollHeight;
+    
+    const answer = aiMessage.querySelector('p');
+    let started = false;
     
-    // Send request
     const formData = new FormData();
     formData.append('question', question);
     
-    fetch(`/ai/ask/${fileId}/`, {
-        method: 'POST',
-        body: formData,
-        headers: {
-            'X-CSRFToken': csrfToken,
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-    })
-    .then(response => response.json())
-    .then(data => {
-        document.getElementById(loadingId).remove();
-        
-        if (data.success) {
-            chatContainer.innerHTML += `
-                <div class="chat-message ai">
-                    <p class="mb-1">${data.answer}</p>
-                    <small class="message-time">${data.created_at}</small>
-                </div>
-            `;
-        } else {
-            chatContainer.innerHTML += `
-                <div class="chat-message ai text-danger">
-                    <p class="mb-0">${data.error}</p>
-                </div>
-            `;
+    streamAIResponse(`/ai/ask/${fileId}/stream/`, formData, {
+        onDelta: text => {
+            if (!started) {
+                answer.textContent = '';
+                started = true;
+            }
+            answer.textContent += text;
+            chatContainer.scrollTop = chatContainer.scrollHeight;
+        },
+        onDone: data => {
+            aiMessage.querySelector('.message-time').textContent = data.created_at;
+        },
+        onError: message => {
+            aiMessage.classList.add('text-danger');
+            answer.textContent = message;
         }
-        
-        chatContainer.scrollTop = chatContainer.scrollHeight;
-    })
-    .catch(error => {
-        document.getElementById(loadingId).remove();
-        chatContainer.innerHTML += `
-            <div class="chat-message ai text-danger">
-                <p class="mb-0">حدث خطأ في الاتصال</p>
-            </div>
-        `;
     });
 }